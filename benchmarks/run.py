@@ -0,0 +1,262 @@
+"""
+Benchmark the SCIM endpoints against synthetic tenants.
+
+For each tenant size a fresh set of users and groups is generated, then every
+scenario is run through the Django test client and measured for latency,
+number of queries and peak memory. Results are written as JSON so that runs
+can be compared across releases. Eg::
+
+    python -m benchmarks.run --users 1000,10000 --output results.json
+
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGE_SIZE = 50
+PATCH_MEMBER_COUNT = 10
+BATCH_SIZE = 5000
+
+
+def setup_django():
+    sys.path[:0] = [ROOT, os.path.join(ROOT, 'src')]
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', run_syncdb=True, verbosity=0)
+
+
+def get_version():
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version('django-scim2')
+    except PackageNotFoundError:
+        return None
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def build_tenant(user_count, group_sizes):
+    """
+    Replace all users and groups with ``user_count`` users and one group per
+    entry in ``group_sizes``. Return the admin user and the groups.
+    """
+    from django.db.models import CharField, F
+    from django.db.models.functions import Cast
+
+    from django_scim.utils import get_group_model, get_user_model
+
+    user_model = get_user_model()
+    group_model = get_group_model()
+
+    group_model.objects.all().delete()
+    user_model.objects.all().delete()
+
+    users = [
+        user_model(
+            username=f'user{i}',
+            first_name=f'First{i}',
+            last_name=f'Last{i}',
+            email=f'user{i}@example.com',
+        )
+        for i in range(user_count)
+    ]
+    user_model.objects.bulk_create(users, batch_size=BATCH_SIZE)
+    user_model.objects.update(scim_id=Cast('id', CharField()), scim_username=F('username'))
+
+    group_model.objects.bulk_create(
+        [group_model(name=f'Group of {size}') for size in group_sizes],
+    )
+    group_model.objects.update(scim_id=Cast('id', CharField()))
+
+    user_ids = list(user_model.objects.order_by('id').values_list('id', flat=True))
+    through = user_model.scim_groups.through
+    for group, size in zip(group_model.objects.order_by('id'), group_sizes):
+        memberships = [through(user_id=user_id, group_id=group.id) for user_id in user_ids[:size]]
+        through.objects.bulk_create(memberships, batch_size=BATCH_SIZE)
+
+    admin = user_model.objects.order_by('id').first()
+    return admin, list(group_model.objects.order_by('id'))
+
+
+def measure(request, repeat):
+    """
+    Call ``request`` (a function returning a response) ``repeat`` times for
+    latency and once more for query count and peak memory.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    latencies = []
+    status_code = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = request()
+        latencies.append((time.perf_counter() - start) * 1000)
+        status_code = response.status_code
+
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        request()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'status_code': status_code,
+        'latency_ms': {
+            'mean': statistics.mean(latencies),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'max': max(latencies),
+        },
+        'queries': len(queries),
+        'peak_memory_kib': peak / 1024,
+    }
+
+
+def get_scenarios(client, groups, user_count):
+    from django.urls import reverse
+
+    from django_scim import constants
+    from django_scim.utils import get_user_model
+
+    users_url = reverse('scim:users')
+    middle_user = get_user_model().objects.get(username=f'user{user_count // 2}')
+    user_url = reverse('scim:users', kwargs={'uuid': middle_user.scim_id})
+    user_doc = json.loads(client.get(user_url).content.decode())
+    search_body = json.dumps({
+        'schemas': [constants.SchemaURI.SERACH_REQUEST],
+        'filter': f'userName eq "{middle_user.username}"',
+    })
+    members_to_add = [
+        {'value': str(pk)}
+        for pk in get_user_model().objects.order_by('-id').values_list('id', flat=True)[:PATCH_MEMBER_COUNT]
+    ]
+
+    def patch_add_members(group_url):
+        body = json.dumps({
+            'schemas': [constants.SchemaURI.PATCH_OP],
+            'Operations': [{'op': 'add', 'path': 'members', 'value': members_to_add}],
+        })
+        return client.patch(group_url, body, content_type=constants.SCIM_CONTENT_TYPE)
+
+    scenarios = {
+        'list_users_first_page': lambda: client.get(users_url, {'count': PAGE_SIZE}),
+        'list_users_last_page': lambda: client.get(
+            users_url, {'startIndex': max(1, user_count - PAGE_SIZE), 'count': PAGE_SIZE},
+        ),
+        'filter_users_username_eq': lambda: client.get(
+            users_url, {'filter': f'userName eq "{middle_user.username}"'},
+        ),
+        'filter_users_family_name_sw': lambda: client.get(
+            users_url, {'filter': 'familyName sw "Last1"', 'count': PAGE_SIZE},
+        ),
+        'search_users_post': lambda: client.post(
+            reverse('scim:users-search'), search_body, content_type=constants.SCIM_CONTENT_TYPE,
+        ),
+        'put_user': lambda: client.put(
+            user_url, json.dumps(user_doc), content_type=constants.SCIM_CONTENT_TYPE,
+        ),
+    }
+
+    for group in groups:
+        size = group.user_set.count()
+        group_url = reverse('scim:groups', kwargs={'uuid': group.scim_id})
+        scenarios[f'get_group_{size}_members'] = (lambda url: lambda: client.get(url))(group_url)
+        scenarios[f'patch_add_members_group_{size}_members'] = (
+            (lambda url: lambda: patch_add_members(url))(group_url)
+        )
+
+    return scenarios
+
+
+def run(user_counts, group_sizes, repeat, scenario_names=None):
+    from django.db import transaction
+    from django.test import Client
+
+    results = []
+    for user_count in user_counts:
+        sizes = [min(size, user_count) for size in group_sizes]
+        with transaction.atomic():
+            admin, groups = build_tenant(user_count, sizes)
+
+        client = Client()
+        client.force_login(admin)
+
+        scenarios = get_scenarios(client, groups, user_count)
+        for name, request in scenarios.items():
+            if scenario_names and name not in scenario_names:
+                continue
+
+            result = measure(request, repeat)
+            result.update({'tenant_users': user_count, 'scenario': name})
+            results.append(result)
+            print(
+                f'{user_count:>7} users  {name:<45} '
+                f'p50 {result["latency_ms"]["p50"]:9.2f} ms  '
+                f'{result["queries"]:>5} queries  '
+                f'{result["peak_memory_kib"]:10.1f} KiB',
+                file=sys.stderr,
+            )
+
+    from django.db import connection
+
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'django_scim_version': get_version(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'repeat': repeat,
+            'page_size': PAGE_SIZE,
+        },
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', default='1000,10000,100000',
+                        help='comma separated tenant sizes (default: %(default)s)')
+    parser.add_argument('--group-sizes', default='10,1000,50000',
+                        help='comma separated group member counts (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='timed requests per scenario (default: %(default)s)')
+    parser.add_argument('--scenario', action='append', dest='scenarios',
+                        help='only run the named scenario (may be repeated)')
+    parser.add_argument('--output', default='-',
+                        help='file to write JSON results to (default: stdout)')
+    args = parser.parse_args(argv)
+
+    setup_django()
+
+    user_counts = [int(n) for n in args.users.split(',')]
+    group_sizes = [int(n) for n in args.group_sizes.split(',')]
+    report = run(user_counts, group_sizes, args.repeat, args.scenarios)
+
+    content = json.dumps(report, indent=2, sort_keys=True)
+    if args.output == '-':
+        print(content)
+    else:
+        with open(args.output, 'w') as fp:
+            fp.write(content + '\n')
+
+
+if __name__ == '__main__':
+    main()
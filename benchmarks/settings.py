@@ -0,0 +1,43 @@
+"""
+Django settings for the benchmark suite.
+
+The benchmarks reuse the settings of the test suite with concrete SCIM user
+and group models of their own. Set the ``SCIM_BENCHMARK_DB_ENGINE`` and
+``SCIM_BENCHMARK_DB_NAME`` environment variables (plus the usual ``PG*``
+variables for Postgres) to benchmark against a database other than
+in-memory SQLite.
+"""
+import os
+
+from tests.settings import *  # noqa: F401,F403
+from tests.settings import SCIM_SERVICE_PROVIDER
+
+DEBUG = False
+
+INSTALLED_APPS = (
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django_scim',
+    'benchmarks',
+)
+
+MIDDLEWARE = (
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+)
+
+DATABASES = {
+    'default': {
+        'ENGINE': os.environ.get('SCIM_BENCHMARK_DB_ENGINE', 'django.db.backends.sqlite3'),
+        'NAME': os.environ.get('SCIM_BENCHMARK_DB_NAME', ':memory:'),
+    }
+}
+
+AUTH_USER_MODEL = 'benchmarks.User'
+
+SCIM_SERVICE_PROVIDER = dict(
+    SCIM_SERVICE_PROVIDER,
+    GROUP_MODEL='benchmarks.models.Group',
+)
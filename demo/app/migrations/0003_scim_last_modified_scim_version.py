@@ -0,0 +1,53 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_alter_group_options_alter_user_managers_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='scim_last_modified',
+            field=models.DateTimeField(
+                blank=True,
+                db_index=True,
+                default=None,
+                help_text='The most recent DateTime that the details of this resource were updated.',
+                null=True,
+                verbose_name='SCIM Last Modified',
+            ),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='scim_version',
+            field=models.PositiveBigIntegerField(
+                default=1,
+                help_text='Incremented by every change of the resource, for optimistic concurrency control.',
+                verbose_name='SCIM Version',
+            ),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='scim_last_modified',
+            field=models.DateTimeField(
+                blank=True,
+                db_index=True,
+                default=None,
+                help_text='The most recent DateTime that the details of this resource were updated.',
+                null=True,
+                verbose_name='SCIM Last Modified',
+            ),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='scim_version',
+            field=models.PositiveBigIntegerField(
+                default=1,
+                help_text='Incremented by every change of the resource, for optimistic concurrency control.',
+                verbose_name='SCIM Version',
+            ),
+        ),
+    ]
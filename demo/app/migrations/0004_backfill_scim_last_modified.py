@@ -0,0 +1,21 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def backfill_scim_last_modified(apps, schema_editor):
+    # Resources not saved since scim_last_modified was added were last
+    # modified when their row was.
+    for model_name in ('User', 'Group'):
+        model = apps.get_model('app', model_name)
+        model.objects.filter(scim_last_modified__isnull=True).update(scim_last_modified=F('modified'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_scim_last_modified_scim_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_scim_last_modified, migrations.RunPython.noop),
+    ]
@@ -20,19 +20,33 @@ from typing import Optional, Union
 from urllib.parse import urljoin
 
 from django import core
+from django.core.exceptions import FieldDoesNotExist
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import m2m_changed
 from django.urls import reverse
+from django.utils import timezone
 from scim2_filter_parser.attr_paths import AttrPath
 
-from . import constants, exceptions
+from . import cache, changelog, constants, documents, exceptions
+from .filters import SCIMSQLQuery
+from .settings import scim_settings
 from .utils import (
     get_base_scim_location_getter,
     get_group_adapter,
     get_group_filter_parser,
+    get_request_context,
     get_user_adapter,
     get_user_filter_parser,
     get_user_model,
+    make_passwords,
 )
 
+# Attribute of groups holding the members prefetched for inline rendering
+# when ``GROUP_MEMBERS_INLINE_LIMIT`` is set.
+INLINE_MEMBERS_ATTR = '_scim_inline_members'
+
 
 class SCIMMixin(object):
 
@@ -40,6 +54,48 @@ class SCIMMixin(object):
 
     id_field = 'scim_id'  # Modifiable by overriding classes
 
+    # Relations read by ``to_dict`` that should be loaded in bulk for a page
+    # of objects rather than once per object.
+    prefetch_related = ()
+
+    # Resource types whose documents include data of this resource (eg. group
+    # members list the display names of users). Their cached responses are
+    # invalidated along with the ones of this resource type.
+    related_resource_types = ()
+
+    # Model field changing on every update of an object (eg. a last modified
+    # timestamp or a version number), part of the fragment cache keys. Keying
+    # on the version the object was loaded with keeps a render of an object
+    # loaded before a concurrent write from being served after it.
+    version_field = 'scim_version'
+
+    # SCIM attributes identifying an object, mapped to whether their values
+    # are compared case-insensitively. Lookups of missing objects by these
+    # attributes are remembered by the negative cache.
+    lookup_attrs = {'id': False, 'externalId': False}
+
+    # Model fields read by ``to_dict`` to render each top level attribute.
+    # SCIM views load only these columns (see ``get_only_fields``) when the
+    # adapter class declares this mapping itself: adapters that inherit it
+    # load full rows, since they may read more fields.
+    attribute_fields = {
+        'id': ('scim_id',),
+        'externalId': ('scim_external_id',),
+    }
+
+    # True while ``handle_operations`` runs, so that the stored document of
+    # the object is refreshed once after all the operations.
+    _handling_operations = False
+
+    # True while the handlers of ``handle_operations`` run. They plan the
+    # net effect of the operations, eg. the final values of attributes,
+    # which ``flush_operations`` then writes with as few queries as possible.
+    _planning_operations = False
+
+    # True if a handler saved the object while planning: it is saved once
+    # by ``flush_operations``.
+    _save_pending = False
+
     def __init__(self, obj, request=None):
         self.obj = obj
         self._request = request
@@ -56,6 +112,14 @@ class SCIMMixin(object):
     def request(self, value):
         self._request = value
 
+    @property
+    def context(self):
+        """
+        Return the ``SCIMRequestContext`` built by the SCIM view serving
+        ``self.request`` or None if the adapter is used outside of a SCIM view.
+        """
+        return getattr(self.request, 'scim_context', None)
+
     @property
     def id(self):
         return str(getattr(self.obj, self.id_field))
@@ -64,9 +128,111 @@ class SCIMMixin(object):
     def path(self):
         return reverse(self.url_name, kwargs={'uuid': self.id})
 
+    @property
+    def base_location(self):
+        context = self.context
+        if context is not None:
+            return context.base_location
+
+        return get_base_scim_location_getter()(self.request)
+
     @property
     def location(self):
-        return urljoin(get_base_scim_location_getter()(self.request), self.path)
+        return urljoin(self.base_location, self.path)
+
+    @property
+    def database(self):
+        """
+        Return the alias of the database of the object: the one it was
+        loaded from or, for new objects, the one the ``DATABASE_ALIAS_GETTER``
+        setting returns for the request (None for the default routing).
+        """
+        if self.obj._state.db:
+            return self.obj._state.db
+
+        if self._request is not None:
+            return get_request_context(self._request).database
+
+        return None
+
+    @property
+    def etag(self):
+        """
+        Return the entity tag of the current version of the object.
+        """
+        return f'W/"{self.obj.scim_version}"'
+
+    def is_excluded(self, attribute):
+        """
+        Return True if the request asked to leave ``attribute`` out of the
+        documents with the ``excludedAttributes`` query parameter.
+        """
+        return attribute.lower() in get_request_context(self._request).excluded_attributes
+
+    @classmethod
+    def get_prefetch_related(cls, request=None):
+        """
+        Return the lookups to prefetch for a page of objects serialized for
+        ``request``.
+        """
+        return list(cls.prefetch_related)
+
+    @classmethod
+    def prefetch(cls, objs, request=None):
+        """
+        Prefetch the relations returned by ``get_prefetch_related`` for a
+        page of model instances about to be serialized for ``request``.
+
+        Lookups whose first part is not a relation on the model (eg. when an
+        overriding adapter reads a property instead) are skipped.
+        """
+        objs = list(objs)
+        prefetch_related = cls.get_prefetch_related(request)
+        if not objs or not prefetch_related:
+            return objs
+
+        opts = objs[0]._meta
+        lookups = []
+        for lookup in prefetch_related:
+            path = getattr(lookup, 'prefetch_through', lookup)
+            try:
+                field = opts.get_field(path.split('__')[0])
+            except FieldDoesNotExist:
+                continue
+            if field.is_relation:
+                lookups.append(lookup)
+
+        if lookups:
+            prefetch_related_objects(objs, *lookups)
+
+        return objs
+
+    @classmethod
+    def get_only_fields(cls, model, attributes=None):
+        """
+        Return the names of the fields of ``model`` to load to render
+        ``attributes`` (top level attribute names, by default all the
+        attributes in ``attribute_fields``), for use with ``QuerySet.only``.
+
+        Return None if full rows must be loaded: when ``attribute_fields``
+        is inherited, or names a field that is not a column of ``model``
+        (eg. a property reading other fields).
+        """
+        if 'attribute_fields' not in vars(cls):
+            return None
+
+        if attributes is None:
+            attributes = cls.attribute_fields
+
+        columns = {f.name for f in model._meta.concrete_fields}
+        fields = {model._meta.pk.name}
+        for attribute in attributes:
+            fields.update(cls.attribute_fields.get(attribute, ()))
+
+        if not fields <= columns:
+            return None
+
+        return sorted(fields)
 
     def to_dict(self):
         """
@@ -110,11 +276,59 @@ class SCIMMixin(object):
         scim_external_id = d.get('externalId')
         self.obj.scim_external_id = scim_external_id or ''
 
+    def get_related_objects(self):
+        """
+        Return a ``dict`` mapping resource types to querysets of the objects
+        whose documents include data of this object.
+        """
+        return {}
+
+    def get_lookup_values(self):
+        """
+        Return a ``dict`` mapping the attributes of ``lookup_attrs`` to their
+        values for this object.
+        """
+        return {
+            'id': self.id,
+            'externalId': self.obj.scim_external_id,
+        }
+
     def save(self):
-        self.obj.save()
+        if self._planning_operations:
+            self._save_pending = True
+            return
+
+        self.obj.save(using=self.database, check_scim_version=True)
+        self.invalidate_caches()
+        if not self._handling_operations:
+            documents.refresh(self)
 
     def delete(self):
-        self.obj.__class__.objects.filter(id=self.id).delete()
+        self.obj.__class__.objects.using(self.database).filter(id=self.id).delete()
+        self.invalidate_caches()
+
+    def touch(self):
+        """
+        Update the version and last modification time of the object after a
+        change that does not save it, eg. of group memberships.
+        """
+        self.obj.swap_scim_version(scim_last_modified=timezone.now())
+
+    def invalidate_caches(self):
+        """
+        Stop serving cached responses that may include this object once
+        the current transaction commits.
+        """
+        if not cache.is_enabled():
+            return
+
+        tenant = cache.ALL_TENANTS
+        if self._request is not None:
+            tenant = get_request_context(self._request).tenant
+
+        resource_types = (self.resource_type,) + tuple(self.related_resource_types)
+
+        transaction.on_commit(lambda: cache.invalidate(resource_types, tenant), using=self.database)
 
     def handle_operations(self, operations):
         """
@@ -125,6 +339,12 @@ class SCIMMixin(object):
         operations in ``operations`` and calls the appropriate handler (defined
         on the appropriate adapter) for each.
 
+        Handlers validate their operation and plan its effect rather than
+        write it: ``save`` only marks the object to be saved and groups
+        collect the net changes of their members. Once all the operations
+        are handled, ``flush_operations`` writes the net effect, eg. saves
+        the object once with the final values of its attributes.
+
         Django-scim2 only provides a partial implementation of PATCH call
         handlers. The RFC (https://tools.ietf.org/html/rfc7644#section-3.5.2)
         specifies a number of requirements for a full PATCH implementation.
@@ -134,24 +354,38 @@ class SCIMMixin(object):
         Add Operations:
             - If the target location does not exist, the attribute and value
               are added.
-        Remove Operations:
-            - If the target location is a multi-valued attribute and a complex
-              filter is specified comparing a "value", the values matched by the
-              filter are removed.  If no other values remain after removal of
-              the selected values, the multi-valued attribute SHALL be
-              considered unassigned.
         Replace Operations:
             - If the target location path specifies an attribute that does not
               exist, the service provider SHALL treat the operation as an "add".
         """
-        for operation in operations:
-            path = operation.get('path')
-            value = operation.get('value')
+        self._handling_operations = self._planning_operations = True
+        try:
+            for operation in operations:
+                path = operation.get('path')
+                value = operation.get('value')
+
+                paths_and_values = self.parse_path_and_values(path, value)
 
-            paths_and_values = self.parse_path_and_values(path, value)
+                for path, value in paths_and_values:
+                    self.handle_path_and_value(path, value, operation)
 
-            for path, value in paths_and_values:
-                self.handle_path_and_value(path, value, operation)
+            self._planning_operations = False
+            self.flush_operations()
+        finally:
+            self._handling_operations = self._planning_operations = False
+
+        documents.refresh(self)
+
+    def flush_operations(self):
+        """
+        Write the net effect of the operations planned by the handlers of
+        ``handle_operations``. An object saved by several operations (eg.
+        replaces of several attributes, or of the same one) is saved once,
+        with the final values.
+        """
+        if self._save_pending:
+            self._save_pending = False
+            self.save()
 
     def handle_path_and_value(self,
                               path: AttrPath,
@@ -300,6 +534,30 @@ class SCIMUser(SCIMMixin):
 
     ATTR_MAP = get_user_filter_parser().attr_map
 
+    prefetch_related = ('scim_groups',)
+
+    related_resource_types = ('Group',)
+
+    lookup_attrs = dict(SCIMMixin.lookup_attrs, userName=True)
+
+    attribute_fields = dict(
+        SCIMMixin.attribute_fields,
+        userName=('username',),
+        name=('first_name', 'last_name', 'username'),
+        displayName=('first_name', 'last_name', 'username'),
+        emails=('email',),
+        active=('is_active',),
+        groups=(),
+        meta=('date_joined', 'scim_last_modified', 'scim_version'),
+    )
+
+    # When True, ``from_dict`` holds on to the cleartext password instead of
+    # hashing it inline so that a batch of adapters can be hashed together
+    # with ``SCIMUser.hash_passwords`` before they are saved.
+    defer_password_hashing = False
+
+    _cleartext_password = None
+
     @property
     def display_name(self):
         """
@@ -325,8 +583,9 @@ class SCIMUser(SCIMMixin):
         """
         Return the groups of the user per the SCIM spec.
         """
+        group_adapter = self.context.group_adapter if self.context else get_group_adapter()
         group_qs = self.obj.scim_groups.all()
-        scim_groups = [get_group_adapter()(g, self.request) for g in group_qs]
+        scim_groups = [group_adapter(g, self.request) for g in group_qs]
 
         dicts = []
         for group in scim_groups:
@@ -347,8 +606,9 @@ class SCIMUser(SCIMMixin):
         d = {
             'resourceType': self.resource_type,
             'created': self.obj.date_joined.isoformat(),
-            'lastModified': self.obj.date_joined.isoformat(),
+            'lastModified': (self.obj.scim_last_modified or self.obj.date_joined).isoformat(),
             'location': self.location,
+            'version': self.etag,
         }
 
         return d
@@ -406,12 +666,64 @@ class SCIMUser(SCIMMixin):
 
         cleartext_password = d.get('password')
         if cleartext_password:
-            self.obj.set_password(cleartext_password)
+            if self.defer_password_hashing:
+                self._cleartext_password = cleartext_password
+            else:
+                self.obj.set_password(cleartext_password)
 
         active = d.get('active')
         if active is not None:
             self.obj.is_active = active
 
+    def save(self):
+        # Never persist a user whose deferred password was not hashed.
+        if self._cleartext_password:
+            self.obj.set_password(self._cleartext_password)
+            self._cleartext_password = None
+
+        super().save()
+
+    @classmethod
+    def hash_passwords(cls, scim_users, processes=None):
+        """
+        Hash the deferred passwords of a batch of user adapters.
+
+        Adapters that had ``defer_password_hashing`` set when ``from_dict``
+        was called hold on to their cleartext password. This method hashes
+        all of them in one go (see ``django_scim.utils.make_passwords``) and
+        assigns the hashes to the wrapped user objects. Call it before saving
+        the batch. Eg::
+
+            for scim_user, d in zip(scim_users, dicts):
+                scim_user.defer_password_hashing = True
+                scim_user.from_dict(d)
+
+            SCIMUser.hash_passwords(scim_users)
+
+            for scim_user in scim_users:
+                scim_user.save()
+        """
+        pending = [u for u in scim_users if u._cleartext_password]
+        encoded_passwords = make_passwords(
+            [u._cleartext_password for u in pending],
+            processes=processes,
+        )
+
+        for scim_user, encoded in zip(pending, encoded_passwords):
+            scim_user.obj.password = encoded
+            # Mirror ``AbstractBaseUser.set_password`` so that password
+            # validators are notified of the change on save.
+            scim_user.obj._password = scim_user._cleartext_password
+            scim_user._cleartext_password = None
+
+    def get_related_objects(self):
+        return {'Group': self.obj.scim_groups.all()}
+
+    def get_lookup_values(self):
+        d = super().get_lookup_values()
+        d['userName'] = self.obj.username
+        return d
+
     @classmethod
     def resource_type_dict(cls, request=None):
         """
@@ -500,6 +812,52 @@ class SCIMUser(SCIMMixin):
         self.save()
 
 
+def can_return_rows_from_delete(connection):
+    """
+    Return whether ``DELETE ... RETURNING`` can be used on ``connection``:
+    PostgreSQL, MariaDB and SQLite 3.35+. Oracle returns columns with a
+    different syntax.
+    """
+    return connection.features.can_return_columns_from_insert and connection.vendor != 'oracle'
+
+
+def has_other_m2m_receivers(sender):
+    """
+    Return True if ``m2m_changed`` receivers other than the ones of this
+    package are connected for ``sender``.
+    """
+    own = {cache.handle_m2m_changed, changelog.handle_m2m_changed, documents.handle_m2m_changed}
+    sync_receivers, async_receivers = m2m_changed._live_receivers(sender)
+    return any(receiver not in own for receiver in sync_receivers + async_receivers)
+
+
+class MembershipPlan:
+    """
+    Net changes of the members of a group planned from PATCH operations and
+    written by ``SCIMGroup.apply_membership_plan``.
+    """
+
+    def __init__(self):
+        # SQL conditions and params of the filtered removes of members.
+        self.filters = []
+        # Whether each user, by id, ends up added (True) or removed (False).
+        self.changes = {}
+        # Ids of the users of add and remove operations, which must exist.
+        self.added = set()
+        self.removed = set()
+
+    def add(self, ids):
+        self.added.update(ids)
+        self.changes.update(dict.fromkeys(ids, True))
+
+    def remove(self, ids):
+        self.removed.update(ids)
+        self.changes.update(dict.fromkeys(ids, False))
+
+    def remove_filtered(self, condition):
+        self.filters.append(condition)
+
+
 class SCIMGroup(SCIMMixin):
     """
     Adapter for adding SCIM functionality to a Django Group object.
@@ -513,6 +871,23 @@ class SCIMGroup(SCIMMixin):
 
     ATTR_MAP = get_group_filter_parser().attr_map
 
+    prefetch_related = ('user_set',)
+
+    related_resource_types = ('User',)
+
+    lookup_attrs = dict(SCIMMixin.lookup_attrs, displayName=True)
+
+    # Net changes of the members planned by ``handle_operations``, see
+    # ``flush_operations``.
+    _membership_plan = None
+
+    attribute_fields = dict(
+        SCIMMixin.attribute_fields,
+        displayName=('name',),
+        members=(),
+        meta=('scim_last_modified', 'scim_version'),
+    )
+
     @property
     def display_name(self):
         """
@@ -520,27 +895,58 @@ class SCIMGroup(SCIMMixin):
         """
         return self.obj.name
 
+    @classmethod
+    def get_prefetch_related(cls, request=None):
+        lookups = super().get_prefetch_related(request)
+        if 'user_set' not in lookups:
+            return lookups
+
+        limit = scim_settings.GROUP_MEMBERS_INLINE_LIMIT
+        if get_request_context(request).excluded_attributes & {'members'}:
+            lookups.remove('user_set')
+        elif limit is not None:
+            # Sliced prefetches load the first members of each group of the
+            # page in one query.
+            lookups[lookups.index('user_set')] = Prefetch(
+                'user_set',
+                queryset=get_request_context(request).user_model.objects.order_by('pk')[:limit],
+                to_attr=INLINE_MEMBERS_ATTR,
+            )
+        return lookups
+
+    def get_members(self):
+        """
+        Return a queryset of the members of the group, in id order.
+        """
+        return self.obj.user_set.order_by('pk')
+
+    def get_member(self, scim_user):
+        """
+        Return the entry of ``members`` for user adapter instance
+        ``scim_user``.
+        """
+        return {
+            'value': scim_user.id,
+            '$ref': scim_user.location,
+            'display': scim_user.display_name,
+        }
+
     @property
     def members(self):
         """
         Return a list of user dicts (ready for serialization) for the members
-        of the group.
+        of the group, limited to the first ``GROUP_MEMBERS_INLINE_LIMIT``
+        members if that setting is set.
 
         :rtype: list
         """
-        users = self.obj.user_set.all()
-        scim_users = [get_user_adapter()(user, self.request) for user in users]
-
-        dicts = []
-        for user in scim_users:
-            d = {
-                'value': user.id,
-                '$ref': user.location,
-                'display': user.display_name,
-            }
-            dicts.append(d)
+        user_adapter = self.context.user_adapter if self.context else get_user_adapter()
+        users = getattr(self.obj, INLINE_MEMBERS_ATTR, None)
+        if users is None:
+            limit = scim_settings.GROUP_MEMBERS_INLINE_LIMIT
+            users = self.obj.user_set.all() if limit is None else self.get_members()[:limit]
 
-        return dicts
+        return [self.get_member(user_adapter(user, self.request)) for user in users]
 
     @property
     def meta(self):
@@ -550,7 +956,10 @@ class SCIMGroup(SCIMMixin):
         d = {
             'resourceType': self.resource_type,
             'location': self.location,
+            'version': self.etag,
         }
+        if self.obj.scim_last_modified:
+            d['lastModified'] = self.obj.scim_last_modified.isoformat()
 
         return d
 
@@ -563,9 +972,10 @@ class SCIMGroup(SCIMMixin):
         d.update({
             'schemas': [constants.SchemaURI.GROUP],
             'displayName': self.display_name,
-            'members': self.members,
-            'meta': self.meta,
         })
+        if not self.is_excluded('members'):
+            d['members'] = self.members
+        d['meta'] = self.meta
         return d
 
     def from_dict(self, d):
@@ -585,6 +995,14 @@ class SCIMGroup(SCIMMixin):
         name = d.get('displayName')
         self.obj.name = name or ''
 
+    def get_related_objects(self):
+        return {'User': self.obj.user_set.all()}
+
+    def get_lookup_values(self):
+        d = super().get_lookup_values()
+        d['displayName'] = self.display_name
+        return d
+
     @classmethod
     def resource_type_dict(cls, request=None):
         """
@@ -606,42 +1024,210 @@ class SCIMGroup(SCIMMixin):
             }
         }
 
+    def get_membership_plan(self):
+        if self._membership_plan is None:
+            self._membership_plan = MembershipPlan()
+        return self._membership_plan
+
+    def get_member_ids(self, value):
+        return [int(member.get('value')) for member in value or []]
+
     def handle_add(self, path, value, operation):
         """
         Handle add operations.
         """
         if path.first_path == ('members', None, None):
-            members = value or []
-            ids = [int(member.get('value')) for member in members]
-            users = get_user_model().objects.filter(id__in=ids)
+            # Adds are written after filtered removes, so members added after
+            # a filtered remove are not removed by it.
+            self.get_membership_plan().add(self.get_member_ids(value))
+            if not self._planning_operations:
+                self.flush_operations()
 
-            if len(ids) != users.count():
-                raise exceptions.BadRequestError('Can not add a non-existent user to group')
+        else:
+            raise exceptions.NotImplementedError
 
-            for user in users:
-                self.obj.user_set.add(user)
+    def is_member_filter(self, path):
+        """
+        Return True if ``path`` selects members with a filter, eg.
+        ``members[value eq "2819c223"]``.
+        """
+        return bool(path) and path.is_complex and path.first_path[0] == 'members'
 
-        else:
+    def get_member_filter_sql(self, path):
+        """
+        Return the SQL condition on the user table, and its params, selecting
+        the users matched by the filter of member path ``path``. Only the
+        ``value`` (the id of the user) of members can be filtered on.
+        """
+        if list(path)[-1] != ('members', None, None):
+            # Eg. "members[value eq "2819c223"].display"
             raise exceptions.NotImplementedError
 
-    def handle_remove(self, path, value, operation):
+        filter_ = path.filter[:-len(' eq ""')]
+        filter_ = filter_[filter_.index('[') + 1:filter_.rindex(']')]
+
+        user_model = self.context.user_model if self.context else get_user_model()
+        user_adapter = self.context.user_adapter if self.context else get_user_adapter()
+        column = user_model._meta.get_field(user_adapter.id_field).column
+        quote_name = connections[self.database or DEFAULT_DB_ALIAS].ops.quote_name
+        q = SCIMSQLQuery(filter_, user_model._meta.db_table, {('value', None, None): quote_name(column)})
+
+        if q.where_sql is None or set(q.transpiler.attr_paths) != {('value', None, None)}:
+            msg = f'Members can only be filtered on "value". Got "{filter_}"'
+            raise exceptions.BadRequestError(msg, scim_type='invalidFilter')
+
+        return q.where_sql.format(**{name: '%s' for name in q.params_dict}), q.params
+
+    def get_filtered_user_ids_sql(self, conditions):
         """
-        Handle remove operations.
+        Return the SQL and params of a query of the ids of the users matched
+        by any of the SQL ``conditions``.
         """
-        if path.first_path == ('members', None, None):
-            members = value or []
-            ids = [int(member.get('value')) for member in members]
-            users = get_user_model().objects.filter(id__in=ids)
+        user_model = self.context.user_model if self.context else get_user_model()
+        quote_name = connections[self.database or DEFAULT_DB_ALIAS].ops.quote_name
+        where = ' OR '.join(f'({sql})' for sql, params in conditions)
+        sql = (
+            f'SELECT {quote_name(user_model._meta.pk.column)} '
+            f'FROM {quote_name(user_model._meta.db_table)} WHERE {where}'
+        )
+        return sql, [param for sql, params in conditions for param in params]
+
+    def remove_filtered_members(self, conditions):
+        """
+        Remove the members matched by any of the SQL ``conditions`` (as
+        returned by ``get_member_filter_sql``) with one DELETE of the
+        membership rows, without loading the users.
+
+        When the only ``m2m_changed`` receivers connected are the ones of
+        this package (the document store, the change log and the fragment
+        cache), which ignore ``pre_remove``, they are sent a ``post_remove``
+        with the ids of the removed users as returned by the DELETE. When
+        other receivers are connected, or the database can not return rows
+        from a DELETE, the ids are loaded first and the users removed with
+        ``remove``, which sends both ``pre_remove`` and ``post_remove``.
+        """
+        connection = connections[self.database or DEFAULT_DB_ALIAS]
+        user_ids_sql, user_ids_params = self.get_filtered_user_ids_sql(conditions)
+
+        manager = self.obj.user_set
+        memberships = manager.through._default_manager.using(self.database).filter(**{
+            manager.source_field_name: self.obj.pk,
+            f'{manager.target_field_name}__in': RawSQL(user_ids_sql, user_ids_params),
+        })
+
+        if not m2m_changed.has_listeners(manager.through):
+            memberships.delete()
+        elif can_return_rows_from_delete(connection) and not has_other_m2m_receivers(manager.through):
+            self.delete_returning_members(connection, manager, user_ids_sql, user_ids_params)
+        else:
+            manager.remove(*sorted(memberships.values_list(manager.target_field_name, flat=True)))
+
+    def delete_returning_members(self, connection, manager, user_ids_sql, user_ids_params):
+        """
+        Delete the memberships of the users selected by ``user_ids_sql`` and
+        send ``post_remove`` to the ``m2m_changed`` receivers with their ids.
+        """
+        quote_name = connection.ops.quote_name
+        through = manager.through._meta
+        source_column = quote_name(through.get_field(manager.source_field_name).column)
+        target_column = quote_name(through.get_field(manager.target_field_name).column)
+        sql = (
+            f'DELETE FROM {quote_name(through.db_table)} '
+            f'WHERE {source_column} = %s AND {target_column} IN ({user_ids_sql}) '
+            f'RETURNING {target_column}'
+        )
+        with transaction.atomic(using=connection.alias, savepoint=False), connection.cursor() as cursor:
+            cursor.execute(sql, [self.obj.pk] + user_ids_params)
+            pk_set = {row[0] for row in cursor.fetchall()}
+            if pk_set:
+                m2m_changed.send(
+                    sender=manager.through,
+                    action='post_remove',
+                    instance=self.obj,
+                    reverse=manager.reverse,
+                    model=manager.model,
+                    pk_set=pk_set,
+                    using=connection.alias,
+                )
 
-            if len(ids) != users.count():
+    def apply_membership_plan(self, plan):
+        """
+        Write the net changes of the members of the group in ``plan``: one
+        query checks that the users added and removed exist, then filtered
+        removes, removes and adds each take one statement.
+        """
+        ids = plan.added | plan.removed
+        if ids:
+            found = set(get_user_model().objects.using(self.database).filter(id__in=ids).values_list('id', flat=True))
+            if plan.added - found:
+                raise exceptions.BadRequestError('Can not add a non-existent user to group')
+            if plan.removed - found:
                 raise exceptions.BadRequestError('Can not remove a non-existent user from group')
 
-            for user in users:
-                self.obj.user_set.remove(user)
+        if plan.filters:
+            self.remove_filtered_members(plan.filters)
+
+        # Users are passed in id order so that concurrent requests lock
+        # the membership rows in the same order.
+        removed = sorted(user_id for user_id, is_added in plan.changes.items() if not is_added)
+        if removed:
+            self.obj.user_set.remove(*removed)
+
+        added = sorted(user_id for user_id, is_added in plan.changes.items() if is_added)
+        if added:
+            self.obj.user_set.add(*added)
+
+        self.invalidate_caches()
+
+    def flush_membership_plan(self):
+        plan, self._membership_plan = self._membership_plan, None
+        if plan is not None:
+            # Lock the group row before the membership rows so that
+            # concurrent requests on the group queue up instead of
+            # deadlocking on the rows of the users they have in common.
+            self.touch()
+            self.apply_membership_plan(plan)
+
+    def flush_operations(self):
+        if not self._save_pending:
+            self.flush_membership_plan()
+            return
+
+        # The save locks the group row and updates its version: the
+        # membership rows are written after it.
+        plan, self._membership_plan = self._membership_plan, None
+        super().flush_operations()
+        if plan is not None:
+            self.apply_membership_plan(plan)
+
+    def handle_remove(self, path, value, operation):
+        """
+        Handle remove operations.
+        """
+        if self.is_member_filter(path):
+            condition = self.get_member_filter_sql(path)
+            plan = self.get_membership_plan()
+            added = [user_id for user_id, is_added in plan.changes.items() if is_added]
+            if added:
+                # Filtered removes are written before adds: remove the
+                # members added before a filtered remove that it matches.
+                user_model = self.context.user_model if self.context else get_user_model()
+                plan.remove(list(user_model.objects.using(self.database).filter(
+                    pk__in=added,
+                ).filter(
+                    pk__in=RawSQL(*self.get_filtered_user_ids_sql([condition])),
+                ).values_list('pk', flat=True)))
+            plan.remove_filtered(condition)
+
+        elif path.first_path == ('members', None, None):
+            self.get_membership_plan().remove(self.get_member_ids(value))
 
         else:
             raise exceptions.NotImplementedError
 
+        if not self._planning_operations:
+            self.flush_operations()
+
     def handle_replace(self, path, value, operation):
         """
         Handle the replace operations.
@@ -0,0 +1,30 @@
+from django.apps import AppConfig
+from django.core.signals import setting_changed
+
+
+class DjangoSCIMConfig(AppConfig):
+    name = 'django_scim'
+    verbose_name = 'Django SCIM'
+
+    def ready(self):
+        from . import cache, changelog, documents
+        from .settings import reload_scim_settings, scim_settings
+
+        setting_changed.connect(reload_scim_settings)
+
+        # Connected after reload_scim_settings so that they see the new value
+        # of the settings.
+        setting_changed.connect(cache.connect_signals)
+        setting_changed.connect(documents.connect_signals)
+        setting_changed.connect(changelog.connect_signals)
+
+        # Resolve every setting now so that misconfiguration fails at start
+        # up rather than on the first SCIM request of each worker.
+        scim_settings.load()
+        cache.connect_signals()
+        documents.connect_signals()
+        changelog.connect_signals()
+
+        # Warm the schema and discovery caches.
+        scim_settings.SCHEMAS_GETTER()
+        from . import views  # noqa: F401
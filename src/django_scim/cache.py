@@ -0,0 +1,362 @@
+"""
+Caching of SCIM responses with Django's cache framework.
+
+Cached responses are keyed by a generation counter per resource type and
+tenant (as returned by the ``TENANT_GETTER`` setting). Adapters bump the
+counters of the resource types they affect whenever they save or delete an
+object or change group memberships, so cached entries stop being served as
+soon as a write goes through a SCIM adapter. Code that changes users or
+groups outside of the SCIM adapters should call ``invalidate`` itself (or
+rely on the cache timeouts).
+
+When the ``FRAGMENT_CACHE_TIMEOUT`` setting is set, the JSON documents of
+single resources are cached too, so that resources that have not changed
+since the last request are not serialized again. Fragments are keyed by the
+resource id, its version (the adapter's ``version_field``, if any), the SCIM
+base location and generation counters of the object and of the resource
+types whose data it embeds. Those counters are bumped by ``post_save``,
+``post_delete`` and ``m2m_changed`` signal receivers, so fragments are
+invalidated by any write going through the ORM, SCIM adapter or not.
+Saving or deleting a user invalidates the fragments of all groups (their
+members list the display names of users) and vice versa, while membership
+changes only invalidate the fragments of the users and groups involved.
+
+When the ``NEGATIVE_CACHE_TIMEOUT`` setting is set, lookups of missing
+resources (``GET /Users/<id>`` returning 404 and ``eq`` filters on the
+attributes listed in the adapters' ``lookup_attrs``, eg. ``userName eq
+"bob"``, returning no resource) are remembered for that many seconds per
+tenant. Filters are only remembered for attributes mapped by the filter
+parser, apart from lookups by URL. A ``post_save`` receiver bumps a
+generation counter of the resource type, part of the keys, when the
+transaction of any save (SCIM adapter or not) commits, so that probes for
+users that are then created or renamed find them.
+"""
+import hashlib
+import json
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from . import metrics
+from .settings import scim_settings
+from .utils import get_model_adapter, get_request_context
+
+# Tenant of the counters bumped by writes whose tenant is unknown. These
+# counters are part of the keys of every tenant.
+ALL_TENANTS = '*'
+
+
+def get_cache():
+    return caches[scim_settings.CACHE_ALIAS]
+
+
+def is_enabled():
+    """
+    Return True if any of the SCIM caches is enabled.
+    """
+    return any([
+        scim_settings.FILTER_CACHE_TIMEOUT is not None,
+        fragments_enabled(),
+        negative_enabled(),
+    ])
+
+
+def fragments_enabled():
+    return scim_settings.FRAGMENT_CACHE_TIMEOUT is not None
+
+
+def negative_enabled():
+    return scim_settings.NEGATIVE_CACHE_TIMEOUT is not None
+
+
+def make_key(prefix, *parts):
+    """
+    Return a cache key made of ``prefix`` and a digest of ``parts`` (which
+    must be JSON serializable, or have a stable ``repr``).
+    """
+    digest = hashlib.md5(json.dumps(parts, default=repr, sort_keys=True).encode()).hexdigest()
+    return f'scim:{prefix}:{digest}'
+
+
+def get_generation_key(resource_type, tenant):
+    return make_key('generation', resource_type, tenant)
+
+
+def get_counters(keys):
+    """
+    Return a dict mapping ``keys`` to the values of their generation
+    counters, initialising the missing ones.
+    """
+    cache = get_cache()
+    generations = cache.get_many(keys)
+
+    missing = [key for key in keys if key not in generations]
+    if missing:
+        for key in missing:
+            # Start from the current time rather than 0 so that a counter
+            # evicted from the cache never goes back to a generation whose
+            # entries may still be cached.
+            cache.add(key, time.time_ns(), timeout=None)
+        generations.update(cache.get_many(missing))
+
+    return generations
+
+
+def get_generations(resource_type, tenant):
+    """
+    Return the generation counters of ``resource_type`` shared by all
+    tenants and specific to ``tenant``.
+    """
+    keys = [get_generation_key(resource_type, ALL_TENANTS), get_generation_key(resource_type, tenant)]
+    generations = get_counters(keys)
+    return [generations.get(key) for key in keys]
+
+
+def bump_counter(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump_generation(resource_type, tenant=ALL_TENANTS):
+    bump_counter(get_generation_key(resource_type, tenant))
+
+
+def invalidate(resource_types, tenant=ALL_TENANTS):
+    """
+    Stop serving the cached responses of ``resource_types`` (eg.
+    ``['User']``) for ``tenant``, or for all tenants if ``tenant`` is not
+    given.
+    """
+    if scim_settings.FILTER_CACHE_TIMEOUT is None:
+        return
+
+    for resource_type in resource_types:
+        bump_generation(resource_type, tenant)
+
+
+def get_filter_cache_key(request, resource_type, query, start, count, extra_kwargs):
+    """
+    Return the key of the cached response of a filter search, or None if the
+    filter cache is disabled.
+    """
+    if scim_settings.FILTER_CACHE_TIMEOUT is None:
+        return None
+
+    context = get_request_context(request)
+    return make_key(
+        'filter',
+        resource_type,
+        context.tenant,
+        # Normalize whitespace so that equivalent filters share entries.
+        ' '.join(query.split()),
+        request.GET.get('attributes'),
+        request.GET.get('excludedAttributes'),
+        start,
+        count,
+        context.base_location,
+        extra_kwargs,
+        get_generations(resource_type, context.tenant),
+    )
+
+
+def get_negative_generation_key(resource_type):
+    return make_key('negative-generation', resource_type)
+
+
+def get_negative_key(adapter, tenant, attr, value, kind='get'):
+    """
+    Return the negative cache key of the lookup of ``attr`` (the id or one
+    of ``adapter.lookup_attrs``, matched case-insensitively) equal to
+    ``value``, or None if the lookup can not be cached.
+
+    ``kind`` tells lookups of a resource by its URL (``'get'``) from filter
+    searches (``'filter'``), whose results also depend on the filter parser.
+    Keys include the negative generation counter of the resource type as it
+    is before the lookup, so that the absence of an object created while
+    the lookup runs is never remembered.
+    """
+    if not negative_enabled() or not isinstance(value, str):
+        return None
+
+    attrs = {name.lower(): (name, case_insensitive) for name, case_insensitive in adapter.lookup_attrs.items()}
+    if attr.lower() not in attrs:
+        return None
+
+    name, case_insensitive = attrs[attr.lower()]
+    if case_insensitive:
+        value = value.upper()
+
+    generation_key = get_negative_generation_key(adapter.resource_type)
+    generation = get_counters([generation_key])[generation_key]
+    return make_key('missing', kind, adapter.resource_type, tenant, name, value, generation)
+
+
+def is_known_missing(key):
+    """
+    Return True if the lookup of ``key`` recently found nothing.
+    """
+    if key is None:
+        return False
+
+    missing = get_cache().get(key) is not None
+    metrics.record_cache_lookup('negative', missing)
+    return missing
+
+
+def remember_missing(key):
+    if key is not None:
+        get_cache().set(key, True, timeout=scim_settings.NEGATIVE_CACHE_TIMEOUT)
+
+
+def get_fragment_generation_key(resource_type, pk=None):
+    """
+    Return the key of the fragment generation counter of object ``pk`` or,
+    if ``pk`` is None, of all objects of ``resource_type``.
+    """
+    return make_key('fragment-generation', resource_type, pk)
+
+
+def get_fragment_key(scim_obj, generations):
+    adapter = type(scim_obj)
+    version = None
+    if adapter.version_field:
+        version = getattr(scim_obj.obj, adapter.version_field)
+
+    return make_key(
+        'fragment',
+        adapter.resource_type,
+        scim_obj.id,
+        version,
+        scim_obj.base_location,
+        generations[get_fragment_generation_key(adapter.resource_type, scim_obj.obj.pk)],
+        [generations[get_fragment_generation_key(rt)] for rt in adapter.related_resource_types],
+    )
+
+
+def get_fragments(scim_objs, render):
+    """
+    Return the JSON documents of ``scim_objs`` (instances of the same
+    adapter) from the fragment cache. The documents of the objects missing
+    from the cache are returned by ``render``, which takes a list of adapter
+    instances and returns their JSON documents, and cached.
+    """
+    if not scim_objs:
+        return []
+
+    adapter = type(scim_objs[0])
+    generation_keys = [
+        get_fragment_generation_key(adapter.resource_type, scim_obj.obj.pk)
+        for scim_obj in scim_objs
+    ]
+    generation_keys.extend(get_fragment_generation_key(rt) for rt in adapter.related_resource_types)
+    generations = get_counters(generation_keys)
+
+    keys = [get_fragment_key(scim_obj, generations) for scim_obj in scim_objs]
+    cache = get_cache()
+    fragments = cache.get_many(keys)
+
+    missing = [(key, scim_obj) for key, scim_obj in zip(keys, scim_objs) if key not in fragments]
+    metrics.record_cache_lookup('fragment', True, amount=len(keys) - len(missing))
+    metrics.record_cache_lookup('fragment', False, amount=len(missing))
+    if missing:
+        rendered = dict(zip([key for key, _ in missing], render([scim_obj for _, scim_obj in missing])))
+        cache.set_many(rendered, timeout=scim_settings.FRAGMENT_CACHE_TIMEOUT)
+        fragments.update(rendered)
+
+    return [fragments[key] for key in keys]
+
+
+def bump_fragment_generations(keys, using):
+    """
+    Bump the fragment generation counters ``keys`` once the current
+    transaction on ``using`` commits.
+    """
+    def bump():
+        for key in keys:
+            bump_counter(key)
+
+    transaction.on_commit(bump, using=using)
+
+
+def handle_save_or_delete(sender, instance, using, **kwargs):
+    if not fragments_enabled():
+        return
+
+    adapter = get_model_adapter(sender)
+    if adapter is None:
+        return
+
+    resource_type = adapter.resource_type
+
+    # The counter of the whole resource type is part of the fragment keys of
+    # the resource types that embed its data.
+    bump_fragment_generations([
+        get_fragment_generation_key(resource_type, instance.pk),
+        get_fragment_generation_key(resource_type),
+    ], using)
+
+
+def handle_m2m_changed(sender, instance, action, model, pk_set, using, **kwargs):
+    if not fragments_enabled() or action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    adapter = get_model_adapter(type(instance))
+    related_adapter = get_model_adapter(model)
+    if adapter is None or related_adapter is None:
+        return
+
+    resource_type = adapter.resource_type
+    related_resource_type = related_adapter.resource_type
+
+    keys = [get_fragment_generation_key(resource_type, instance.pk)]
+    if pk_set is None:
+        # A clear does not tell which objects were affected: invalidate the
+        # fragments of every object of the related resource type.
+        keys.append(get_fragment_generation_key(resource_type))
+    else:
+        keys.extend(get_fragment_generation_key(related_resource_type, pk) for pk in pk_set)
+    bump_fragment_generations(keys, using)
+
+
+def handle_save_negative(sender, instance, using, update_fields=None, **kwargs):
+    # Like lastModified, saves of a few fields (eg. ``last_login`` on login)
+    # do not change the values lookups are made on.
+    if not negative_enabled() or (update_fields is not None and 'scim_last_modified' not in update_fields):
+        return
+
+    adapter = get_model_adapter(sender)
+    if adapter is None:
+        return
+
+    # Creates and changes of lookup values (through SCIM or not) may make
+    # objects found by lookups remembered as missing in any tenant.
+    key = get_negative_generation_key(adapter.resource_type)
+    transaction.on_commit(lambda: bump_counter(key), using=using)
+
+
+def connect_signals(**kwargs):
+    """
+    Connect the receivers invalidating fragments if the fragment cache is
+    enabled, and the ones forgetting missing objects if the negative cache
+    is enabled, and disconnect them otherwise: ``m2m_changed`` receivers
+    disable the fast path of ``add()`` on many-to-many relations.
+
+    Receivers are connected for all senders since the user and group models
+    are resolved from settings that may change at runtime.
+    """
+    signals = [
+        (post_save, handle_save_or_delete, 'django_scim.cache.save', fragments_enabled()),
+        (post_delete, handle_save_or_delete, 'django_scim.cache.delete', fragments_enabled()),
+        (m2m_changed, handle_m2m_changed, 'django_scim.cache.m2m_changed', fragments_enabled()),
+        (post_save, handle_save_negative, 'django_scim.cache.save_negative', negative_enabled()),
+    ]
+    for signal, receiver, dispatch_uid, enabled in signals:
+        if enabled:
+            signal.connect(receiver, dispatch_uid=dispatch_uid)
+        else:
+            signal.disconnect(receiver, dispatch_uid=dispatch_uid)
@@ -0,0 +1,223 @@
+"""
+Change log of users and groups for incremental synchronization.
+
+Every user and group maintains ``scim_last_modified`` (reported as
+``meta.lastModified``), so clients can fetch the resources changed since
+their last synchronization with a filter such as::
+
+    GET /scim/v2/Users?filter=meta.lastModified gt "2024-05-01T12:00:00Z"
+
+which is compiled to a range scan on the indexed column. The column is
+nullable and only set by saves, so rows existing when it was added must be
+backfilled by a data migration, eg. for users::
+
+    def backfill(apps, schema_editor):
+        User = apps.get_model('myapp', 'User')
+        User.objects.filter(scim_last_modified__isnull=True).update(
+            scim_last_modified=F('date_joined'),
+        )
+
+or filters on ``meta.lastModified`` leave them out. Such filters can
+not report deleted resources. When the ``CHANGE_LOG_MODEL`` setting names a
+concrete subclass of ``django_scim.models.AbstractSCIMChange``,
+``post_save``, ``post_delete`` and ``m2m_changed`` receivers append a row
+per create, update and delete (with membership changes recorded as updates
+of both the users and the groups) in the transaction of the write, and
+``django_scim.views.ChangesView`` (mounted at ``<scim root>/Changes``)
+returns the resources changed after a watermark: the current document of
+created and updated resources and a tombstone for deleted ones::
+
+    GET /scim/v2/Changes?since=1234&count=100
+
+The ``watermark`` of the response is the sequence number of the last change
+it includes; pass it as ``since`` to get the next changes. Sequence numbers
+are allocated when a change is recorded, not when its transaction commits,
+so a change may become visible after changes with higher numbers. Changes
+are only listed once they are ``CHANGE_LOG_SETTLE_SECONDS`` old, which must
+exceed the duration of the longest transaction writing users or groups.
+
+Changes are recorded with the tenant (as returned by the ``TENANT_GETTER``
+setting) of the SCIM request making them, and the listing of a tenant only
+includes its own changes and the changes made outside SCIM requests. The
+latter never produce tombstones for a tenant; wrap deletes made outside SCIM
+requests in ``recording_tenant(tenant)`` to report them.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.db.models import Q
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.utils import timezone
+
+from .settings import scim_settings
+from .utils import get_model_adapter
+
+# Tenant of the SCIM request being processed, recorded with its changes.
+current_tenant = ContextVar('django_scim_changelog_tenant', default=None)
+
+
+def is_enabled():
+    return scim_settings.CHANGE_LOG_MODEL is not None
+
+
+def get_change_model():
+    return scim_settings.CHANGE_LOG_MODEL
+
+
+def get_resource_type(model):
+    adapter = get_model_adapter(model)
+    return adapter.resource_type if adapter is not None else None
+
+
+def get_tenant_value(tenant):
+    return None if tenant is None else str(tenant)
+
+
+@contextmanager
+def recording_tenant(tenant):
+    """
+    Record the changes made in the block with ``tenant``.
+    """
+    token = current_tenant.set(get_tenant_value(tenant))
+    try:
+        yield
+    finally:
+        current_tenant.reset(token)
+
+
+def record(resource_type, action, pks, scim_ids=None, using=None):
+    """
+    Append a change of ``action`` for each of objects ``pks`` of
+    ``resource_type`` to the log in the database ``using``.
+    """
+    model = get_change_model()
+    scim_ids = scim_ids or [None] * len(pks)
+    tenant = current_tenant.get()
+    model.objects.using(using).bulk_create([
+        model(resource_type=resource_type, object_id=str(pk), scim_id=scim_id, action=action, tenant=tenant)
+        for pk, scim_id in zip(pks, scim_ids)
+    ])
+
+
+def get_changes(since=0, count=None, resource_types=None, tenant=None, using=None):
+    """
+    Return the settled changes recorded in the database ``using`` after
+    sequence number ``since``, oldest first. When ``tenant`` is given, only
+    the changes of that tenant and those made outside SCIM requests are
+    returned.
+    """
+    qs = get_change_model().objects.using(using).filter(id__gt=since).order_by('id')
+    if resource_types:
+        qs = qs.filter(resource_type__in=resource_types)
+    if tenant is not None:
+        qs = qs.filter(Q(tenant=get_tenant_value(tenant)) | Q(tenant__isnull=True))
+    if scim_settings.CHANGE_LOG_SETTLE_SECONDS:
+        # Hold back the first change not settled yet and all those after
+        # it, so the watermark never passes a change still to be listed.
+        settled = timezone.now() - timedelta(seconds=scim_settings.CHANGE_LOG_SETTLE_SECONDS)
+        unsettled = qs.filter(timestamp__gt=settled).values_list('id', flat=True).first()
+        if unsettled is not None:
+            qs = qs.filter(id__lt=unsettled)
+    if count is not None:
+        qs = qs[:count]
+    return list(qs)
+
+
+def collapse(changes):
+    """
+    Return the last of ``changes`` for each object, in the order of those
+    last changes.
+    """
+    last = {}
+    for change in changes:
+        last.pop((change.resource_type, change.object_id), None)
+        last[(change.resource_type, change.object_id)] = change
+    return list(last.values())
+
+
+def get_related_pks(through, instance, model, using=None):
+    """
+    Return the primary keys of the ``model`` instances related to
+    ``instance`` through the many-to-many ``through`` model.
+    """
+    source = target = None
+    for field in through._meta.concrete_fields:
+        if not field.is_relation:
+            continue
+        if source is None and isinstance(instance, field.related_model):
+            source = field
+        elif issubclass(model, field.related_model):
+            target = field
+
+    return set(through.objects.using(using).filter(**{source.name: instance.pk}).values_list(target.attname, flat=True))
+
+
+def handle_save(sender, instance, created, using, update_fields=None, **kwargs):
+    # Like lastModified, saves of a few fields (eg. ``last_login`` on login)
+    # are not changes of the resource.
+    if update_fields is not None and 'scim_last_modified' not in update_fields:
+        return
+
+    resource_type = get_resource_type(sender)
+    if resource_type is not None:
+        action = get_change_model().CREATE if created else get_change_model().UPDATE
+        record(resource_type, action, [instance.pk], [instance.scim_id], using)
+
+
+def handle_pre_delete(sender, instance, using, **kwargs):
+    # Memberships are deleted along with the object, without m2m_changed.
+    adapter = get_model_adapter(sender)
+    if adapter is None:
+        return
+
+    for resource_type, qs in adapter(instance).get_related_objects().items():
+        pks = list(qs.values_list('pk', flat=True))
+        if pks:
+            record(resource_type, get_change_model().UPDATE, pks, using=using)
+
+
+def handle_delete(sender, instance, using, **kwargs):
+    resource_type = get_resource_type(sender)
+    if resource_type is not None:
+        record(resource_type, get_change_model().DELETE, [instance.pk], [instance.scim_id], using)
+
+
+def handle_m2m_changed(sender, instance, action, model, pk_set, using, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    resource_type = get_resource_type(type(instance))
+    related_resource_type = get_resource_type(model)
+    if resource_type is None or related_resource_type is None:
+        return
+
+    if action == 'pre_clear':
+        # The related objects are only known before the clear.
+        pk_set = get_related_pks(sender, instance, model, using)
+
+    record(resource_type, get_change_model().UPDATE, [instance.pk], [instance.scim_id], using)
+    record(related_resource_type, get_change_model().UPDATE, sorted(pk_set), using=using)
+
+
+def connect_signals(**kwargs):
+    """
+    Connect the receivers recording changes if the change log is enabled,
+    and disconnect them otherwise.
+    """
+    signals = [
+        (post_save, handle_save, 'django_scim.changelog.save'),
+        (pre_delete, handle_pre_delete, 'django_scim.changelog.pre_delete'),
+        (post_delete, handle_delete, 'django_scim.changelog.delete'),
+        (m2m_changed, handle_m2m_changed, 'django_scim.changelog.m2m_changed'),
+    ]
+    for signal, receiver, dispatch_uid in signals:
+        if is_enabled():
+            signal.connect(receiver, dispatch_uid=dispatch_uid)
+        else:
+            signal.disconnect(receiver, dispatch_uid=dispatch_uid)
@@ -0,0 +1,264 @@
+"""
+Materialized SCIM documents.
+
+When the ``DOCUMENT_MODEL`` setting names a concrete subclass of
+``django_scim.models.AbstractSCIMDocument``, the JSON documents of users and
+groups are stored in that model's table and SCIM responses are assembled
+from the stored documents rather than by serializing every resource with its
+adapter's ``to_dict``. Serving a page of resources then takes a single query
+on the document table once the page of objects is loaded.
+
+Documents are rendered with the placeholder base location
+``PLACEHOLDER_LOCATION``, replaced by the base location of each request when
+they are served, so adapters must not depend on the request otherwise when
+the store is enabled.
+
+Adapter ``save`` and ``handle_operations`` store the new document of the
+object in the transaction of the write. ``post_save``, ``pre_delete``,
+``post_delete`` and ``m2m_changed`` receivers clear, in the same
+transaction, the documents of the changed object and of the objects whose
+documents embed its data (the groups of a user and the members of a group).
+Cleared and missing documents are rendered again the next time they are
+served, and stored unless a write stored a document in the meantime or the
+objects were loaded from a read replica.
+"""
+import json
+from urllib.parse import urljoin
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.http import HttpRequest
+
+from .settings import scim_settings
+from .utils import SCIMRequestContext, get_model_adapter, get_request_context
+
+PLACEHOLDER_LOCATION = 'https://django-scim.invalid'
+
+
+def is_enabled():
+    return scim_settings.DOCUMENT_MODEL is not None
+
+
+def get_document_model():
+    return scim_settings.DOCUMENT_MODEL
+
+
+def get_render_request(request=None):
+    """
+    Return a request to render documents with: its SCIM context has the
+    placeholder base location and the timer of ``request``, if any.
+    """
+    render_request = HttpRequest()
+    context = SCIMRequestContext(render_request)
+    context.base_location = PLACEHOLDER_LOCATION
+    if request is not None:
+        context.timer = get_request_context(request).timer
+    render_request.scim_context = context
+    return render_request
+
+
+def render(adapter, objs, request=None):
+    """
+    Return the documents of model instances ``objs`` for storage.
+    """
+    render_request = get_render_request(request)
+    timer = render_request.scim_context.timer
+    objs = adapter.prefetch(objs)
+    with timer.phase('serialize'):
+        docs = [adapter(obj, request=render_request).to_dict() for obj in objs]
+    with timer.phase('encode'):
+        return [json.dumps(doc) for doc in docs]
+
+
+def save_document(resource_type, object_id, document, using=None):
+    """
+    Store ``document`` as the document of object ``object_id`` of
+    ``resource_type`` in the database ``using``.
+    """
+    model = get_document_model()
+    lookup = {'resource_type': resource_type, 'object_id': str(object_id)}
+    if model.objects.using(using).filter(**lookup).update(document=document, version=F('version') + 1):
+        return
+
+    try:
+        with transaction.atomic(using=using):
+            model.objects.using(using).create(document=document, **lookup)
+    except IntegrityError:
+        # Created by a concurrent request.
+        model.objects.using(using).filter(**lookup).update(document=document, version=F('version') + 1)
+
+
+def fill_document(resource_type, object_id, document, exists, using=None):
+    """
+    Store ``document`` as the document of object ``object_id`` of
+    ``resource_type`` in the database ``using`` unless a document was stored
+    since it was found missing. ``exists`` tells whether the object has a
+    row in the store, with a cleared document.
+    """
+    model = get_document_model()
+    lookup = {'resource_type': resource_type, 'object_id': str(object_id)}
+    if exists:
+        model.objects.using(using).filter(document__isnull=True, **lookup).update(
+            document=document,
+            version=F('version') + 1,
+        )
+        return
+
+    try:
+        with transaction.atomic(using=using):
+            model.objects.using(using).create(document=document, **lookup)
+    except IntegrityError:
+        # Stored by a concurrent request, from objects at least as recent.
+        pass
+
+
+def refresh(scim_obj):
+    """
+    Render and store the document of adapter instance ``scim_obj``.
+    """
+    if not is_enabled():
+        return
+
+    adapter = type(scim_obj)
+    document, = render(adapter, [scim_obj.obj], scim_obj._request)
+    save_document(adapter.resource_type, scim_obj.obj.pk, document, scim_obj.database)
+
+
+def clear(resource_type, pks, using=None):
+    """
+    Clear the documents of objects ``pks`` of ``resource_type`` in the
+    database ``using`` so that they are rendered again the next time they
+    are served.
+    """
+    pks = [str(pk) for pk in pks]
+    if pks:
+        get_document_model().objects.using(using).filter(
+            resource_type=resource_type,
+            object_id__in=pks,
+        ).update(document=None)
+
+
+def localize(document, base_location):
+    """
+    Replace the placeholder base location of a stored document with the
+    origin of ``base_location``.
+    """
+    # Locations are made by joining the base location with absolute paths,
+    # which keeps only the scheme and host of the base location.
+    origin = urljoin(base_location, '/').rstrip('/')
+    return document.replace(PLACEHOLDER_LOCATION, json.dumps(origin)[1:-1])
+
+
+def get_documents(adapter, objs, request):
+    """
+    Return the JSON documents of model instances ``objs``, rendering and
+    storing the ones missing from the store.
+    """
+    objs = list(objs)
+    # Documents are stored in the database of the objects they render, and
+    # read from the database the objects were loaded from (eg. a replica).
+    # Missing documents are only stored when the objects were loaded from
+    # the primary: objects loaded from a lagging replica may be stale.
+    context = get_request_context(request)
+    using = objs[0]._state.db if objs else None
+    rows = dict(get_document_model().objects.using(using).filter(
+        resource_type=adapter.resource_type,
+        object_id__in=[str(obj.pk) for obj in objs],
+    ).values_list('object_id', 'document'))
+    documents = {object_id: document for object_id, document in rows.items() if document is not None}
+
+    missing = [obj for obj in objs if str(obj.pk) not in documents]
+    if missing:
+        for obj, document in zip(missing, render(adapter, missing, request)):
+            if context.read_database == context.database:
+                fill_document(adapter.resource_type, obj.pk, document, str(obj.pk) in rows, context.database)
+            documents[str(obj.pk)] = document
+
+    return [localize(documents[str(obj.pk)], context.base_location) for obj in objs]
+
+
+def clear_related(scim_obj, using=None):
+    for resource_type, qs in scim_obj.get_related_objects().items():
+        clear(resource_type, qs.values_list('pk', flat=True), using)
+
+
+def is_rendered(adapter, model, update_fields):
+    """
+    Return whether a save of ``update_fields`` may change the documents
+    rendered by ``adapter``.
+    """
+    if update_fields is None:
+        return True
+
+    fields = adapter.get_only_fields(model)
+    if fields is None:
+        # Like the change log, saves of fields other than lastModified (eg.
+        # ``last_login`` on login) are not changes of the resource.
+        return 'scim_last_modified' in update_fields
+
+    return not update_fields.isdisjoint(fields)
+
+
+def handle_save(sender, instance, using, update_fields=None, **kwargs):
+    adapter = get_model_adapter(sender)
+    if adapter is None or not is_rendered(adapter, sender, update_fields):
+        return
+
+    clear(adapter.resource_type, [instance.pk], using)
+    clear_related(adapter(instance), using)
+
+
+def handle_pre_delete(sender, instance, using, **kwargs):
+    # Memberships are deleted along with the object, before post_delete.
+    adapter = get_model_adapter(sender)
+    if adapter is not None:
+        clear_related(adapter(instance), using)
+
+
+def handle_post_delete(sender, instance, using, **kwargs):
+    adapter = get_model_adapter(sender)
+    if adapter is not None:
+        get_document_model().objects.using(using).filter(
+            resource_type=adapter.resource_type,
+            object_id=str(instance.pk),
+        ).delete()
+
+
+def handle_m2m_changed(sender, instance, action, model, pk_set, using, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    adapter = get_model_adapter(type(instance))
+    related_adapter = get_model_adapter(model)
+    if adapter is None or related_adapter is None:
+        return
+
+    clear(adapter.resource_type, [instance.pk], using)
+    if action == 'pre_clear':
+        clear_related(adapter(instance), using)
+    else:
+        clear(related_adapter.resource_type, pk_set, using)
+
+
+def connect_signals(**kwargs):
+    """
+    Connect the receivers clearing stale documents if the document store is
+    enabled, and disconnect them otherwise.
+    """
+    signals = [
+        (post_save, handle_save, 'django_scim.documents.save'),
+        (pre_delete, handle_pre_delete, 'django_scim.documents.pre_delete'),
+        (post_delete, handle_post_delete, 'django_scim.documents.post_delete'),
+        (m2m_changed, handle_m2m_changed, 'django_scim.documents.m2m_changed'),
+    ]
+    for signal, receiver, dispatch_uid in signals:
+        if is_enabled():
+            signal.connect(receiver, dispatch_uid=dispatch_uid)
+        else:
+            signal.disconnect(receiver, dispatch_uid=dispatch_uid)
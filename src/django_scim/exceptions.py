@@ -48,5 +48,16 @@ class IntegrityError(SCIMException):
     status = 409
 
 
+class VersionConflictError(IntegrityError):
+
+    def __init__(self, detail=None, **kwargs):
+        detail = detail or 'Resource was modified by a concurrent request'
+        super(VersionConflictError, self).__init__(detail, **kwargs)
+
+
+class PreconditionFailedError(SCIMException):
+    status = 412
+
+
 class NotImplementedError(SCIMException):
     status = 501
@@ -1,30 +1,226 @@
 """
 Transform filter query into QuerySet
 """
+import json
+import re
+from datetime import timezone as dt_timezone
+from functools import lru_cache
+
+from django.db import connections, models, router
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from scim2_filter_parser import ast as scim2ast
+from scim2_filter_parser.lexer import SCIMLexer
+from scim2_filter_parser.parser import SCIMParser
 from scim2_filter_parser.queries.sql import SQLQuery
+from scim2_filter_parser.transpilers.sql import Transpiler
+
+from . import constants
+from .utils import (
+    get_all_schemas_getter,
+    get_group_model,
+    get_request_context,
+    get_user_model,
+)
+
+# String, number and literal values of a SCIM filter, eg. "bob", 42 or true.
+FILTER_VALUE_RE = re.compile(r'"(?:[^"\\]|\\.)*"|\b(?:\d+(?:\.\d+)?|true|false|null)\b', re.IGNORECASE)
+
+# Filter made of a single equality test on a string value, eg. userName eq "bob".
+EQUALITY_FILTER_RE = re.compile(r'^\s*([A-Za-z][\w$-]*)\s+eq\s+("(?:[^"\\]|\\.)*")\s*$', re.IGNORECASE)
+
+
+def normalize_filter(filter_query):
+    """
+    Return the shape of a filter with its values replaced by ``?``, eg.
+    ``name.familyName co "Hol" or userName sw "e"`` becomes
+    ``name.familyName co ? or userName sw ?``. Filters with the same shape
+    produce the same SQL and can be grouped in diagnostics.
+    """
+    return ' '.join(FILTER_VALUE_RE.sub('?', filter_query).split())
+
+
+def parse_equality_filter(filter_query):
+    """
+    Return the ``(attribute, value)`` tested by a filter made of a single
+    equality test on a string value, eg. ``('userName', 'bob')`` for
+    ``userName eq "bob"``, or None for any other filter.
+    """
+    match = EQUALITY_FILTER_RE.match(filter_query)
+    if match is None:
+        return None
+
+    attr, value = match.groups()
+    try:
+        return attr, json.loads(value)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=32)
+def get_case_insensitive_schema_attrs(schemas_getter, schema_uris):
+    """
+    Return the ``(attribute, sub-attribute)`` names (lower cased) of the
+    string attributes with ``"caseExact": false`` in the schemas identified
+    by ``schema_uris``.
+    """
+    attrs = set()
+    for schema in schemas_getter():
+        if schema.get('id') not in schema_uris:
+            continue
+
+        for attr in schema.get('attributes', []):
+            name = attr['name'].lower()
+            if attr.get('type') == 'string' and attr.get('caseExact') is False:
+                attrs.add((name, None))
+            for sub_attr in attr.get('subAttributes', []):
+                if sub_attr.get('type') == 'string' and sub_attr.get('caseExact') is False:
+                    attrs.add((name, sub_attr['name'].lower()))
+
+    return frozenset(attrs)
+
+
+class CaseInsensitiveAttrExpr(scim2ast.AttrExpr):
+    value: str
+    attr_path: scim2ast.AttrPath
+    comp_value: scim2ast.CompValue
+
+    case_insensitive = True
+
+
+class SCIMTranspiler(Transpiler):
+    """
+    Transpiler that compares the attributes in ``case_insensitive_attr_paths``
+    (``attr_map`` keys) like the base transpiler compares ``userName``:
+    ``UPPER(column) = UPPER(%s)``. Both sides are upper cased by the database
+    so that the comparison does not depend on the database collation, and a
+    functional index on ``UPPER(column)`` serves the lookup. The package
+    does not create these indexes: ``scim_index_advisor`` reports the
+    missing ones and can emit a migration creating them.
+
+    Values compared to the attributes in ``value_converters`` (a dict
+    mapping ``attr_map`` keys to callables) are converted by the matching
+    callable, eg. to compare timestamps in the database's format.
+    """
+
+    def __init__(self, attr_map, case_insensitive_attr_paths=(), value_converters=None, *args, **kwargs):
+        super().__init__(attr_map, *args, **kwargs)
+        self.case_insensitive_attr_paths = frozenset(case_insensitive_attr_paths)
+        self.value_converters = value_converters or {}
+
+    def visit_AttrExpr(self, node):
+        attr_path = node.attr_path
+        key = None
+        if not isinstance(attr_path.attr_name, scim2ast.Filter):
+            key = (
+                attr_path.attr_name,
+                attr_path.sub_attr.value if attr_path.sub_attr else None,
+                attr_path.uri or None,
+            )
+            if key in self.case_insensitive_attr_paths:
+                node = CaseInsensitiveAttrExpr(node.value, attr_path, node.comp_value)
+
+        param_ids = set(self.params)
+        sql = super().visit_AttrExpr(node)
 
-from .utils import get_group_model, get_user_model
+        converter = self.value_converters.get(key)
+        if converter is not None:
+            for param_id in set(self.params) - param_ids:
+                if self.params[param_id] is not None:
+                    self.params[param_id] = converter(self.params[param_id])
+
+        return sql
+
+
+class SCIMSQLQuery(SQLQuery):
+    """
+    ``SQLQuery`` compiling filters with ``SCIMTranspiler``.
+    """
+
+    def __init__(self, filter_, table_name, attr_map, joins=(), case_insensitive_attr_paths=(),
+                 value_converters=None):
+        self.case_insensitive_attr_paths = case_insensitive_attr_paths
+        self.value_converters = value_converters
+        super().__init__(filter_, table_name, attr_map, joins)
+
+    def build_where_sql(self):
+        self.token_stream = SCIMLexer().tokenize(self.filter)
+        self.ast = SCIMParser().parse(self.token_stream)
+        self.transpiler = SCIMTranspiler(self.attr_map, self.case_insensitive_attr_paths, self.value_converters)
+        self.where_sql, self.params_dict = self.transpiler.transpile(self.ast)
 
 
 class FilterQuery:
     model_getter = None
     joins = ()
     attr_map = None
-    query_class = SQLQuery
+    query_class = SCIMSQLQuery
+
+    # Schemas whose ``caseExact`` attribute characteristics decide which
+    # attributes are compared case-insensitively.
+    schema_uris = ()
 
     @classmethod
     def table_name(cls):
         return cls.model_getter()._meta.db_table
 
+    @classmethod
+    def case_insensitive_attr_paths(cls):
+        """
+        Return the ``attr_map`` keys compared case-insensitively: userName
+        (always case-insensitive per RFC 7643), the attributes with
+        ``"caseExact": false`` in ``schema_uris`` and any other key mapped to
+        the same column as one of those.
+        """
+        schema_attrs = get_case_insensitive_schema_attrs(get_all_schemas_getter(), tuple(cls.schema_uris))
+        attr_paths = {
+            (attr, sub_attr, uri) for attr, sub_attr, uri in cls.attr_map
+            if attr == 'userName' or (attr.lower(), sub_attr.lower() if sub_attr else None) in schema_attrs
+        }
+        columns = {cls.attr_map[attr_path] for attr_path in attr_paths}
+        return frozenset(attr_path for attr_path, column in cls.attr_map.items() if column in columns)
+
+    @classmethod
+    def value_converters(cls, using=None):
+        """
+        Return a dict mapping the ``attr_map`` keys of date time columns of
+        the model (eg. ``meta.lastModified``) to a function converting SCIM
+        date time strings to the format of the database ``using``, so that
+        comparisons are done on date times and served by the columns'
+        indexes.
+        """
+        model = cls.model_getter()
+        columns = {
+            f.column for f in model._meta.concrete_fields
+            if isinstance(f, models.DateTimeField)
+        }
+        connection = connections[using or router.db_for_read(model)]
+
+        def convert(value):
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError(f'Invalid date time: {value}')
+            if timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed, dt_timezone.utc)
+            return connection.ops.adapt_datetimefield_value(parsed)
+
+        return {attr_path: convert for attr_path, column in cls.attr_map.items() if column in columns}
+
     @classmethod
     def search(cls, filter_query, request=None):
-        q = cls.query_class(filter_query, cls.table_name(), cls.attr_map, cls.joins)
+        # Read from the database chosen for the request, if any.
+        using = get_request_context(request).read_database
+        if issubclass(cls.query_class, SCIMSQLQuery):
+            q = cls.query_class(filter_query, cls.table_name(), cls.attr_map, cls.joins,
+                                cls.case_insensitive_attr_paths(), cls.value_converters(using))
+        else:
+            q = cls.query_class(filter_query, cls.table_name(), cls.attr_map, cls.joins)
         if q.where_sql is None:
-            return cls.model_getter().objects.none()
+            return cls.model_getter().objects.db_manager(using).none()
 
         sql, params = cls.get_raw_args(q, request)
 
-        return cls.model_getter().objects.raw(sql, params)
+        return cls.model_getter().objects.db_manager(using).raw(sql, params)
 
     @classmethod
     def get_raw_args(cls, q, request=None):
@@ -47,6 +243,17 @@ class FilterQuery:
 
         return sql, params
 
+    @classmethod
+    def explain(cls, qs):
+        """
+        Return the query plan of the raw queryset returned by ``search``.
+        """
+        connection = connections[qs.db]
+        sql = connection.ops.explain_query_prefix() + ' ' + qs.raw_query.strip().rstrip(';')
+        with connection.cursor() as cursor:
+            cursor.execute(sql, qs.params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
     @classmethod
     def get_extras(cls, q, request=None) -> (str, list):
         """
@@ -61,6 +268,7 @@ class FilterQuery:
 
 class UserFilterQuery(FilterQuery):
     model_getter = get_user_model
+    schema_uris = (constants.SchemaURI.USER, constants.SchemaURI.ENTERPRISE_USER)
     attr_map = {
         # attr, sub attr, uri
         ('userName', None, None): 'username',
@@ -69,9 +277,13 @@ class UserFilterQuery(FilterQuery):
         ('name', 'givenName', None): 'first_name',
         ('givenName', None, None): 'first_name',
         ('active', None, None): 'is_active',
+        ('meta', 'lastModified', None): 'scim_last_modified',
     }
 
 
 class GroupFilterQuery(FilterQuery):
     model_getter = get_group_model
-    attr_map = {}
+    schema_uris = (constants.SchemaURI.GROUP,)
+    attr_map = {
+        ('meta', 'lastModified', None): 'scim_last_modified',
+    }
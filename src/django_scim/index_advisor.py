@@ -0,0 +1,229 @@
+"""
+Check that the columns SCIM clients can filter on are indexed.
+
+The ``attr_map`` of the user and group filter parsers (which the adapters'
+``ATTR_MAP`` defaults to) lists the columns that filters are compiled to.
+Each column needs an index suited to the way it is compared:
+
+* ``eq``, ``ne``, ``gt``, ``ge``, ``lt``, ``le`` and ``pr`` need a b-tree
+  index on the column, or on the upper cased column for attributes compared
+  case-insensitively (``userName`` and other ``caseExact`` false attributes,
+  see ``FilterQuery.case_insensitive_attr_paths``).
+* ``co``, ``sw`` and ``ew`` compile to ``LIKE`` with a leading wildcard for
+  ``co`` and ``ew``, which b-tree indexes can not serve. On PostgreSQL they
+  need a trigram (``pg_trgm``) GIN index. Other databases have no index type
+  for these lookups.
+
+``advise`` compares these needs with the indexes found by database
+introspection; the ``scim_index_advisor`` management command reports the
+result and can write a migration creating the missing indexes.
+"""
+import hashlib
+import re
+from dataclasses import dataclass, field
+
+from django.db import connections
+from django.db.models import F, Index
+from django.db.models.functions import Upper
+
+from .utils import get_group_filter_parser, get_user_filter_parser
+
+EQUALITY = 'equality'
+PATTERN = 'pattern'
+
+OPERATORS = {
+    EQUALITY: ('eq', 'ne', 'gt', 'ge', 'lt', 'le', 'pr'),
+    PATTERN: ('co', 'sw', 'ew'),
+}
+
+
+NON_BTREE_TYPES = ('gin', 'gist', 'brin', 'hash', 'spgist', 'fulltext', 'spatial')
+
+
+@dataclass
+class Advice:
+    model: type
+    column: str
+    operator_class: str
+    case_insensitive: bool
+    attrs: list = field(default_factory=list)
+    index: Index = None
+    existing: str = None
+    note: str = None
+
+    @property
+    def missing(self):
+        return self.existing is None and self.index is not None
+
+    @property
+    def operators(self):
+        return OPERATORS[self.operator_class]
+
+    def describe(self):
+        target = f'UPPER({self.column})' if self.case_insensitive else self.column
+        attrs = ', '.join(self.attrs)
+        line = f'{self.model._meta.label}.{target} [{attrs}] {"/".join(self.operators)}: '
+        if self.existing:
+            return line + f'ok (index {self.existing})'
+        if self.note:
+            return line + self.note
+        return line + f'missing {describe_index(self.index)}'
+
+
+def describe_index(index):
+    kind = 'trigram GIN index' if index.__class__.__name__ == 'GinIndex' else 'b-tree index'
+    return f'{kind} {index.name}'
+
+
+def get_attr_name(attr_path):
+    attr, sub_attr, uri = attr_path
+    return f'{attr}.{sub_attr}' if sub_attr else attr
+
+
+def get_filter_columns(parser):
+    """
+    Return a dict mapping each column of ``parser.attr_map`` on the parser's
+    model table to the attribute paths mapped to it, split by whether the
+    attribute is compared case-insensitively.
+    """
+    case_insensitive_attr_paths = get_case_insensitive_attr_paths(parser)
+    columns = {}
+    for attr_path, column in parser.attr_map.items():
+        case_insensitive = attr_path in case_insensitive_attr_paths
+        columns.setdefault((column, case_insensitive), []).append(get_attr_name(attr_path))
+    return columns
+
+
+def get_case_insensitive_attr_paths(parser):
+    """
+    Return the ``attr_map`` keys the parser compares with ``UPPER()`` on both
+    sides. Parsers that do not derive from ``FilterQuery`` only compare
+    userName case-insensitively.
+    """
+    if hasattr(parser, 'case_insensitive_attr_paths'):
+        return parser.case_insensitive_attr_paths()
+    return {attr_path for attr_path in parser.attr_map if attr_path[0] == 'userName'}
+
+
+def get_index_name(table, column, suffix):
+    digest = hashlib.md5(f'{table}.{column}.{suffix}'.encode()).hexdigest()[:6]
+    return f'scim_{column[:13]}_{suffix}_{digest}'
+
+
+def build_index(model, column, operator_class, case_insensitive, vendor):
+    """
+    Return an unsaved ``Index`` suited to ``operator_class`` or None if the
+    database has no suitable index type.
+    """
+    field_name = next(f.name for f in model._meta.concrete_fields if f.column == column)
+    table = model._meta.db_table
+
+    if operator_class == EQUALITY:
+        if case_insensitive:
+            return Index(Upper(field_name), name=get_index_name(table, column, 'upper'))
+        return Index(fields=[field_name], name=get_index_name(table, column, 'btree'))
+
+    if vendor != 'postgresql':
+        return None
+
+    from django.contrib.postgres.indexes import GinIndex, OpClass
+
+    expression = Upper(field_name) if case_insensitive else F(field_name)
+    return GinIndex(OpClass(expression, name='gin_trgm_ops'), name=get_index_name(table, column, 'trgm'))
+
+
+def get_indexes(connection, table):
+    """
+    Return the indexes of ``table`` as a list of dicts with ``name``,
+    ``columns``, ``type`` and lower cased ``definition`` (for expression
+    indexes, when the database exposes it).
+    """
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+        definitions = {}
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = %s", [table])
+            definitions = dict(cursor.fetchall())
+
+    indexes = []
+    for name, constraint in constraints.items():
+        if not (constraint['index'] or constraint['unique'] or constraint['primary_key']):
+            continue
+        definition = constraint.get('definition') or definitions.get(name) or ''
+        indexes.append({
+            'name': name,
+            'columns': [c for c in constraint['columns'] or [] if c],
+            'type': (constraint.get('type') or '').lower(),
+            'definition': definition.lower(),
+        })
+    return indexes
+
+
+def serves(index, column, operator_class, case_insensitive):
+    """
+    Return True if ``index`` can serve ``operator_class`` lookups on
+    ``column``.
+    """
+    upper_re = r'upper\(\s*\(?\s*["`]?%s["`]?' % re.escape(column.lower())
+    on_column = index['columns'][:1] == [column]
+    if case_insensitive:
+        on_column = bool(re.search(upper_re, index['definition']))
+
+    if operator_class == EQUALITY:
+        return on_column and index['type'] not in NON_BTREE_TYPES
+
+    if case_insensitive:
+        on_column = on_column and 'gin_trgm_ops' in index['definition']
+    return on_column and index['type'] == 'gin'
+
+
+def find_index(indexes, column, operator_class, case_insensitive):
+    """
+    Return the name of the first index that serves ``operator_class`` on
+    ``column``, or None.
+    """
+    for index in indexes:
+        if serves(index, column, operator_class, case_insensitive):
+            return index['name']
+
+    return None
+
+
+def advise_parser(parser, using):
+    """
+    Return a list of ``Advice`` for the columns of a filter parser.
+    """
+    model = parser.model_getter()
+    connection = connections[using]
+    table = model._meta.db_table
+    model_columns = {f.column for f in model._meta.concrete_fields}
+    indexes = get_indexes(connection, table)
+
+    advice = []
+    for (column, case_insensitive), attrs in get_filter_columns(parser).items():
+        for operator_class in (EQUALITY, PATTERN):
+            item = Advice(model, column, operator_class, case_insensitive, attrs)
+            if column not in model_columns:
+                item.note = f'skipped, not a column of {table}'
+            else:
+                item.existing = find_index(indexes, column, operator_class, case_insensitive)
+                item.index = build_index(model, column, operator_class, case_insensitive, connection.vendor)
+                if item.index is None and not item.existing:
+                    item.note = f'no index type on {connection.vendor} can serve these operators'
+            advice.append(item)
+
+    return advice
+
+
+def advise(using='default', parsers=None):
+    """
+    Return a list of ``Advice`` for the configured user and group filter
+    parsers.
+    """
+    if parsers is None:
+        parsers = [get_user_filter_parser(), get_group_filter_parser()]
+
+    advice = []
+    for parser in parsers:
+        advice.extend(advise_parser(parser, using))
+    return advice
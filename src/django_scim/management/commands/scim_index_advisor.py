@@ -0,0 +1,104 @@
+import os
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, migrations
+from django.db.migrations.autodetector import MigrationAutodetector
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+
+from django_scim import index_advisor
+
+
+class Command(BaseCommand):
+    help = 'Report missing indexes on the columns SCIM filters are compiled to.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='database to inspect (default: %(default)s)')
+        parser.add_argument('--emit-migration', metavar='APP_LABEL',
+                            help='write a migration creating the missing indexes to this app')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='print the migration instead of writing it')
+
+    def handle(self, *args, **options):
+        advice = index_advisor.advise(using=options['database'])
+        for item in advice:
+            self.stdout.write(item.describe())
+
+        missing = [item for item in advice if item.missing]
+        if not missing:
+            self.stdout.write('No missing indexes.')
+            return
+
+        self.stdout.write(f'{len(missing)} missing index(es).')
+        if options['emit_migration']:
+            self.emit_migration(options['emit_migration'], missing, options)
+
+    def get_operations(self, missing, using):
+        connection = connections[using]
+        # The editor is only used to render statements, so it is not entered
+        # (which would start a transaction); set up what entering would.
+        schema_editor = connection.SchemaEditorClass(connection, collect_sql=True)
+        schema_editor.deferred_sql = []
+
+        operations = []
+        if any(item.operator_class == index_advisor.PATTERN for item in missing):
+            operations.append(migrations.RunSQL(
+                'CREATE EXTENSION IF NOT EXISTS pg_trgm;',
+                migrations.RunSQL.noop,
+            ))
+
+        # Indexes are created with raw SQL so that the migration can live in
+        # any app and does not add indexes to the state of models that may
+        # belong to third party apps (eg. django.contrib.auth).
+        for item in missing:
+            operations.append(migrations.RunSQL(
+                str(item.index.create_sql(item.model, schema_editor)) + ';',
+                str(item.index.remove_sql(item.model, schema_editor)) + ';',
+            ))
+        return operations
+
+    def get_dependencies(self, app_label, missing, loader):
+        app_labels = {app_label} | {item.model._meta.app_label for item in missing}
+        dependencies = []
+        for label in sorted(app_labels):
+            dependencies.extend(sorted(loader.graph.leaf_nodes(label)))
+        return dependencies
+
+    def get_migration_number(self, leaf_nodes):
+        """
+        Return the number of the migration following ``leaf_nodes``. Like
+        ``makemigrations``, migrations without a number (eg. with a custom
+        name) count as 0.
+        """
+        numbers = [MigrationAutodetector.parse_number(name) or 0 for app_label, name in leaf_nodes]
+        return max(numbers, default=0) + 1
+
+    def emit_migration(self, app_label, missing, options):
+        try:
+            apps.get_app_config(app_label)
+        except LookupError as e:
+            raise CommandError(str(e))
+
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        number = self.get_migration_number(loader.graph.leaf_nodes(app_label))
+
+        migration = migrations.Migration(f'{number:04d}_scim_filter_indexes', app_label)
+        migration.dependencies = self.get_dependencies(app_label, missing, loader)
+        migration.operations = self.get_operations(missing, options['database'])
+
+        writer = MigrationWriter(migration)
+        if options['dry_run']:
+            self.stdout.write(writer.as_string())
+            return
+
+        directory = os.path.dirname(writer.path)
+        os.makedirs(directory, exist_ok=True)
+        init_path = os.path.join(directory, '__init__.py')
+        if not os.path.exists(init_path):
+            open(init_path, 'w').close()
+
+        with open(writer.path, 'w') as fp:
+            fp.write(writer.as_string())
+        self.stdout.write(f'Wrote {writer.path}')
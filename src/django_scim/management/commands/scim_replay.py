@@ -0,0 +1,60 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from django_scim import traffic
+
+
+class Command(BaseCommand):
+    help = 'Replay a SCIM traffic recording and report throughput and latency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='NDJSON traffic recording')
+        parser.add_argument('--url',
+                            help='base URL of the server to replay against; when omitted '
+                                 'requests are sent through the Django test client')
+        parser.add_argument('--header', action='append', default=[], dest='headers',
+                            help='extra "Name: value" header sent with --url (may be repeated)')
+        parser.add_argument('--username',
+                            help='user to log the test client in as')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='number of concurrent requests; requests to a same path are '
+                                 'still sent in recorded order (default: %(default)s)')
+        parser.add_argument('--user-agent',
+                            help='only replay requests recorded from clients whose '
+                                 'user agent contains this value (eg. Okta)')
+
+    def get_sender(self, options):
+        if options['url']:
+            headers = {}
+            for header in options['headers']:
+                name, sep, value = header.partition(':')
+                if not sep:
+                    raise CommandError(f'Invalid header "{header}", expected "Name: value"')
+                headers[name.strip()] = value.strip()
+            return traffic.HTTPSender(options['url'], headers)
+
+        user = None
+        if options['username']:
+            user_model = get_user_model()
+            try:
+                user = user_model.objects.get(**{user_model.USERNAME_FIELD: options['username']})
+            except user_model.DoesNotExist:
+                raise CommandError(f'User "{options["username"]}" does not exist')
+        return traffic.ClientSender(user)
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1')
+
+        try:
+            records = traffic.load_records(options['path'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Unable to load {options["path"]}: {e}')
+
+        if options['user_agent']:
+            records = [r for r in records if options['user_agent'] in r.get('user_agent', '')]
+
+        report = traffic.replay(records, self.get_sender(options), options['concurrency'])
+        self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
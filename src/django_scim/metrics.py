@@ -0,0 +1,396 @@
+"""
+In-process metrics for SCIM traffic.
+
+When the ``METRICS_ENABLED`` setting is True, ``SCIMAuthCheckMiddleware``
+counts every SCIM request and observes its latency per endpoint, method and
+status, and the views record search and PATCH statistics. The values are
+exposed in the Prometheus text format by ``django_scim.views.MetricsView``
+(mounted at ``<scim root>/metrics``).
+
+Pre-forking servers such as Gunicorn run several worker processes, each with
+its own registry. When the ``METRICS_MULTIPROCESS_DIR`` setting points to a
+directory shared by the workers, each process dumps its values to a file in
+that directory at the end of a request at most every
+``METRICS_FLUSH_INTERVAL`` seconds (and when it serves a scrape) and the
+exposition view sums the files of all processes, so whichever worker serves
+the scrape reports the numbers of the whole server, up to that interval.
+When collecting, the files of processes that exited (eg. workers recycled by
+the server) are folded into a single file so that the directory does not
+grow with every worker ever started and their counts are kept.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from .settings import scim_settings
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+
+# Upper bounds of the latency histogram buckets, in seconds.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'scim_requests_total': (
+        COUNTER, 'Number of SCIM requests served.',
+    ),
+    'scim_request_duration_seconds': (
+        HISTOGRAM, 'Time spent serving SCIM requests.',
+    ),
+    'scim_filter_cache_requests_total': (
+        COUNTER, 'Number of filter and fragment cache lookups.',
+    ),
+    'scim_search_rows_scanned_total': (
+        COUNTER, 'Number of rows fetched by filter queries.',
+    ),
+    'scim_search_rows_returned_total': (
+        COUNTER, 'Number of resources returned by filter queries.',
+    ),
+    'scim_patch_operations_total': (
+        COUNTER, 'Number of operations applied by PATCH requests.',
+    ),
+    'scim_write_retries_total': (
+        COUNTER, 'Number of writes run again after a version conflict or a deadlock.',
+    ),
+}
+
+FILE_PREFIX = 'scim-metrics-'
+EXITED_FILE = f'{FILE_PREFIX}exited.json'
+LOCK_FILE = '.scim-metrics.lock'
+
+
+class MetricsRegistry(object):
+    """
+    Thread safe store of counters and histograms keyed by metric name and
+    labels.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = defaultdict(float)
+            self.histograms = {}
+
+    @staticmethod
+    def get_key(name, labels):
+        return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+    def inc(self, name, amount=1, **labels):
+        key = self.get_key(name, labels)
+        with self.lock:
+            self.counters[key] += amount
+
+    def observe(self, name, value, **labels):
+        key = self.get_key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {
+                    'buckets': [0] * len(self.buckets),
+                    'count': 0,
+                    'sum': 0.0,
+                }
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['count'] += 1
+            histogram['sum'] += value
+
+    def dump(self):
+        """
+        Return the registry values as a JSON serializable dict.
+        """
+        with self.lock:
+            return {
+                'counters': [
+                    [name, list(map(list, labels)), value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                'histograms': [
+                    [name, list(map(list, labels)), dict(histogram, buckets=list(histogram['buckets']))]
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+            }
+
+    def merge(self, data):
+        """
+        Add values dumped by ``dump`` (possibly by another process) to this
+        registry.
+        """
+        with self.lock:
+            for name, labels, value in data.get('counters', []):
+                self.counters[(name, tuple(map(tuple, labels)))] += value
+
+            for name, labels, other in data.get('histograms', []):
+                key = (name, tuple(map(tuple, labels)))
+                histogram = self.histograms.setdefault(key, {
+                    'buckets': [0] * len(self.buckets),
+                    'count': 0,
+                    'sum': 0.0,
+                })
+                for i, count in enumerate(other['buckets'][:len(self.buckets)]):
+                    histogram['buckets'][i] += count
+                histogram['count'] += other['count']
+                histogram['sum'] += other['sum']
+
+    def exposition(self):
+        """
+        Return the registry values in the Prometheus text exposition format.
+        """
+        samples = defaultdict(list)
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                samples[name].append(f'{name}{format_labels(labels)} {format_value(value)}')
+
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                for bound, count in zip(self.buckets, histogram['buckets']):
+                    bucket_labels = labels + (('le', format_value(bound)),)
+                    samples[name].append(f'{name}_bucket{format_labels(bucket_labels)} {count}')
+                inf_labels = labels + (('le', '+Inf'),)
+                samples[name].append(f'{name}_bucket{format_labels(inf_labels)} {histogram["count"]}')
+                samples[name].append(f'{name}_count{format_labels(labels)} {histogram["count"]}')
+                samples[name].append(f'{name}_sum{format_labels(labels)} {format_value(histogram["sum"])}')
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples.pop(name, []))
+
+        for name, metric_samples in sorted(samples.items()):
+            lines.append(f'# TYPE {name} untyped')
+            lines.extend(metric_samples)
+
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+
+    pairs = ','.join(
+        '{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels
+    )
+    return '{' + pairs + '}'
+
+
+def format_value(value):
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
+
+
+def inc(name, amount=1, **labels):
+    """
+    Increment counter ``name`` if metrics are enabled.
+    """
+    if scim_settings.METRICS_ENABLED:
+        registry.inc(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    """
+    Observe ``value`` in histogram ``name`` if metrics are enabled.
+    """
+    if scim_settings.METRICS_ENABLED:
+        registry.observe(name, value, **labels)
+
+
+def record_cache_lookup(cache, hit, amount=1):
+    if amount:
+        inc('scim_filter_cache_requests_total', amount, cache=cache, result='hit' if hit else 'miss')
+
+
+def get_process_file(directory, pid=None):
+    return os.path.join(directory, f'{FILE_PREFIX}{pid or os.getpid()}.json')
+
+
+def get_file_pid(filename):
+    """
+    Return the PID of the process that wrote ``filename``, or None if it is
+    not a per-process metrics file.
+    """
+    if filename.startswith(FILE_PREFIX) and filename.endswith('.json'):
+        pid = filename[len(FILE_PREFIX):-len('.json')]
+        if pid.isdigit():
+            return int(pid)
+
+    return None
+
+
+def is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # The process exists but belongs to another user.
+        return True
+    return True
+
+
+@contextmanager
+def directory_lock(directory, exclusive):
+    """
+    Hold a lock on the multiprocess directory: shared to read the files,
+    exclusive to fold the files of exited processes. Does nothing on
+    platforms without ``fcntl``.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    with open(os.path.join(directory, LOCK_FILE), 'a') as fp:
+        fcntl.flock(fp, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(fp, fcntl.LOCK_UN)
+
+
+def write_file(directory, path, data):
+    """
+    Write ``data`` to ``path``, replacing it atomically so that readers
+    never see partial data.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    with os.fdopen(fd, 'w') as fp:
+        json.dump(data, fp)
+    os.replace(tmp_path, path)
+
+
+def flush():
+    """
+    Write the values of this process to the multiprocess directory, if any.
+    """
+    directory = scim_settings.METRICS_MULTIPROCESS_DIR
+    if not directory:
+        return
+
+    try:
+        write_file(directory, get_process_file(directory), registry.dump())
+    except OSError:
+        logger.exception('Unable to write SCIM metrics to %s.', directory)
+
+
+def fold_exited_processes(directory):
+    """
+    Add the values of the files of processes that are no longer running to
+    ``EXITED_FILE`` and remove those files. Only done where process liveness
+    can be checked safely (POSIX, with ``fcntl`` to serialize the folding).
+    """
+    if fcntl is None or os.name != 'posix':
+        return
+
+    exited = [filename for filename in os.listdir(directory) if is_exited_process_file(filename)]
+    if not exited:
+        return
+
+    with directory_lock(directory, exclusive=True):
+        # Files already folded by another process are skipped.
+        exited = [filename for filename in exited if os.path.exists(os.path.join(directory, filename))]
+        folded = MetricsRegistry(registry.buckets)
+        merge_files(folded, directory, [EXITED_FILE] + exited)
+        write_file(directory, os.path.join(directory, EXITED_FILE), folded.dump())
+        for filename in exited:
+            os.remove(os.path.join(directory, filename))
+
+
+def is_exited_process_file(filename):
+    pid = get_file_pid(filename)
+    return pid is not None and pid != os.getpid() and not is_process_alive(pid)
+
+
+def merge_files(into, directory, filenames):
+    """
+    Add the values of the metrics files ``filenames`` to registry ``into``.
+    Missing files are skipped.
+    """
+    for filename in filenames:
+        try:
+            with open(os.path.join(directory, filename)) as fp:
+                into.merge(json.load(fp))
+        except FileNotFoundError:
+            continue
+
+
+# Monotonic time of the last flush of this process' values, see
+# ``flush_if_due``.
+last_flush = None
+last_flush_lock = threading.Lock()
+
+
+def flush_if_due():
+    """
+    Write the values of this process to the multiprocess directory, if any,
+    unless they were written less than ``METRICS_FLUSH_INTERVAL`` seconds
+    ago.
+    """
+    global last_flush
+    if not scim_settings.METRICS_MULTIPROCESS_DIR:
+        return
+
+    now = time.monotonic()
+    with last_flush_lock:
+        if last_flush is not None and now - last_flush < (scim_settings.METRICS_FLUSH_INTERVAL or 0):
+            return
+        last_flush = now
+
+    flush()
+
+
+def collect():
+    """
+    Return the registry to expose: this process' registry or, in
+    multiprocess mode, a registry summing the files of every process.
+    """
+    directory = scim_settings.METRICS_MULTIPROCESS_DIR
+    if not directory:
+        return registry
+
+    flush()
+    try:
+        fold_exited_processes(directory)
+    except (OSError, ValueError):
+        logger.exception('Unable to fold SCIM metrics of exited processes in %s.', directory)
+
+    return read_directory(directory)
+
+
+def read_directory(directory):
+    """
+    Return a registry summing the metrics files in ``directory``.
+    """
+    combined = MetricsRegistry(registry.buckets)
+    with directory_lock(directory, exclusive=False):
+        for filename in sorted(os.listdir(directory)):
+            if not (filename.startswith(FILE_PREFIX) and filename.endswith('.json')):
+                continue
+
+            try:
+                merge_files(combined, directory, [filename])
+            except (OSError, ValueError):
+                logger.exception('Unable to read SCIM metrics file %s.', filename)
+
+    return combined
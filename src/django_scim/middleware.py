@@ -1,9 +1,15 @@
+import cProfile
 import logging
+import os
+import random
+import re
+import time
+from datetime import datetime, timezone
 
 from django.http.response import HttpResponse
 from django.urls import reverse
 
-from . import constants
+from . import constants, metrics, traffic
 from .settings import scim_settings
 from .utils import get_is_authenticated_predicate, get_loggable_body
 
@@ -22,6 +28,7 @@ class SCIMAuthCheckMiddleware(object):
         self.get_response = get_response
 
     def __call__(self, request, *args, **kwargs):
+        start = time.perf_counter()
         response = None
         if hasattr(self, 'process_request'):
             response = self.process_request(request)
@@ -29,6 +36,11 @@ class SCIMAuthCheckMiddleware(object):
             response = self.get_response(request, *args, **kwargs)
         if hasattr(self, 'process_response'):
             response = self.process_response(request, response)
+        duration = time.perf_counter() - start
+        if scim_settings.METRICS_ENABLED and self.should_log_request(request):
+            self.record_metrics(request, response, duration)
+        if scim_settings.TRAFFIC_RECORD_PATH and self.should_log_request(request):
+            self.record_traffic(request, response, duration)
         return response
 
     @property
@@ -60,6 +72,32 @@ class SCIMAuthCheckMiddleware(object):
             self.log_response(request, response)
         return response
 
+    def record_metrics(self, request, response, duration):
+        """
+        Count the request and observe its latency in the metrics registry.
+        """
+        resolver_match = getattr(request, 'resolver_match', None)
+        labels = {
+            # Use the URL name rather than the path to keep the number of
+            # label values bounded.
+            'endpoint': resolver_match.view_name if resolver_match else 'unknown',
+            'method': request.method,
+            'status': response.status_code,
+        }
+        metrics.registry.inc('scim_requests_total', **labels)
+        metrics.registry.observe('scim_request_duration_seconds', duration, **labels)
+        metrics.flush_if_due()
+
+    def record_traffic(self, request, response, duration):
+        """
+        Append the scrubbed request/response pair to the traffic recording.
+        """
+        try:
+            record = traffic.get_record(request, response, duration)
+            traffic.write_record(scim_settings.TRAFFIC_RECORD_PATH, record)
+        except OSError:
+            logger.exception('Unable to record SCIM traffic.')
+
     def get_loggable_content(self, content):
         try:
             body = get_loggable_body(content.decode(constants.ENCODING))
@@ -103,3 +141,101 @@ class SCIMAuthCheckMiddleware(object):
     def log_response(self, request, response):
         message = self.get_loggable_response_message(request, response)
         logger.debug(message)
+
+
+class SCIMProfilingMiddleware(SCIMAuthCheckMiddleware):
+    """
+    Profile a sample of SCIM requests, and optionally every slow request, with
+    cProfile.
+
+    For each profiled request a ``.pstats`` file and a ``.txt`` summary (with
+    the request body scrubbed of passwords) are written to
+    ``PROFILING_DIR``. Only the ``PROFILING_MAX_PROFILES`` most recent profiles
+    are kept.
+
+    Add this middleware to ``settings.MIDDLEWARE`` to enable it; it does not
+    check authentication.
+    """
+
+    def __call__(self, request, *args, **kwargs):
+        if not self.should_profile_request(request):
+            return self.get_response(request, *args, **kwargs)
+
+        sampled = random.random() < scim_settings.PROFILING_SAMPLE_RATE
+        threshold = scim_settings.PROFILING_SLOW_THRESHOLD
+        if not sampled and threshold is None:
+            return self.get_response(request, *args, **kwargs)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this thread.
+            return self.get_response(request, *args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request, *args, **kwargs)
+        finally:
+            profiler.disable()
+        duration = time.perf_counter() - start
+
+        if sampled or duration >= threshold:
+            self.save_profile(request, response, profiler, duration)
+
+        return response
+
+    def should_profile_request(self, request):
+        """
+        Return True if request may be profiled.
+        """
+        return bool(scim_settings.PROFILING_DIR) and request.path.startswith(self.reverse_url)
+
+    def get_profile_name(self, request):
+        timestamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S.%fZ')
+        path = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_')
+        return f'{timestamp}-{os.getpid()}-{request.method}-{path}'
+
+    def get_profile_summary(self, request, response, duration):
+        parts = [
+            self.get_loggable_request_message(request),
+            'STATUS_CODE',
+            str(response.status_code),
+            'DURATION',
+            f'{duration:.6f}',
+        ]
+
+        return '\n'.join(parts)
+
+    def save_profile(self, request, response, profiler, duration):
+        directory = scim_settings.PROFILING_DIR
+        name = self.get_profile_name(request)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            profiler.dump_stats(os.path.join(directory, name + '.pstats'))
+            with open(os.path.join(directory, name + '.txt'), 'w') as fp:
+                fp.write(self.get_profile_summary(request, response, duration) + '\n')
+
+            self.rotate_profiles(directory)
+        except OSError:
+            logger.exception('Unable to save SCIM request profile.')
+
+    def rotate_profiles(self, directory):
+        """
+        Delete the oldest profiles beyond ``PROFILING_MAX_PROFILES``.
+        """
+        max_profiles = scim_settings.PROFILING_MAX_PROFILES
+        if not max_profiles:
+            return
+
+        names = sorted(
+            filename[:-len('.pstats')]
+            for filename in os.listdir(directory)
+            if filename.endswith('.pstats')
+        )
+        for name in names[:-max_profiles]:
+            for extension in ('.pstats', '.txt'):
+                try:
+                    os.remove(os.path.join(directory, name + extension))
+                except FileNotFoundError:
+                    pass
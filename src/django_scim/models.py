@@ -1,7 +1,8 @@
 from urllib.parse import urljoin
 
-from django.db import models
+from django.db import models, router
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from . import constants, exceptions
@@ -56,7 +57,7 @@ class SCIMServiceProviderConfig(object):
                 'supported': False,
             },
             'etag': {
-                'supported': False,
+                'supported': True,
             },
             'authenticationSchemes': scim_settings.AUTHENTICATION_SCHEMES,
             'meta': self.meta,
@@ -142,14 +143,125 @@ class AbstractSCIMCommonAttributesMixin(models.Model):
         help_text=_('A string that is an identifier for the resource as defined by the provisioning client.'),
     )
 
+    """
+    lastModified
+      The most recent DateTime that the details of this resource were
+      updated at the service provider.  If this resource has never been
+      modified since its initial creation, the value MUST be the same as
+      the value of "created".
+    """
+    scim_last_modified = models.DateTimeField(
+        _('SCIM Last Modified'),
+        null=True,
+        blank=True,
+        default=None,
+        db_index=True,
+        help_text=_('The most recent DateTime that the details of this resource were updated.'),
+    )
+
+    """
+    version
+      The version of the resource being returned.  This value must be the
+      same as the entity-tag (ETag) HTTP response header.
+    """
+    scim_version = models.PositiveBigIntegerField(
+        _('SCIM Version'),
+        default=1,
+        help_text=_('Incremented by every change of the resource, for optimistic concurrency control.'),
+    )
+
     def set_scim_id(self, is_new):
         if is_new:
-            self.__class__.objects.filter(id=self.id).update(scim_id=self.id)
+            self.__class__.objects.using(self._state.db).filter(id=self.id).update(scim_id=self.id)
             self.scim_id = str(self.id)
 
-    def save(self, *args, **kwargs):
-        is_new = self.id is None
-        super(AbstractSCIMCommonAttributesMixin, self).save(*args, **kwargs)
+    def swap_scim_version(self, using=None, **fields):
+        """
+        Increment ``scim_version`` and set ``fields`` in the database
+        ``using`` (by default, the database the instance would be saved to)
+        if the row still has the version this instance was loaded with, or
+        raise ``VersionConflictError`` if another write changed it since.
+
+        The update locks the row until the end of the transaction, so
+        concurrent writers of the same object fail rather than overwrite
+        each other's changes.
+        """
+        using = using or router.db_for_write(self.__class__, instance=self)
+        updated = self.__class__.objects.using(using).filter(
+            pk=self.pk,
+            scim_version=self.scim_version,
+        ).update(scim_version=models.F('scim_version') + 1, **fields)
+        if not updated:
+            raise exceptions.VersionConflictError()
+
+        self.scim_version += 1
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    # Fields whose saves with ``update_fields`` are not changes of the
+    # resource: they do not update ``scim_last_modified`` and
+    # ``scim_version``.
+    SCIM_UNTRACKED_FIELDS = frozenset({'last_login'})
+
+    def get_scim_update_fields(self, update_fields):
+        """
+        Return the ``update_fields`` of a save: with ``scim_last_modified``
+        and ``scim_version`` added when they include any field not in
+        ``SCIM_UNTRACKED_FIELDS``.
+        """
+        if update_fields is None:
+            return None
+
+        update_fields = set(update_fields)
+        if update_fields - self.SCIM_UNTRACKED_FIELDS:
+            update_fields |= {'scim_last_modified', 'scim_version'}
+        return update_fields
+
+    def save_scim_version(self, check_scim_version, *args, **kwargs):
+        """
+        Save the instance along with the increment of its ``scim_version``.
+        """
+        version = self.__dict__.get('scim_version')
+        if check_scim_version:
+            self.swap_scim_version(using=kwargs.get('using'))
+        else:
+            self.scim_version = models.F('scim_version') + 1
+
+        try:
+            super(AbstractSCIMCommonAttributesMixin, self).save(*args, **kwargs)
+        except Exception:
+            # Leave the instance with the version it was loaded with (or
+            # deferred), rather than an expression or a version not saved.
+            if version is None:
+                del self.scim_version
+            else:
+                self.scim_version = version
+            raise
+
+        if not check_scim_version:
+            # Deferred: loaded from the database when read.
+            del self.scim_version
+
+    def save(self, *args, check_scim_version=False, **kwargs):
+        """
+        Save the instance, incrementing ``scim_version`` if it exists.
+
+        With ``check_scim_version`` (as done by the SCIM adapters), the
+        version is incremented by ``swap_scim_version``, raising
+        ``VersionConflictError`` if another write changed the row since the
+        instance was loaded. Otherwise the version is incremented in the
+        database, whatever the version of the instance, and reloaded the
+        next time it is read.
+        """
+        is_new = self._state.adding
+        update_fields = kwargs['update_fields'] = self.get_scim_update_fields(kwargs.get('update_fields'))
+        if update_fields is None or 'scim_last_modified' in update_fields:
+            self.scim_last_modified = timezone.now()
+
+        if not is_new and (update_fields is None or 'scim_version' in update_fields):
+            self.save_scim_version(check_scim_version, *args, **kwargs)
+        else:
+            super(AbstractSCIMCommonAttributesMixin, self).save(*args, **kwargs)
         self.set_scim_id(is_new)
 
     class Meta:
@@ -218,10 +330,124 @@ class AbstractSCIMGroupMixin(AbstractSCIMCommonAttributesMixin):
 
     def set_scim_display_name(self, is_new):
         if is_new:
-            self.__class__.objects.filter(id=self.id).update(scim_display_name=self.name)
+            self.__class__.objects.using(self._state.db).filter(id=self.id).update(scim_display_name=self.name)
             self.scim_display_name = self.name
 
     def save(self, *args, **kwargs):
         is_new = self.id is None
         super(AbstractSCIMGroupMixin, self).save(*args, **kwargs)
         self.set_scim_display_name(is_new)
+
+
+class AbstractSCIMDocument(models.Model):
+    """
+    An abstract model to store the rendered SCIM documents of users and
+    groups.
+
+    Create a concrete subclass and point the ``DOCUMENT_MODEL`` setting to it
+    to serve SCIM responses from stored documents (see
+    ``django_scim.documents``).
+    """
+
+    resource_type = models.CharField(
+        _('Resource Type'),
+        max_length=32,
+    )
+
+    object_id = models.CharField(
+        _('Object ID'),
+        max_length=254,
+        help_text=_('Primary key of the user or group.'),
+    )
+
+    document = models.TextField(
+        _('Document'),
+        null=True,
+        blank=True,
+        default=None,
+        help_text=_('JSON document of the resource, or null when it must be rendered again.'),
+    )
+
+    version = models.PositiveBigIntegerField(
+        _('Version'),
+        default=1,
+        help_text=_('Number of times the document was rendered.'),
+    )
+
+    class Meta:
+        abstract = True
+        constraints = [
+            models.UniqueConstraint(
+                fields=['resource_type', 'object_id'],
+                name='%(app_label)s_%(class)s_object',
+            ),
+        ]
+
+
+class AbstractSCIMChange(models.Model):
+    """
+    An abstract model to record the creates, updates and deletes of users and
+    groups in an append-only change log.
+
+    Create a concrete subclass and point the ``CHANGE_LOG_MODEL`` setting to
+    it to serve delta listings (see ``django_scim.changelog``).
+    """
+
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+
+    ACTION_CHOICES = (
+        (CREATE, _('Create')),
+        (UPDATE, _('Update')),
+        (DELETE, _('Delete')),
+    )
+
+    # Sequence number of the change, used as the watermark of delta
+    # listings.
+    id = models.BigAutoField(primary_key=True)
+
+    resource_type = models.CharField(
+        _('Resource Type'),
+        max_length=32,
+    )
+
+    object_id = models.CharField(
+        _('Object ID'),
+        max_length=254,
+        help_text=_('Primary key of the user or group.'),
+    )
+
+    scim_id = models.CharField(
+        _('SCIM ID'),
+        max_length=254,
+        null=True,
+        blank=True,
+        default=None,
+        help_text=_('SCIM ID of the user or group, if known when the change was recorded.'),
+    )
+
+    action = models.CharField(
+        _('Action'),
+        max_length=16,
+        choices=ACTION_CHOICES,
+    )
+
+    timestamp = models.DateTimeField(
+        _('Timestamp'),
+        default=timezone.now,
+        db_index=True,
+    )
+
+    tenant = models.CharField(
+        _('Tenant'),
+        max_length=254,
+        null=True,
+        blank=True,
+        default=None,
+        db_index=True,
+        help_text=_('Tenant of the SCIM request making the change, if any.'),
+    )
+
+    class Meta:
+        abstract = True
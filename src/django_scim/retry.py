@@ -0,0 +1,80 @@
+"""
+Retry of SCIM writes that lose against concurrent transactions.
+
+Parallel PATCHes of large groups that add overlapping users to the same
+membership rows can deadlock each other. The database then aborts one of the
+transactions: PostgreSQL with a deadlock (SQLSTATE ``40P01``) or a
+serialization failure (``40001``), MySQL with a deadlock (error ``1213``) or
+a lock wait timeout (``1205``). These errors say nothing about the request
+itself, so the SCIM views run the transaction again, up to
+``TRANSACTION_RETRIES`` times, after a random delay so that the transactions
+that collided are unlikely to collide again.
+
+Writes are only retried when the view opened the outermost transaction: a
+deadlock aborts the whole transaction on MySQL, and retrying in a savepoint
+of a transaction opened by the caller (eg. with ``ATOMIC_REQUESTS``) would
+keep the locks that caused the deadlock.
+"""
+import random
+
+from django.db import transaction
+
+from .settings import scim_settings
+
+POSTGRESQL_SQLSTATES = ('40001', '40P01')
+MYSQL_ERROR_CODES = (1205, 1213)
+
+
+def get_error_code(exc):
+    """
+    Return the SQLSTATE (PostgreSQL) or error number (MySQL) of database
+    error ``exc``, looking into the driver exception wrapped by Django.
+    """
+    for error in (exc, exc.__cause__):
+        if error is None:
+            continue
+
+        # psycopg exposes sqlstate, psycopg2 pgcode.
+        code = getattr(error, 'sqlstate', None) or getattr(error, 'pgcode', None)
+        if code:
+            return code
+
+        args = getattr(error, 'args', ())
+        if args and isinstance(args[0], int):
+            return args[0]
+
+    return None
+
+
+def is_transient_error(exc):
+    """
+    Return True if database error ``exc`` is a deadlock or serialization
+    failure that running the transaction again may avoid.
+    """
+    code = get_error_code(exc)
+    return code in POSTGRESQL_SQLSTATES or code in MYSQL_ERROR_CODES
+
+
+def should_retry(exc, failures):
+    """
+    Return True if a transaction that failed with database error ``exc``
+    after ``failures`` previous failures should be run again.
+    """
+    return is_transient_error(exc) and failures < scim_settings.TRANSACTION_RETRIES
+
+
+def can_retry(using=None):
+    """
+    Return True if a transaction about to be opened on ``using`` would be
+    the outermost one, and can therefore be run again as a whole.
+    """
+    return not transaction.get_connection(using).in_atomic_block
+
+
+def get_delay(attempt):
+    """
+    Return the number of seconds to wait before retry number ``attempt``
+    (starting at 1): a random duration up to an exponentially growing bound
+    ("full jitter").
+    """
+    return random.uniform(0, scim_settings.TRANSACTION_RETRY_BACKOFF * 2 ** (attempt - 1))
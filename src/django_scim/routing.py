@@ -0,0 +1,82 @@
+"""
+Routing of SCIM reads to a read replica.
+
+Identity providers mostly read: they list, search and fetch users and groups
+far more often than they change them. When the
+``READ_DATABASE_ALIAS_GETTER`` setting returns a database alias for a
+request, the ``GET`` requests of users and groups (single resources, lists
+and filter searches) and the ``POST`` requests of ``.search`` endpoints
+(views with ``read_only = True``) read from that database, eg. a replica of
+the primary.
+Writes and the reads they do keep using the primary: the database returned
+by the ``DATABASE_ALIAS_GETTER`` setting, or the default routing.
+
+When the ``DATABASE_ALIAS_GETTER`` setting shards users and groups across
+databases, ``READ_DATABASE_ALIAS_GETTER`` should return a replica of the
+request's shard.
+
+Replicas lag behind the primary. So that clients do not read stale state
+right after a write (eg. a ``GET`` following a ``POST``), every write pins
+the reads of its tenant (as returned by the ``TENANT_GETTER`` setting) to the
+primary for ``READ_AFTER_WRITE_SECONDS`` seconds. Pins are stored in the
+cache named by the ``CACHE_ALIAS`` setting so that all processes see them.
+"""
+import hashlib
+
+from django.core.cache import caches
+from django.db import transaction
+
+from .settings import scim_settings
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def get_pin_key(tenant):
+    digest = hashlib.md5(repr(tenant).encode()).hexdigest()
+    return f'scim:read-pin:{digest}'
+
+
+def pin_reads(tenant, using=None):
+    """
+    Send the reads of ``tenant`` to the primary for
+    ``READ_AFTER_WRITE_SECONDS`` seconds from the commit of the current
+    transaction on ``using``.
+    """
+    timeout = scim_settings.READ_AFTER_WRITE_SECONDS
+    if not timeout:
+        return
+
+    def pin():
+        caches[scim_settings.CACHE_ALIAS].set(get_pin_key(tenant), True, timeout=timeout)
+
+    transaction.on_commit(pin, using=using)
+
+
+def is_pinned(tenant):
+    return caches[scim_settings.CACHE_ALIAS].get(get_pin_key(tenant)) is not None
+
+
+def is_read_request(request):
+    """
+    Return True if ``request`` does not write: it has a read method or is
+    handled by a read-only view (which sets ``request.scim_read_only``).
+    """
+    read_only = getattr(request, 'scim_read_only', None)
+    if read_only is None:
+        return request.method in READ_METHODS
+    return read_only
+
+
+def get_read_database(request, tenant):
+    """
+    Return the alias of the database the SCIM reads of ``request`` should be
+    sent to, or None to use the default routing.
+    """
+    if request is None or not is_read_request(request):
+        return None
+
+    alias = scim_settings.READ_DATABASE_ALIAS_GETTER(request)
+    if alias is None or (scim_settings.READ_AFTER_WRITE_SECONDS and is_pinned(tenant)):
+        return None
+
+    return alias
@@ -43,6 +43,34 @@ DEFAULTS = {
     'EXPOSE_SCIM_EXCEPTIONS': False,
     'AUTHENTICATION_SCHEMES': [],
     'WWW_AUTHENTICATE_HEADER': 'Basic realm="django-scim2"',
+    'PASSWORD_HASHING_PROCESSES': None,
+    'TENANT_GETTER': 'django_scim.utils.default_tenant_getter',
+    'TIMING_ENABLED': False,
+    'TIMING_CALLBACK': None,
+    'SERVER_TIMING_HEADER': False,
+    'METRICS_ENABLED': False,
+    'METRICS_MULTIPROCESS_DIR': None,
+    'METRICS_FLUSH_INTERVAL': 10,
+    'PROFILING_DIR': None,
+    'PROFILING_SAMPLE_RATE': 0.0,
+    'PROFILING_SLOW_THRESHOLD': None,
+    'PROFILING_MAX_PROFILES': 100,
+    'TRAFFIC_RECORD_PATH': None,
+    'FILTER_EXPLAIN_THRESHOLD': None,
+    'CACHE_ALIAS': 'default',
+    'FILTER_CACHE_TIMEOUT': None,
+    'FRAGMENT_CACHE_TIMEOUT': None,
+    'NEGATIVE_CACHE_TIMEOUT': None,
+    'DOCUMENT_MODEL': None,
+    'CHANGE_LOG_MODEL': None,
+    'CHANGE_LOG_SETTLE_SECONDS': 5,
+    'VERSION_CONFLICT_RETRIES': 3,
+    'TRANSACTION_RETRIES': 3,
+    'TRANSACTION_RETRY_BACKOFF': 0.05,
+    'DATABASE_ALIAS_GETTER': 'django_scim.utils.default_database_alias_getter',
+    'READ_DATABASE_ALIAS_GETTER': 'django_scim.utils.default_read_database_alias_getter',
+    'READ_AFTER_WRITE_SECONDS': 5,
+    'GROUP_MEMBERS_INLINE_LIMIT': None,
 }
 
 # List of settings that cannot be empty
@@ -68,6 +96,12 @@ IMPORT_STRINGS = (
     'GET_IS_AUTHENTICATED_PREDICATE',
     'AUTH_CHECK_MIDDLEWARE',
     'SCHEMAS_GETTER',
+    'TENANT_GETTER',
+    'TIMING_CALLBACK',
+    'DOCUMENT_MODEL',
+    'CHANGE_LOG_MODEL',
+    'DATABASE_ALIAS_GETTER',
+    'READ_DATABASE_ALIAS_GETTER',
 )
 
 
@@ -103,6 +137,14 @@ class SCIMServiceProviderSettings(object):
 
     Any setting with string import paths will be automatically resolved
     and return the class, rather than the string literal.
+
+    Settings are resolved lazily on first access. Calling ``load()`` (done by
+    the app config's ``ready()``) resolves every setting up front so that
+    misconfiguration is reported at start up and no request pays for the
+    imports. Resolved settings are stored as plain instance attributes and
+    can not be reassigned; use ``reload()`` to pick up changes to the
+    ``SCIM_SERVICE_PROVIDER`` Django setting (done automatically when the
+    setting is changed with ``override_settings``).
     """
 
     def __init__(self, user_settings=None, defaults=None, import_strings=None, mandatory=None):
@@ -110,11 +152,26 @@ class SCIMServiceProviderSettings(object):
         self.defaults = defaults or {}
         self.import_strings = import_strings or ()
         self.mandatory = mandatory or ()
+        self._cached_attrs = set()
 
     def __getattr__(self, attr):
         if attr not in self.defaults.keys():
             raise AttributeError("Invalid SCIMServiceProvider setting: '%s'" % attr)
 
+        val = self.resolve_setting(attr)
+        self.validate_setting(attr, val)
+
+        # Cache the result
+        object.__setattr__(self, attr, val)
+        self._cached_attrs.add(attr)
+        return val
+
+    def __setattr__(self, attr, val):
+        if attr in self.__dict__.get('defaults', {}):
+            raise AttributeError("SCIMServiceProvider setting '%s' is read-only" % attr)
+        object.__setattr__(self, attr, val)
+
+    def resolve_setting(self, attr):
         try:
             # Check if present in user settings
             val = self.user_settings[attr]
@@ -126,15 +183,44 @@ class SCIMServiceProviderSettings(object):
         if val and attr in self.import_strings:
             val = perform_import(val, attr)
 
-        self.validate_setting(attr, val)
-
-        # Cache the result
-        setattr(self, attr, val)
         return val
 
     def validate_setting(self, attr, val):
         if not val and attr in self.mandatory:
             raise AttributeError("SCIMServiceProvider setting: '%s' is mandatory" % attr)
 
+    def load(self):
+        """
+        Resolve and validate every setting.
+
+        Import strings that can not be imported raise an ``ImportError``.
+        Mandatory settings that are missing are left unresolved; they are
+        only required by the defaults that use them and still raise when
+        accessed.
+        """
+        for attr in self.defaults:
+            if attr in self._cached_attrs:
+                continue
+
+            val = self.resolve_setting(attr)
+            if not val and attr in self.mandatory:
+                continue
+
+            object.__setattr__(self, attr, val)
+            self._cached_attrs.add(attr)
+
+    def reload(self, user_settings=None):
+        for attr in self._cached_attrs:
+            if attr in self.__dict__:
+                delattr(self, attr)
+        self._cached_attrs.clear()
+        self.user_settings = user_settings or {}
+        self.load()
+
 
 scim_settings = SCIMServiceProviderSettings(USER_SETTINGS, DEFAULTS, IMPORT_STRINGS, MANDATORY)
+
+
+def reload_scim_settings(*args, **kwargs):
+    if kwargs.get('setting') == 'SCIM_SERVICE_PROVIDER':
+        scim_settings.reload(kwargs.get('value'))
@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# Sent at the end of every SCIM request when the ``TIMING_ENABLED`` setting is
+# True. Receivers get the ``request``, the ``response`` and a ``record`` dict
+# describing where the time serving the request was spent
+# (see ``django_scim.timing.RequestTimer.get_record``).
+request_timed = Signal()
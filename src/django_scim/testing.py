@@ -0,0 +1,94 @@
+"""
+Helpers for testing apps that implement a SCIM api with django-scim2.
+
+``query_budget`` records every SQL statement issued while the wrapped code
+runs (eg. a test client request to a SCIM view) and fails if more statements
+were issued than the declared budget. Use it as a context manager::
+
+    with query_budget(5):
+        client.get(reverse('scim:users'))
+
+or as a decorator on a test method::
+
+    @query_budget(5)
+    def test_list_users(self):
+        ...
+
+Budgets should not depend on the number of resources returned. When a
+budget is exceeded the failure lists the fingerprints of the offending
+queries, which makes N+1 patterns easy to spot.
+"""
+import re
+from collections import Counter
+from contextlib import ContextDecorator
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """
+    Return ``sql`` with literal values replaced by ``?`` so that statements
+    that only differ by their parameters compare equal. Eg::
+
+        SELECT ... WHERE "id" IN (1, 2, 3) AND "name" = 'x'
+
+    becomes::
+
+        SELECT ... WHERE "id" IN (...) AND "name" = ?
+    """
+    sql = STRING_LITERAL_RE.sub('?', sql)
+    sql = NUMBER_LITERAL_RE.sub('?', sql)
+    sql = PLACEHOLDER_LIST_RE.sub('(...)', sql)
+    return WHITESPACE_RE.sub(' ', sql).strip()
+
+
+class query_budget(ContextDecorator):
+    """
+    Fail with ``QueryBudgetExceeded`` if the wrapped code issues more than
+    ``budget`` queries on the database ``using``.
+    """
+
+    def __init__(self, budget, using=DEFAULT_DB_ALIAS):
+        self.budget = budget
+        self.using = using
+        self.context = None
+
+    @property
+    def captured_queries(self):
+        return self.context.captured_queries if self.context else []
+
+    def __enter__(self):
+        self.context = CaptureQueriesContext(connections[self.using])
+        self.context.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.context.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return False
+
+        executed = len(self.captured_queries)
+        if executed > self.budget:
+            raise QueryBudgetExceeded(self.get_failure_message(executed))
+
+        return False
+
+    def get_failure_message(self, executed):
+        counts = Counter(fingerprint(q['sql']) for q in self.captured_queries)
+        lines = [
+            f'{executed} queries executed on "{self.using}", budget is {self.budget}:',
+        ]
+        for sql, count in counts.most_common():
+            lines.append(f'  {count} x {sql}')
+
+        return '\n'.join(lines)
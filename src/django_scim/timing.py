@@ -0,0 +1,137 @@
+"""
+Per-request performance instrumentation for SCIM views.
+
+When the ``TIMING_ENABLED`` setting is True, ``SCIMView.dispatch`` times the
+phases of each request (body parsing, filter compilation, writes,
+serialization and JSON encoding) and every query issued while serving it.
+The resulting record is sent through the ``django_scim.signals.request_timed``
+signal, passed to the ``TIMING_CALLBACK`` setting (if any) and, when
+``SERVER_TIMING_HEADER`` is True, added to the response as a
+``Server-Timing`` header.
+"""
+import logging
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager, nullcontext
+
+from django.db import connections
+
+from . import signals
+from .settings import scim_settings
+
+logger = logging.getLogger(__name__)
+
+
+class NullTimer(object):
+    """
+    A timer that records nothing; used when timing is disabled.
+    """
+    enabled = False
+
+    def phase(self, name):
+        return nullcontext()
+
+    def capture_queries(self):
+        return nullcontext()
+
+    def finish(self, view, request, response):
+        pass
+
+
+class RequestTimer(NullTimer):
+    """
+    Collect the time spent in the phases of a single SCIM request.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = defaultdict(float)
+        self.query_count = 0
+        self.query_duration = 0.0
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - start
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_count += 1
+            self.query_duration += time.perf_counter() - start
+
+    def capture_queries(self):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self.execute_wrapper))
+        return stack
+
+    def get_record(self, view, request, response):
+        resolver_match = getattr(request, 'resolver_match', None)
+        return {
+            'endpoint': resolver_match.view_name if resolver_match else view.__class__.__name__,
+            'method': request.method,
+            'status': response.status_code,
+            'tenant': scim_settings.TENANT_GETTER(request),
+            'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+            'duration': time.perf_counter() - self.start,
+            'phases': dict(self.phases),
+            'queries': {
+                'count': self.query_count,
+                'duration': self.query_duration,
+            },
+        }
+
+    def finish(self, view, request, response):
+        record = self.get_record(view, request, response)
+
+        if scim_settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = get_server_timing_header(record)
+
+        signals.request_timed.send(
+            sender=view.__class__,
+            request=request,
+            response=response,
+            record=record,
+        )
+
+        callback = scim_settings.TIMING_CALLBACK
+        if callback:
+            try:
+                callback(record)
+            except Exception:
+                logger.exception('SCIM timing callback failed.')
+
+
+def get_server_timing_header(record):
+    """
+    Return the value of a ``Server-Timing`` header for a timing record.
+    Durations are reported in milliseconds.
+    """
+    metrics = [
+        f'{name};dur={duration * 1000:.2f}'
+        for name, duration in record['phases'].items()
+    ]
+    queries = record['queries']
+    metrics.append(f'db;dur={queries["duration"] * 1000:.2f};desc="{queries["count"]} queries"')
+    metrics.append(f'total;dur={record["duration"] * 1000:.2f}')
+    return ', '.join(metrics)
+
+
+NULL_TIMER = NullTimer()
+
+
+def get_request_timer():
+    """
+    Return a new timer for a request, or the null timer if timing is disabled.
+    """
+    if scim_settings.TIMING_ENABLED:
+        return RequestTimer()
+
+    return NULL_TIMER
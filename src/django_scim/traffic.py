@@ -0,0 +1,233 @@
+"""
+Record SCIM traffic and replay it for load testing.
+
+When the ``TRAFFIC_RECORD_PATH`` setting is set, ``SCIMAuthCheckMiddleware``
+appends one JSON line per SCIM request to that file with the method, path,
+query string, request body (with passwords scrubbed), response status and
+duration of the request.
+
+A recording can then be replayed against a running server or through the
+Django test client with the ``scim_replay`` management command, eg::
+
+    python manage.py scim_replay okta-sync.ndjson --url http://localhost:8000 \
+        --header 'Authorization: Bearer xyz' --concurrency 8
+
+Replays only make sense against a database holding the resources referenced
+by the recording (eg. a copy of the database the traffic was recorded on).
+"""
+import json
+import os
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from django.http.request import RawPostDataException
+
+from . import constants
+from .utils import clean_structure_of_passwords
+
+
+def get_record(request, response, duration):
+    """
+    Return the record of a request/response pair as a dict.
+    """
+    try:
+        body = request.body.decode(constants.ENCODING) or None
+    except (RawPostDataException, UnicodeDecodeError):
+        body = None
+
+    if body:
+        try:
+            body = clean_structure_of_passwords(json.loads(body))
+        except ValueError:
+            pass
+
+    return {
+        'time': datetime.now(timezone.utc).isoformat(),
+        'method': request.method,
+        'path': request.path,
+        'query': request.META.get('QUERY_STRING', ''),
+        'body': body,
+        'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+        'status': response.status_code,
+        'duration': round(duration, 6),
+    }
+
+
+def write_record(path, record):
+    """
+    Append ``record`` to the NDJSON file at ``path``.
+
+    The line is written with a single ``write`` on a file opened in append
+    mode so that records written by concurrent processes do not interleave.
+    """
+    line = json.dumps(record, separators=(',', ':')) + '\n'
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    try:
+        os.write(fd, line.encode(constants.ENCODING))
+    finally:
+        os.close(fd)
+
+
+def load_records(path):
+    """
+    Return the records of the NDJSON file at ``path``.
+    """
+    with open(path) as fp:
+        return [json.loads(line) for line in fp if line.strip()]
+
+
+def get_request_body(record):
+    body = record.get('body')
+    if body is None:
+        return b''
+    if not isinstance(body, str):
+        body = json.dumps(body)
+    return body.encode(constants.ENCODING)
+
+
+class HTTPSender(object):
+    """
+    Send recorded requests to a running server at ``base_url``.
+    """
+
+    def __init__(self, base_url, headers=None, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+
+    def __call__(self, record):
+        url = self.base_url + record['path']
+        if record.get('query'):
+            url += '?' + record['query']
+
+        headers = {'Content-Type': constants.SCIM_CONTENT_TYPE}
+        headers.update(self.headers)
+        request = urllib.request.Request(
+            url,
+            data=get_request_body(record) or None,
+            headers=headers,
+            method=record['method'],
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+class ClientSender(object):
+    """
+    Send recorded requests through the Django test client, logged in as
+    ``user``. Each thread uses its own client.
+    """
+
+    def __init__(self, user=None):
+        self.user = user
+        self.local = threading.local()
+
+    @property
+    def client(self):
+        if not hasattr(self.local, 'client'):
+            from django.test import Client
+
+            self.local.client = Client()
+            if self.user is not None:
+                self.local.client.force_login(self.user)
+        return self.local.client
+
+    def __call__(self, record):
+        response = self.client.generic(
+            record['method'],
+            record['path'] + ('?' + record['query'] if record.get('query') else ''),
+            data=get_request_body(record),
+            content_type=constants.SCIM_CONTENT_TYPE,
+        )
+        return response.status_code
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def timed_send(send, record):
+    """
+    Send ``record`` with ``send`` and return its status (or the name of the
+    exception raised) and duration.
+    """
+    start = time.perf_counter()
+    try:
+        status = send(record)
+    except Exception as e:
+        status = type(e).__name__
+    return status, time.perf_counter() - start
+
+
+def send_records(records, send, concurrency):
+    """
+    Send ``records`` with ``send`` and return the status and duration of
+    each, see ``replay``.
+    """
+    results = [None] * len(records)
+
+    def send_in_order(indexes):
+        for i in indexes:
+            results[i] = timed_send(send, records[i])
+
+    if concurrency > 1:
+        by_path = defaultdict(list)
+        for i, record in enumerate(records):
+            by_path[record['path']].append(i)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(send_in_order, by_path.values()))
+    else:
+        send_in_order(range(len(records)))
+    return results
+
+
+def replay(records, send, concurrency=1):
+    """
+    Send ``records`` in order with ``send`` (a callable taking a record and
+    returning a status code) using ``concurrency`` threads. Return a report
+    of throughput, latency percentiles and statuses.
+
+    With several threads, the records of a same path (eg. the PUT and PATCH
+    requests of one user) are still sent one after the other in recorded
+    order, only requests to different paths run concurrently. Requests whose
+    effects span several resources (eg. a group PATCH adding members that
+    are created by POST requests to the collection) may still be reordered.
+    """
+    start = time.perf_counter()
+    results = send_records(records, send, concurrency)
+    elapsed = time.perf_counter() - start
+
+    report = {
+        'requests': len(results),
+        'concurrency': concurrency,
+        'elapsed_seconds': elapsed,
+        'requests_per_second': len(results) / elapsed if elapsed else 0.0,
+        'statuses': dict(Counter(str(status) for status, _ in results)),
+        'status_mismatches': sum(
+            1 for record, (status, _) in zip(records, results)
+            if record.get('status') is not None and status != record['status']
+        ),
+    }
+    latencies = [duration * 1000 for _, duration in results]
+    if latencies:
+        report['latency_ms'] = {
+            'mean': statistics.mean(latencies),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies),
+        }
+
+    return report
@@ -33,6 +33,10 @@ urlpatterns = [
             views.GroupsView.as_view(),
             name='groups'),
 
+    re_path(r'^Groups/(?P<uuid>[^/]+)/members$',
+            views.GroupMembersView.as_view(),
+            name='group-members'),
+
     re_path(r'^Me$',
             views.SCIMView.as_view(implemented=False),
             name='me'),
@@ -52,4 +56,12 @@ urlpatterns = [
     re_path(r'^Bulk$',
             views.SCIMView.as_view(implemented=False),
             name='bulk'),
+
+    re_path(r'^Changes$',
+            views.ChangesView.as_view(),
+            name='changes'),
+
+    re_path(r'^metrics$',
+            views.MetricsView.as_view(),
+            name='metrics'),
 ]
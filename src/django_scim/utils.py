@@ -1,7 +1,13 @@
 import json
+from concurrent.futures import ProcessPoolExecutor
 from urllib.parse import urlunparse
 
+from django.contrib.auth.hashers import make_password
+from django.utils.functional import cached_property
+
+from . import routing
 from .settings import scim_settings
+from .timing import get_request_timer
 
 
 def get_user_model():
@@ -32,6 +38,18 @@ def get_group_adapter():
     return scim_settings.GROUP_ADAPTER
 
 
+def get_model_adapter(model):
+    """
+    Return the adapter of instances of ``model`` (the user or group model or
+    one of their subclasses), or None.
+    """
+    if issubclass(model, get_user_model()):
+        return get_user_adapter()
+    if issubclass(model, get_group_model()):
+        return get_group_adapter()
+    return None
+
+
 def get_user_filter_parser():
     """
     Return the user filter parser.
@@ -109,6 +127,148 @@ def get_is_authenticated_predicate():
     return scim_settings.GET_IS_AUTHENTICATED_PREDICATE
 
 
+class SCIMRequestContext(object):
+    """
+    Settings getters and adapter classes resolved once for a single request.
+
+    SCIM views build one context per request and attach it to the request as
+    ``request.scim_context`` so that adapters serializing many objects do not
+    repeat the lookups done by the getters in this module.
+    """
+
+    def __init__(self, request=None):
+        self.request = request
+        self._model_getters = {}
+        self._extra_filter_kwargs = {}
+
+    @cached_property
+    def user_model(self):
+        return get_user_model()
+
+    @cached_property
+    def user_adapter(self):
+        return get_user_adapter()
+
+    @cached_property
+    def group_model(self):
+        return get_group_model()
+
+    @cached_property
+    def group_adapter(self):
+        return get_group_adapter()
+
+    @cached_property
+    def base_location(self):
+        return get_base_scim_location_getter()(self.request)
+
+    @cached_property
+    def timer(self):
+        return get_request_timer()
+
+    @cached_property
+    def tenant(self):
+        return scim_settings.TENANT_GETTER(self.request)
+
+    @cached_property
+    def excluded_attributes(self):
+        """
+        Lower cased names of the top level attributes listed in the
+        ``excludedAttributes`` query parameter of the request.
+        """
+        if self.request is None:
+            return frozenset()
+        value = self.request.GET.get('excludedAttributes') or ''
+        return frozenset(name.strip().lower() for name in value.split(',') if name.strip())
+
+    @cached_property
+    def database(self):
+        """
+        Alias of the database (eg. the shard of the tenant) holding the
+        users and groups of the request, or None to use the default routing.
+        """
+        if self.request is None:
+            return None
+        return scim_settings.DATABASE_ALIAS_GETTER(self.request)
+
+    @cached_property
+    def read_database(self):
+        """
+        Alias of the database to send the reads of the request to: a read
+        replica (see ``django_scim.routing``) or ``database``.
+        """
+        return routing.get_read_database(self.request, self.tenant) or self.database
+
+    def _get_model_getter(self, getter_getter, model):
+        key = (getter_getter, model)
+        if key not in self._model_getters:
+            self._model_getters[key] = getter_getter(model)
+        return self._model_getters[key]
+
+    def get_extra_filter_kwargs_getter(self, model):
+        return self._get_model_getter(get_extra_model_filter_kwargs_getter, model)
+
+    def get_extra_exclude_kwargs_getter(self, model):
+        return self._get_model_getter(get_extra_model_exclude_kwargs_getter, model)
+
+    def get_object_post_processor(self, model):
+        return self._get_model_getter(get_object_post_processor_getter, model)
+
+    def get_queryset_post_processor(self, model):
+        return self._get_model_getter(get_queryset_post_processor_getter, model)
+
+    def extra_filter_kwargs(self, model):
+        """
+        Return a copy of the extra filter kwargs (eg. tenant kwargs) for
+        ``model``, calling the configured getter at most once per request.
+        """
+        if model not in self._extra_filter_kwargs:
+            getter = self.get_extra_filter_kwargs_getter(model)
+            self._extra_filter_kwargs[model] = getter(self.request)
+        return dict(self._extra_filter_kwargs[model])
+
+
+def get_request_context(request):
+    """
+    Return the ``SCIMRequestContext`` attached to ``request``, building and
+    attaching one if needed.
+    """
+    if request is None:
+        return SCIMRequestContext()
+
+    context = getattr(request, 'scim_context', None)
+    if context is None:
+        context = SCIMRequestContext(request)
+        request.scim_context = context
+
+    return context
+
+
+def default_tenant_getter(request):
+    """
+    Return an identifier of the tenant a SCIM request is made for. Used to tag
+    instrumentation records and to scope caches. Single tenant apps need not
+    override this.
+    """
+    return None
+
+
+def default_database_alias_getter(request):
+    """
+    Return the alias of the database holding the users and groups of the
+    request, or None to use the default routing (eg. Django's
+    ``DATABASE_ROUTERS``).
+    """
+    return None
+
+
+def default_read_database_alias_getter(request):
+    """
+    Return the alias of the database (eg. a read replica) to serve the read
+    requests of users and groups from, or None to use the default routing.
+    """
+    return None
+
+
 def default_is_authenticated_predicate(user):
     return user.is_authenticated
 
@@ -213,6 +373,43 @@ def default_get_queryset_post_processor_getter(model):
     return get_queryset_post_processor
 
 
+def _init_password_hashing_worker():
+    """
+    Make sure Django is set up in worker processes that were spawned
+    rather than forked.
+    """
+    import django
+    django.setup()
+
+
+def make_passwords(passwords, processes=None):
+    """
+    Return a list of encoded passwords, one for each cleartext password in
+    ``passwords``.
+
+    Hashing is CPU bound and intentionally slow. When ``processes`` is greater
+    than one, the ``make_password`` calls are fanned out to a pool of worker
+    processes so that a batch of passwords is hashed on more than one core.
+
+    :param passwords: list of cleartext passwords
+    :param processes: number of worker processes; defaults to the
+        ``PASSWORD_HASHING_PROCESSES`` setting.
+    :rtype: list
+    """
+    passwords = list(passwords)
+    if processes is None:
+        processes = scim_settings.PASSWORD_HASHING_PROCESSES
+
+    if not processes or processes < 2 or len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+
+    max_workers = min(processes, len(passwords))
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             initializer=_init_password_hashing_worker) as executor:
+        chunksize = max(1, len(passwords) // (max_workers * 4))
+        return list(executor.map(make_password, passwords, chunksize=chunksize))
+
+
 def clean_structure_of_passwords(obj):
     if isinstance(obj, dict):
         new_obj = {}
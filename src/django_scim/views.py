@@ -1,10 +1,13 @@
 import json
 import logging
+import time
 from urllib.parse import urljoin
 
 from django import db
 from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
 from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.query import RawQuerySet
 from django.http import HttpResponse
 from django.urls import reverse
 from django.utils.decorators import method_decorator
@@ -12,18 +15,24 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import View
 from scim2_filter_parser.parser import SCIMParserError
 
-from . import constants, exceptions
+from . import (
+    cache,
+    changelog,
+    constants,
+    documents,
+    exceptions,
+    metrics,
+    retry,
+    routing,
+)
+from .filters import normalize_filter, parse_equality_filter
 from .settings import scim_settings
 from .utils import (
     get_all_schemas_getter,
-    get_base_scim_location_getter,
-    get_extra_model_exclude_kwargs_getter,
-    get_extra_model_filter_kwargs_getter,
     get_group_adapter,
     get_group_filter_parser,
     get_group_model,
-    get_object_post_processor_getter,
-    get_queryset_post_processor_getter,
+    get_request_context,
     get_service_provider_config_model,
     get_user_adapter,
     get_user_filter_parser,
@@ -31,12 +40,58 @@ from .utils import (
 )
 
 logger = logging.getLogger(__name__)
+slow_filter_logger = logging.getLogger('django_scim.slow_filters')
+
+
+def encode_resources(scim_adapter, request, objs):
+    """
+    Return the JSON documents of a list of model instances, from the
+    fragment cache and the document store when they are enabled.
+    """
+    context = get_request_context(request)
+    timer = context.timer
+
+    def serialize(scim_objs):
+        scim_adapter.prefetch([scim_obj.obj for scim_obj in scim_objs], request)
+        with timer.phase('serialize'):
+            docs = [scim_obj.to_dict() for scim_obj in scim_objs]
+        with timer.phase('encode'):
+            return [json.dumps(doc) for doc in docs]
+
+    def render(scim_objs):
+        if documents.is_enabled():
+            return documents.get_documents(scim_adapter, [scim_obj.obj for scim_obj in scim_objs], request)
+        return serialize(scim_objs)
+
+    scim_objs = [scim_adapter(obj, request=request) for obj in objs]
+    # Cached and stored documents include all the attributes.
+    if context.excluded_attributes:
+        return serialize(scim_objs)
+    if not cache.fragments_enabled():
+        return render(scim_objs)
+
+    return cache.get_fragments(scim_objs, render)
+
+
+def project(qs, scim_adapter):
+    """
+    Restrict ``qs`` to the columns read by ``scim_adapter`` to render its
+    objects, if the adapter declares them.
+    """
+    fields = scim_adapter.get_only_fields(qs.model)
+    if fields is None:
+        return qs
+    return qs.only(*fields)
 
 
 class SCIMView(View):
     lookup_url_kwarg = 'uuid'  # argument in django URL pattern
     implemented = True
 
+    # True if the view never writes, whatever the HTTP method of the
+    # request, so that its reads can be routed to a read replica.
+    read_only = False
+
     @property
     def lookup_field(self):
         """Database field, possibly redefined in the adapter"""
@@ -48,21 +103,26 @@ class SCIMView(View):
         # self instance and passing self to class getter
         return self.__class__.model_cls_getter()
 
+    @property
+    def scim_context(self):
+        """Settings getters and adapters resolved once for the current request"""
+        return get_request_context(getattr(self, 'request', None))
+
     @property
     def get_extra_filter_kwargs(self):
-        return get_extra_model_filter_kwargs_getter(self.model_cls)
+        return self.scim_context.get_extra_filter_kwargs_getter(self.model_cls)
 
     @property
     def get_extra_exclude_kwargs(self):
-        return get_extra_model_exclude_kwargs_getter(self.model_cls)
+        return self.scim_context.get_extra_exclude_kwargs_getter(self.model_cls)
 
     @property
     def get_object_post_processor(self):
-        return get_object_post_processor_getter(self.model_cls)
+        return self.scim_context.get_object_post_processor(self.model_cls)
 
     @property
     def get_queryset_post_processor(self):
-        return get_queryset_post_processor_getter(self.model_cls)
+        return self.scim_context.get_queryset_post_processor(self.model_cls)
 
     @property
     def scim_adapter(self):
@@ -70,6 +130,18 @@ class SCIMView(View):
         # self instance and passing self to class getter
         return self.__class__.scim_adapter_getter()
 
+    def get_queryset(self):
+        """
+        Return all objects of the view's model, from the database chosen by
+        ``DATABASE_ALIAS_GETTER`` or, for read requests,
+        ``READ_DATABASE_ALIAS_GETTER``. Read requests only load the columns
+        the adapter renders.
+        """
+        qs = self.model_cls.objects.using(self.scim_context.read_database)
+        if routing.is_read_request(self.request):
+            qs = project(qs, self.scim_adapter)
+        return qs
+
     def get_object(self):
         """Get object by configurable ID."""
         # Perform the lookup filtering.
@@ -90,10 +162,15 @@ class SCIMView(View):
         # No use of get_extra_exclude_kwargs here since we are
         # searching for a specific single object.
 
+        negative_key = cache.get_negative_key(self.scim_adapter, self.scim_context.tenant, 'id', uuid)
+        if cache.is_known_missing(negative_key):
+            raise exceptions.NotFoundError(uuid)
+
         try:
-            obj = self.model_cls.objects.get(**extra_filter_kwargs)
+            obj = self.get_queryset().get(**extra_filter_kwargs)
             return self.get_object_post_processor(self.request, obj)
         except ObjectDoesNotExist:
+            cache.remember_missing(negative_key)
             raise exceptions.NotFoundError(uuid)
         except MultipleObjectsReturned:
             msg = (
@@ -102,32 +179,110 @@ class SCIMView(View):
             )
             raise exceptions.BadRequestError(msg)
 
+    def check_precondition(self, request, scim_obj):
+        """
+        Raise ``PreconditionFailedError`` if the request has an ``If-Match``
+        header that does not list the entity tag of the current version of
+        ``scim_obj``.
+        """
+        if_match = request.headers.get('If-Match')
+        if not if_match or if_match.strip() == '*':
+            return
+
+        etags = [etag.strip() for etag in if_match.split(',')]
+        # Entity tags are compared weakly (RFC 7232 section 2.3.2).
+        versions = {etag[2:] if etag.startswith('W/') else etag for etag in etags}
+        if scim_obj.etag[2:] not in versions:
+            raise exceptions.PreconditionFailedError('Resource version does not match If-Match header')
+
+    def check_conflict_retry(self, request, error, conflicts):
+        """
+        Raise if a write that failed with ``VersionConflictError`` after
+        ``conflicts`` previous conflicts should not be retried.
+        """
+        if request.headers.get('If-Match'):
+            raise exceptions.PreconditionFailedError('Resource was modified by a concurrent request')
+        if conflicts == scim_settings.VERSION_CONFLICT_RETRIES:
+            raise error
+
+    def write_with_retries(self, request, obj, write):
+        """
+        Call ``write`` with an adapter of ``obj`` in a transaction and return
+        the adapter.
+
+        Saves fail with ``VersionConflictError`` if another request changed
+        the object since it was loaded. In that case the object is loaded
+        again and ``write`` is retried, up to ``VERSION_CONFLICT_RETRIES``
+        times. Requests with an ``If-Match`` header are not retried since
+        the client asked for changes to a specific version of the resource.
+
+        Transactions aborted by the database because of a deadlock or a
+        serialization failure are retried with a fresh object too, up to
+        ``TRANSACTION_RETRIES`` times (see ``django_scim.retry``). Unsaved
+        objects (``POST``) are replaced by new instances.
+        """
+        is_new = obj.pk is None
+        using = self.scim_context.database
+        can_retry = retry.can_retry(using)
+        conflicts = 0
+        failures = 0
+        while True:
+            scim_obj = self.scim_adapter(obj, request=request)
+            self.check_precondition(request, scim_obj)
+            try:
+                with self.scim_context.timer.phase('write'), transaction.atomic(using=using):
+                    write(scim_obj)
+                routing.pin_reads(self.scim_context.tenant, using)
+                return scim_obj
+            except exceptions.VersionConflictError as e:
+                self.check_conflict_retry(request, e, conflicts)
+                conflicts += 1
+                reason = 'conflict'
+            except db.utils.DatabaseError as e:
+                if not (can_retry and retry.should_retry(e, failures)):
+                    raise
+                failures += 1
+                reason = 'transient'
+                time.sleep(retry.get_delay(failures))
+
+            metrics.inc('scim_write_retries_total', resource=scim_obj.resource_type, reason=reason)
+            obj = self.model_cls() if is_new else self.get_object()
+
     @method_decorator(csrf_exempt)
     @method_decorator(scim_settings.AUTH_CHECK_MIDDLEWARE)
     def dispatch(self, request, *args, **kwargs):
         if not self.implemented:
             return self.status_501(request, *args, **kwargs)
 
-        try:
-            return super(SCIMView, self).dispatch(request, *args, **kwargs)
-        except Exception as e:
-            if not isinstance(e, exceptions.SCIMException):
-                logger.exception('Unable to complete SCIM call.')
-
-                # In some circumstances it can be beneficial for the client
-                # to know what caused an error. However, this can present an
-                # unacceptable security risk for many companies. This flag
-                # allows for a generic error message to be returned when such a
-                # security risk is unacceptable.
-                if scim_settings.EXPOSE_SCIM_EXCEPTIONS:
-                    e = exceptions.SCIMException(str(e))
-                else:
-                    e = exceptions.SCIMException('Exception occurred while processing the SCIM request')
-
-            content = json.dumps(e.to_dict())
-            return HttpResponse(content=content,
-                                content_type=constants.SCIM_CONTENT_TYPE,
-                                status=e.status)
+        request.scim_read_only = self.read_only or request.method in routing.READ_METHODS
+        # Resolve settings getters and adapters once for this request.
+        request.scim_context = get_request_context(request)
+        timer = request.scim_context.timer
+
+        with timer.capture_queries(), changelog.recording_tenant(request.scim_context.tenant):
+            try:
+                response = super(SCIMView, self).dispatch(request, *args, **kwargs)
+            except Exception as e:
+                if not isinstance(e, exceptions.SCIMException):
+                    logger.exception('Unable to complete SCIM call.')
+
+                    # In some circumstances it can be beneficial for the client
+                    # to know what caused an error. However, this can present an
+                    # unacceptable security risk for many companies. This flag
+                    # allows for a generic error message to be returned when such a
+                    # security risk is unacceptable.
+                    if scim_settings.EXPOSE_SCIM_EXCEPTIONS:
+                        e = exceptions.SCIMException(str(e))
+                    else:
+                        e = exceptions.SCIMException('Exception occurred while processing the SCIM request')
+
+                content = json.dumps(e.to_dict())
+                response = HttpResponse(content=content,
+                                        content_type=constants.SCIM_CONTENT_TYPE,
+                                        status=e.status)
+
+        timer.finish(self, request, response)
+        return response
 
     def status_501(self, request, *args, **kwargs):
         """
@@ -141,11 +296,22 @@ class SCIMView(View):
         stripped = decoded.strip() or '{}'
 
         try:
-            return json.loads(stripped)
+            with self.scim_context.timer.phase('parse'):
+                return json.loads(stripped)
         except json.decoder.JSONDecodeError as e:
             msg = 'Could not decode JSON body: ' + e.args[0]
             raise exceptions.BadRequestError(msg)
 
+    def serialize(self, scim_obj):
+        """Return the SCIM document for an adapter instance"""
+        with self.scim_context.timer.phase('serialize'):
+            return scim_obj.to_dict()
+
+    def encode(self, doc):
+        """Return the JSON encoding of a SCIM document"""
+        with self.scim_context.timer.phase('encode'):
+            return json.dumps(doc)
+
 
 class FilterMixin(object):
 
@@ -170,18 +336,124 @@ class FilterMixin(object):
             raise exceptions.BadRequestError('Invalid pagination values: ' + str(e))
 
     def _search(self, request, query, start, count):
+        negative_key = self._get_negative_key(request, query)
+        if cache.is_known_missing(negative_key):
+            return self._build_response(request, [], start, count)
+
+        extra_filter_kwargs = self.get_extra_filter_kwargs(request)
+        extra_exclude_kwargs = self.get_extra_exclude_kwargs(request)
+
+        cache_key = cache.get_filter_cache_key(
+            request, self.scim_adapter.resource_type, query, start, count,
+            [extra_filter_kwargs, extra_exclude_kwargs],
+        )
+        response = self._get_cached_response(cache_key)
+        if response is None:
+            response = self._search_database(request, query, start, count,
+                                             extra_filter_kwargs, extra_exclude_kwargs)
+            if cache_key and response.status_code == 200:
+                cache.get_cache().set(cache_key, response.content, scim_settings.FILTER_CACHE_TIMEOUT)
+
+        # Responses served from the filter cache do not tell their total:
+        # they are already cheap to serve.
+        if negative_key and getattr(response, 'scim_total_results', None) == 0:
+            cache.remember_missing(negative_key)
+
+        return response
+
+    def _get_negative_key(self, request, query):
+        """
+        Return the negative cache key of a filter testing the equality of one
+        of the adapter's ``lookup_attrs`` mapped by the filter parser, or
+        None. Filters on attributes the parser does not map match nothing
+        whether objects exist or not.
+        """
+        if not cache.negative_enabled():
+            return None
+
+        lookup = parse_equality_filter(query)
+        if lookup is None:
+            return None
+
+        attr, value = lookup
+        attr_map = self.__class__.parser_getter().attr_map
+        if not any(name.lower() == attr.lower() and sub_attr is None for name, sub_attr, uri in attr_map):
+            return None
+
+        tenant = get_request_context(request).tenant
+        return cache.get_negative_key(self.scim_adapter, tenant, attr, value, kind='filter')
+
+    def _get_cached_response(self, cache_key):
+        if cache_key is None:
+            return None
+
+        content = cache.get_cache().get(cache_key)
+        metrics.record_cache_lookup('filter', content is not None)
+        if content is None:
+            return None
+
+        return HttpResponse(content=content, content_type=constants.SCIM_CONTENT_TYPE)
+
+    def _search_database(self, request, query, start, count, extra_filter_kwargs, extra_exclude_kwargs):
         try:
-            qs = self.__class__.parser_getter().search(query, request)
+            with get_request_context(request).timer.phase('filter'):
+                qs = self.__class__.parser_getter().search(query, request)
         except (ValueError, SCIMParserError) as e:
             raise exceptions.BadRequestError('Invalid filter/search query: ' + str(e))
 
-        extra_filter_kwargs = self.get_extra_filter_kwargs(request)
-        qs = self._filter_raw_queryset_with_extra_filter_kwargs(qs, extra_filter_kwargs)
-        extra_exclude_kwargs = self.get_extra_exclude_kwargs(request)
+        rows = self._fetch_rows(request, query, qs)
+        qs = self._filter_raw_queryset_with_extra_filter_kwargs(rows, extra_filter_kwargs)
         qs = self._filter_raw_queryset_with_extra_exclude_kwargs(qs, extra_exclude_kwargs)
 
+        if scim_settings.METRICS_ENABLED:
+            resource = self.scim_adapter.resource_type
+            returned = len(qs[start - 1:(start - 1) + count])
+            metrics.registry.inc('scim_search_rows_scanned_total', len(rows), resource=resource)
+            metrics.registry.inc('scim_search_rows_returned_total', returned, resource=resource)
+
         return self._build_response(request, qs, start, count)
 
+    def _fetch_rows(self, request, query, qs):
+        """
+        Return the rows of a filter search, logging the query plan of searches
+        slower than the ``FILTER_EXPLAIN_THRESHOLD`` setting.
+        """
+        threshold = scim_settings.FILTER_EXPLAIN_THRESHOLD
+        if threshold is None or not isinstance(qs, RawQuerySet):
+            return list(qs)
+
+        start = time.perf_counter()
+        rows = list(qs)
+        duration = time.perf_counter() - start
+
+        if duration >= threshold:
+            self._log_slow_filter(request, query, qs, duration)
+
+        return rows
+
+    def _log_slow_filter(self, request, query, qs, duration):
+        parser = self.__class__.parser_getter()
+        try:
+            plan = parser.explain(qs)
+        except db.Error as e:
+            plan = f'Could not explain query: {e}'
+
+        tenant = get_request_context(request).tenant
+        slow_filter_logger.warning(
+            'Slow SCIM filter (%.3fs) for tenant %s: %s\nSQL: %s\nPlan:\n%s',
+            duration,
+            tenant,
+            normalize_filter(query),
+            qs.raw_query,
+            plan,
+            extra={
+                'duration': duration,
+                'filter_shape': normalize_filter(query),
+                'resource': self.scim_adapter.resource_type,
+                'tenant': tenant,
+            },
+        )
+
     def _get_nested_field(self, obj, attr_key):
         """Get a nested field for a given object, so 'a__b__c' returns a tuple with (obj.a.b.c, found)"""
         tokens = attr_key.split('__')
@@ -232,27 +504,35 @@ class FilterMixin(object):
         return obj_list
 
     def _build_response(self, request, qs, start, count):
+        timer = get_request_context(request).timer
         try:
-            total_count = sum(1 for _ in qs)
+            if isinstance(qs, QuerySet):
+                total_count = qs.count()
+            else:
+                total_count = sum(1 for _ in qs)
             qs = qs[start - 1:(start - 1) + count]
-            resources = [self.scim_adapter(o, request=request).to_dict() for o in qs]
+            resources = encode_resources(self.scim_adapter, request, list(qs))
             doc = {
                 'schemas': [constants.SchemaURI.LIST_RESPONSE],
                 'totalResults': total_count,
                 'itemsPerPage': len(resources),
                 'startIndex': start,
-                'Resources': resources,
             }
         except ValueError as e:
             raise exceptions.BadRequestError(str(e))
         else:
-            content = json.dumps(doc)
-            return HttpResponse(content=content,
-                                content_type=constants.SCIM_CONTENT_TYPE)
+            # Splice the encoded resources into the encoded list response.
+            with timer.phase('encode'):
+                content = json.dumps(doc)[:-1] + ', "Resources": [' + ', '.join(resources) + ']}'
+            response = HttpResponse(content=content,
+                                    content_type=constants.SCIM_CONTENT_TYPE)
+            response.scim_total_results = total_count
+            return response
 
 
 class SearchView(FilterMixin, SCIMView):
     http_method_names = ['post']
+    read_only = True
 
     # override model class so correct extra_filter/exclude_kwarg getter is fetched
     model_cls = 'search'
@@ -269,7 +549,7 @@ class SearchView(FilterMixin, SCIMView):
 
         response = self._search(request, query, *self._page(request))
         path = reverse(self.scim_adapter.url_name)
-        url = urljoin(get_base_scim_location_getter()(request=request), path).rstrip('/')
+        url = urljoin(self.scim_context.base_location, path).rstrip('/')
         response['Location'] = url + '/.search'
         return response
 
@@ -294,10 +574,14 @@ class GetView(object):
     def get_single(self, request):
         obj = self.get_object()
         scim_obj = self.scim_adapter(obj, request=request)
-        content = json.dumps(scim_obj.to_dict())
+        if cache.fragments_enabled() or documents.is_enabled():
+            content = encode_resources(self.scim_adapter, request, [obj])[0]
+        else:
+            content = self.encode(self.serialize(scim_obj))
         response = HttpResponse(content=content,
                                 content_type=constants.SCIM_CONTENT_TYPE)
         response['Location'] = scim_obj.location
+        response['ETag'] = scim_obj.etag
         return response
 
     def get_many(self, request):
@@ -307,7 +591,7 @@ class GetView(object):
 
         extra_filter_kwargs = self.get_extra_filter_kwargs(request)
         extra_exclude_kwargs = self.get_extra_exclude_kwargs(request)
-        qs = self.model_cls.objects.filter(
+        qs = self.get_queryset().filter(
             **extra_filter_kwargs
         ).exclude(
             **extra_exclude_kwargs
@@ -322,8 +606,11 @@ class DeleteView(object):
         obj = self.get_object()
 
         scim_obj = self.scim_adapter(obj, request=request)
+        self.check_precondition(request, scim_obj)
 
-        scim_obj.delete()
+        with self.scim_context.timer.phase('write'):
+            scim_obj.delete()
+        routing.pin_reads(self.scim_context.tenant, scim_obj.database)
 
         return HttpResponse(status=204)
 
@@ -331,28 +618,31 @@ class DeleteView(object):
 class PostView(object):
     def post(self, request, *args, **kwargs):
         obj = self.model_cls()
-        scim_obj = self.scim_adapter(obj, request=request)
 
         body = self.load_body(request.body)
 
         if not body:
             raise exceptions.BadRequestError('POST call made with empty body')
 
-        scim_obj.validate_dict(body)
-        scim_obj.from_dict(body)
+        self.scim_adapter(obj, request=request).validate_dict(body)
 
-        try:
+        def write(scim_obj):
+            scim_obj.from_dict(body)
             scim_obj.save()
+
+        try:
+            scim_obj = self.write_with_retries(request, obj, write)
         except db.utils.IntegrityError as e:
             # Cast error to a SCIM IntegrityError to use the status
             # attribute on the SCIM IntegrityError.
             raise exceptions.IntegrityError(str(e))
 
-        content = json.dumps(scim_obj.to_dict())
+        content = self.encode(self.serialize(scim_obj))
         response = HttpResponse(content=content,
                                 content_type=constants.SCIM_CONTENT_TYPE,
                                 status=201)
         response['Location'] = scim_obj.location
+        response['ETag'] = scim_obj.etag
         return response
 
 
@@ -360,26 +650,29 @@ class PutView(object):
     def put(self, request, *args, **kwargs):
         obj = self.get_object()
 
-        scim_obj = self.scim_adapter(obj, request=request)
-
         body = self.load_body(request.body)
 
         if not body:
             raise exceptions.BadRequestError('PUT call made with empty body')
 
-        scim_obj.validate_dict(body)
-        scim_obj.from_dict(body)
-        try:
+        self.scim_adapter(obj, request=request).validate_dict(body)
+
+        def write(scim_obj):
+            scim_obj.from_dict(body)
             scim_obj.save()
+
+        try:
+            scim_obj = self.write_with_retries(request, obj, write)
         except db.utils.IntegrityError as e:
             # Cast error to a SCIM IntegrityError to use the status
             # attribute on the SCIM IntegrityError.
             raise exceptions.IntegrityError(str(e))
 
-        content = json.dumps(scim_obj.to_dict())
+        content = self.encode(self.serialize(scim_obj))
         response = HttpResponse(content=content,
                                 content_type=constants.SCIM_CONTENT_TYPE)
         response['Location'] = scim_obj.location
+        response['ETag'] = scim_obj.etag
         return response
 
 
@@ -387,7 +680,6 @@ class PatchView(object):
     def patch(self, request, *args, **kwargs):
         obj = self.get_object()
 
-        scim_obj = self.scim_adapter(obj, request=request)
         body = self.load_body(request.body)
 
         operations = body.get('Operations')
@@ -395,13 +687,25 @@ class PatchView(object):
         if not operations:
             raise exceptions.BadRequestError('PATCH call made without operations array')
 
-        with transaction.atomic():
-            scim_obj.handle_operations(operations)
+        scim_obj = self.write_with_retries(
+            request,
+            obj,
+            lambda scim_obj: scim_obj.handle_operations(operations),
+        )
+
+        if scim_settings.METRICS_ENABLED:
+            for operation in operations:
+                metrics.registry.inc(
+                    'scim_patch_operations_total',
+                    resource=scim_obj.resource_type,
+                    op=str(operation.get('op', '')).lower(),
+                )
 
-        content = json.dumps(scim_obj.to_dict())
+        content = self.encode(self.serialize(scim_obj))
         response = HttpResponse(content=content,
                                 content_type=constants.SCIM_CONTENT_TYPE)
         response['Location'] = scim_obj.location
+        response['ETag'] = scim_obj.etag
         return response
 
 
@@ -423,6 +727,50 @@ class GroupsView(FilterMixin, GetView, PostView, PutView, PatchView, DeleteView,
     parser_getter = get_group_filter_parser
 
 
+class GroupMembersView(FilterMixin, SCIMView):
+    """
+    Page through the members of a group (in id order) with ``startIndex``
+    and ``count``, or check whether a user is a member with
+    ``filter=value eq "<user id>"``, which runs a single indexed query.
+    """
+    http_method_names = ['get']
+
+    scim_adapter_getter = get_group_adapter
+    model_cls_getter = get_group_model
+
+    def get(self, request, *args, **kwargs):
+        scim_group = self.scim_adapter(self.get_object(), request=request)
+        user_adapter = self.scim_context.user_adapter
+        start, count = self._page(request)
+        # Members only render their id and display name.
+        members = scim_group.get_members()
+        fields = user_adapter.get_only_fields(members.model, ['id', 'displayName'])
+        if fields is not None:
+            members = members.only(*fields)
+
+        query = request.GET.get('filter')
+        if query:
+            lookup = parse_equality_filter(query)
+            if lookup is None or lookup[0].lower() != 'value':
+                raise exceptions.BadRequestError('Members can only be filtered with "value eq"')
+            users = list(members.filter(**{user_adapter.id_field: lookup[1]})[:1])
+            total_count = len(users)
+            users = users[start - 1:(start - 1) + count]
+        else:
+            total_count = members.count()
+            users = list(members[start - 1:(start - 1) + count])
+
+        resources = [scim_group.get_member(user_adapter(user, request)) for user in users]
+        doc = {
+            'schemas': [constants.SchemaURI.LIST_RESPONSE],
+            'totalResults': total_count,
+            'itemsPerPage': len(resources),
+            'startIndex': start,
+            'Resources': resources,
+        }
+        return HttpResponse(content=self.encode(doc), content_type=constants.SCIM_CONTENT_TYPE)
+
+
 class ServiceProviderConfigView(SCIMView):
     http_method_names = ['get']
 
@@ -484,3 +832,111 @@ class SchemasView(SCIMView):
         content = json.dumps(doc)
         return HttpResponse(content=content,
                             content_type=constants.SCIM_CONTENT_TYPE)
+
+
+class ChangesView(SCIMView):
+    """
+    Return the users and groups changed after the ``since`` watermark, per
+    the change log (see ``django_scim.changelog``).
+    """
+    http_method_names = ['get']
+
+    def get(self, request, *args, **kwargs):
+        if not changelog.is_enabled():
+            return self.status_501(request, *args, **kwargs)
+
+        try:
+            since = int(request.GET.get('since', 0))
+            count = int(request.GET.get('count', 100))
+        except ValueError as e:
+            raise exceptions.BadRequestError('Invalid since or count value: ' + str(e))
+
+        resource_type = request.GET.get('resourceType')
+        changes = changelog.get_changes(
+            since,
+            count,
+            [resource_type] if resource_type else None,
+            tenant=self.scim_context.tenant,
+            using=self.scim_context.read_database,
+        )
+        watermark = changes[-1].id if changes else since
+
+        resources = self.get_resources(request, changelog.collapse(changes))
+        doc = {
+            'schemas': [constants.SchemaURI.LIST_RESPONSE],
+            'totalResults': len(resources),
+            'itemsPerPage': len(resources),
+            'startIndex': 1,
+            'watermark': watermark,
+        }
+        content = json.dumps(doc)[:-1] + ', "Resources": [' + ', '.join(resources) + ']}'
+        return HttpResponse(content=content, content_type=constants.SCIM_CONTENT_TYPE)
+
+    def get_resources(self, request, changes):
+        """
+        Return the JSON documents of the changed resources in the order of
+        ``changes``: the current document of existing resources and a
+        tombstone for deleted ones. Resources excluded by the extra filter
+        and exclude kwargs, deleted after the listed changes, or deleted
+        outside the SCIM requests of the tenant, are left out.
+        """
+        context = self.scim_context
+        documents_by_change = {}
+        for model, adapter in ((context.user_model, context.user_adapter),
+                               (context.group_model, context.group_adapter)):
+            live = [
+                c for c in changes
+                if c.resource_type == adapter.resource_type and c.action != c.DELETE
+            ]
+            if not live:
+                continue
+
+            objs = project(model.objects.using(context.read_database), adapter).filter(
+                **context.extra_filter_kwargs(model)
+            ).exclude(
+                **context.get_extra_exclude_kwargs_getter(model)(request)
+            ).in_bulk([c.object_id for c in live])
+            objs = {str(pk): obj for pk, obj in objs.items()}
+
+            found = [c for c in live if c.object_id in objs]
+            encoded = encode_resources(adapter, request, [objs[c.object_id] for c in found])
+            documents_by_change.update(zip([c.id for c in found], encoded))
+
+        # Deletes made outside SCIM requests are not known to be of the
+        # tenant.
+        tenant = changelog.get_tenant_value(context.tenant)
+        resources = []
+        for change in changes:
+            if change.action == change.DELETE:
+                if tenant is None or change.tenant == tenant:
+                    resources.append(json.dumps(self.get_tombstone(change)))
+            elif change.id in documents_by_change:
+                resources.append(documents_by_change[change.id])
+
+        return resources
+
+    def get_tombstone(self, change):
+        return {
+            'id': change.scim_id or change.object_id,
+            'meta': {
+                'resourceType': change.resource_type,
+                'lastModified': change.timestamp.isoformat(),
+                'deleted': True,
+            },
+        }
+
+
+class MetricsView(SCIMView):
+    """
+    Expose the metrics registry in the Prometheus text format.
+    """
+    http_method_names = ['get']
+
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def get(self, request, *args, **kwargs):
+        if not scim_settings.METRICS_ENABLED:
+            return self.status_501(request, *args, **kwargs)
+
+        return HttpResponse(content=metrics.collect().exposition(),
+                            content_type=self.content_type)
@@ -1,11 +1,13 @@
 from django.contrib.auth import get_user_model
 
+from django_scim import constants
 from django_scim.filters import FilterQuery
 from django_scim.utils import get_group_model
 
 
 class UserFilterQuery(FilterQuery):
     model_getter = get_user_model
+    schema_uris = (constants.SchemaURI.USER, constants.SchemaURI.ENTERPRISE_USER)
     attr_map = {
         ('userName', None, None): 'username',
         ('name', 'familyName', None): 'last_name',
@@ -13,9 +15,13 @@ class UserFilterQuery(FilterQuery):
         ('name', 'givenName', None): 'first_name',
         ('givenName', None, None): 'first_name',
         ('active', None, None): 'is_active',
+        ('meta', 'lastModified', None): 'scim_last_modified',
     }
 
 
 class GroupFilterQuery(FilterQuery):
     model_getter = get_group_model
-    attr_map = {}
+    schema_uris = (constants.SchemaURI.GROUP,)
+    attr_map = {
+        ('meta', 'lastModified', None): 'scim_last_modified',
+    }
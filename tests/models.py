@@ -21,5 +21,17 @@ class TestUser(scim_models.AbstractSCIMUserMixin, AbstractUser):
         app_label = 'django_scim'
 
 
+class TestSCIMDocument(scim_models.AbstractSCIMDocument):
+
+    class Meta(scim_models.AbstractSCIMDocument.Meta):
+        app_label = 'django_scim'
+
+
+class TestSCIMChange(scim_models.AbstractSCIMChange):
+
+    class Meta(scim_models.AbstractSCIMChange.Meta):
+        app_label = 'django_scim'
+
+
 def get_group_model():
     return TestGroup
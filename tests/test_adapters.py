@@ -71,9 +71,10 @@ class SCIMUserTestCase(TestCase):
 
         expected = {
             'resourceType': 'User',
-            'lastModified': ford.date_joined.isoformat(),
+            'lastModified': ford.scim_last_modified.isoformat(),
             'location': u'https://localhost/scim/v2/Users/1',
             'created': ford.date_joined.isoformat(),
+            'version': 'W/"1"',
         }
 
         ford = get_user_adapter()(ford, self.request)
@@ -97,9 +98,10 @@ class SCIMUserTestCase(TestCase):
             'userName': 'rford',
             'meta': {
                 'resourceType': 'User',
-                'lastModified': ford.date_joined.isoformat(),
+                'lastModified': ford.scim_last_modified.isoformat(),
                 'location': u'https://localhost/scim/v2/Users/1',
                 'created': ford.date_joined.isoformat(),
+                'version': 'W/"1"',
             },
             'displayName': u'Robert Ford',
             'name': {
@@ -147,6 +149,34 @@ class SCIMUserTestCase(TestCase):
 
         self.assertEqual(ford.resource_type_dict(), expected)
 
+    def test_hash_passwords(self):
+        scim_users = []
+        for i in range(3):
+            scim_user = get_user_adapter()(get_user_model()(), self.request)
+            scim_user.defer_password_hashing = True
+            scim_user.from_dict({
+                'userName': f'host{i}',
+                'password': f'secret{i}',
+            })
+            self.assertEqual(scim_user.obj.password, '')
+            scim_users.append(scim_user)
+
+        get_user_adapter().hash_passwords(scim_users, processes=2)
+
+        for i, scim_user in enumerate(scim_users):
+            scim_user.save()
+            scim_user.obj.refresh_from_db()
+            self.assertTrue(scim_user.obj.check_password(f'secret{i}'))
+
+    def test_save_hashes_deferred_password(self):
+        scim_user = get_user_adapter()(get_user_model()(), self.request)
+        scim_user.defer_password_hashing = True
+        scim_user.from_dict({'userName': 'rford', 'password': 'secret'})
+        scim_user.save()
+
+        scim_user.obj.refresh_from_db()
+        self.assertTrue(scim_user.obj.check_password('secret'))
+
 
 @override_settings(AUTH_USER_MODEL='django_scim.TestUser')
 class SCIMHandleOperationsTestCase(TestCase):
@@ -457,7 +487,9 @@ class SCIMGroupTestCase(TestCase):
 
         expected = {
             'resourceType': 'Group',
-            'location': u'https://localhost/scim/v2/Groups/1'
+            'location': u'https://localhost/scim/v2/Groups/1',
+            'lastModified': behavior.obj.scim_last_modified.isoformat(),
+            'version': 'W/"1"',
         }
 
         self.assertEqual(behavior.meta, expected)
@@ -478,7 +510,9 @@ class SCIMGroupTestCase(TestCase):
         expected = {
             'meta': {
                 'resourceType': 'Group',
-                'location': u'https://localhost/scim/v2/Groups/1'
+                'location': u'https://localhost/scim/v2/Groups/1',
+                'lastModified': behavior.scim_last_modified.isoformat(),
+                'version': 'W/"1"',
             },
             'displayName': 'Behavior Group',
             'id': '1',
@@ -0,0 +1,376 @@
+import json
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from django_scim import cache, constants
+from django_scim.adapters import SCIMUser
+from django_scim.utils import get_user_model
+
+from tests.models import get_group_model
+from tests.test_views import LoginMixin
+
+CACHE_SETTINGS = dict(
+    settings.SCIM_SERVICE_PROVIDER,
+    FILTER_CACHE_TIMEOUT=60,
+    TENANT_GETTER='tests.test_cache.tenant_getter',
+)
+
+
+def tenant_getter(request):
+    return request.META.get('HTTP_X_TENANT')
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser', SCIM_SERVICE_PROVIDER=CACHE_SETTINGS)
+class FilterCacheTestCase(LoginMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.get_cache().clear()
+        self.addCleanup(cache.get_cache().clear)
+        self.ford = get_user_model().objects.create(username='rford', first_name='Robert', last_name='Ford')
+
+    def search(self, query, **extra):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse('scim:users'), {'filter': query}, **extra)
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        searched = any('SELECT DISTINCT' in q['sql'] for q in queries)
+        return json.loads(resp.content.decode()), searched
+
+    def test_repeated_search_is_served_from_cache(self):
+        first, searched = self.search('userName eq "rford"')
+        self.assertTrue(searched)
+        self.assertEqual(first['totalResults'], 1)
+
+        second, searched = self.search('userName  eq   "rford"')
+        self.assertFalse(searched)
+        self.assertEqual(first, second)
+
+        # Other filters and pages are separate entries.
+        _, searched = self.search('userName eq "dabernathy"')
+        self.assertTrue(searched)
+
+    def test_cache_disabled_by_default(self):
+        with override_settings(SCIM_SERVICE_PROVIDER=dict(CACHE_SETTINGS, FILTER_CACHE_TIMEOUT=None)):
+            self.search('userName eq "rford"')
+            _, searched = self.search('userName eq "rford"')
+        self.assertTrue(searched)
+
+    def test_tenants_do_not_share_entries(self):
+        self.search('userName eq "rford"', HTTP_X_TENANT='a')
+        _, searched = self.search('userName eq "rford"', HTTP_X_TENANT='b')
+        self.assertTrue(searched)
+        _, searched = self.search('userName eq "rford"', HTTP_X_TENANT='a')
+        self.assertFalse(searched)
+
+    def test_user_write_invalidates(self):
+        self.search('userName eq "rford"')
+
+        data = {
+            'schemas': [constants.SchemaURI.PATCH_OP],
+            'Operations': [{'op': 'replace', 'path': 'name.familyName', 'value': 'Fjord'}],
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.patch(reverse('scim:users', kwargs={'uuid': self.ford.scim_id}),
+                                     json.dumps(data), content_type=constants.SCIM_CONTENT_TYPE)
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+
+        result, searched = self.search('userName eq "rford"')
+        self.assertTrue(searched)
+        self.assertEqual(result['Resources'][0]['name']['familyName'], 'Fjord')
+
+    def test_write_only_invalidates_its_tenant(self):
+        self.search('userName eq "rford"', HTTP_X_TENANT='a')
+        self.search('userName eq "rford"', HTTP_X_TENANT='b')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('scim:users', kwargs={'uuid': self.ford.scim_id}), HTTP_X_TENANT='a')
+
+        result, searched = self.search('userName eq "rford"', HTTP_X_TENANT='a')
+        self.assertTrue(searched)
+        self.assertEqual(result['totalResults'], 0)
+        _, searched = self.search('userName eq "rford"', HTTP_X_TENANT='b')
+        self.assertFalse(searched)
+
+    def test_membership_change_invalidates_users(self):
+        group = get_group_model().objects.create(name='Behavior Group')
+        self.search('userName eq "rford"')
+
+        data = {
+            'schemas': [constants.SchemaURI.PATCH_OP],
+            'Operations': [{'op': 'add', 'path': 'members', 'value': [{'value': str(self.ford.id)}]}],
+        }
+        url = reverse('scim:groups', kwargs={'uuid': group.scim_id})
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch('django_scim.views.GroupsView.model_cls_getter', get_group_model):
+                resp = self.client.patch(url, json.dumps(data), content_type=constants.SCIM_CONTENT_TYPE)
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+
+        result, searched = self.search('userName eq "rford"')
+        self.assertTrue(searched)
+        self.assertEqual(result['Resources'][0]['groups'][0]['display'], 'Behavior Group')
+
+    def test_invalidate_all_tenants(self):
+        self.search('userName eq "rford"', HTTP_X_TENANT='a')
+        with self.captureOnCommitCallbacks(execute=True):
+            cache.invalidate(['User'])
+        _, searched = self.search('userName eq "rford"', HTTP_X_TENANT='a')
+        self.assertTrue(searched)
+
+
+FRAGMENT_SETTINGS = dict(
+    settings.SCIM_SERVICE_PROVIDER,
+    FRAGMENT_CACHE_TIMEOUT=60,
+    GROUP_MODEL='tests.models.TestGroup',
+)
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser', SCIM_SERVICE_PROVIDER=FRAGMENT_SETTINGS)
+class FragmentCacheTestCase(LoginMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.get_cache().clear()
+        self.addCleanup(cache.get_cache().clear)
+        self.ford = get_user_model().objects.create(username='rford', first_name='Robert', last_name='Ford')
+        self.to_dict = mock.patch.object(SCIMUser, 'to_dict', autospec=True, side_effect=SCIMUser.to_dict)
+        self.to_dict_mock = self.to_dict.start()
+        self.addCleanup(self.to_dict.stop)
+
+    def get_user(self, user):
+        resp = self.client.get(reverse('scim:users', kwargs={'uuid': user.scim_id}))
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        return json.loads(resp.content.decode())
+
+    def list_users(self):
+        resp = self.client.get(reverse('scim:users'))
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        return json.loads(resp.content.decode())
+
+    def test_single_resource_is_serialized_once(self):
+        first = self.get_user(self.ford)
+        second = self.get_user(self.ford)
+
+        self.assertEqual(first, second)
+        self.assertEqual(second['userName'], 'rford')
+        self.assertEqual(self.to_dict_mock.call_count, 1)
+
+    def test_list_response_splices_cached_fragments(self):
+        abernathy = get_user_model().objects.create(username='dabernathy')
+        single = self.get_user(abernathy)
+
+        result = self.list_users()
+
+        self.assertEqual(result['schemas'], [constants.SchemaURI.LIST_RESPONSE])
+        self.assertEqual(result['totalResults'], 3)
+        self.assertEqual(result['itemsPerPage'], 3)
+        self.assertEqual(result['startIndex'], 1)
+        self.assertIn(single, result['Resources'])
+        self.assertEqual([r['userName'] for r in result['Resources']][1:], ['rford', 'dabernathy'])
+        # abernathy was cached by the single resource request.
+        self.assertEqual(self.to_dict_mock.call_count, 3)
+
+        self.assertEqual(self.list_users(), result)
+        self.assertEqual(self.to_dict_mock.call_count, 3)
+
+    def test_save_invalidates_fragment(self):
+        self.get_user(self.ford)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ford.last_name = 'Hopkins'
+            self.ford.save()
+
+        self.assertEqual(self.get_user(self.ford)['name']['familyName'], 'Hopkins')
+        self.assertEqual(self.to_dict_mock.call_count, 2)
+
+    def test_membership_change_invalidates_fragments_of_members(self):
+        abernathy = get_user_model().objects.create(username='dabernathy')
+        group = get_group_model().objects.create(name='Hosts')
+        self.get_user(self.ford)
+        self.get_user(abernathy)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            group.user_set.add(self.ford)
+
+        self.assertEqual([g['display'] for g in self.get_user(self.ford)['groups']], ['Hosts'])
+        self.assertEqual(self.get_user(abernathy)['groups'], [])
+        # Only ford was serialized again.
+        self.assertEqual(self.to_dict_mock.call_count, 3)
+
+    def test_clear_invalidates_fragments_of_related_type(self):
+        group = get_group_model().objects.create(name='Hosts')
+        group.user_set.add(self.ford)
+        self.assertEqual(len(self.get_user(self.ford)['groups']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            group.user_set.clear()
+
+        self.assertEqual(self.get_user(self.ford)['groups'], [])
+
+    def test_related_save_invalidates_fragments(self):
+        group = get_group_model().objects.create(name='Hosts')
+        group.user_set.add(self.ford)
+        self.get_user(self.ford)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            group.name = 'Guests'
+            group.save()
+
+        self.assertEqual([g['display'] for g in self.get_user(self.ford)['groups']], ['Guests'])
+
+    def test_version_field_is_part_of_key(self):
+        self.get_user(self.ford)
+
+        # Updates bypassing signals are picked up through the version field.
+        get_user_model().objects.filter(pk=self.ford.pk).update(last_name='Hopkins', last_login=timezone.now())
+        self.assertEqual(self.get_user(self.ford)['name']['familyName'], 'Ford')
+
+        with mock.patch.object(SCIMUser, 'version_field', 'last_login'):
+            self.assertEqual(self.get_user(self.ford)['name']['familyName'], 'Hopkins')
+
+        get_user_model().objects.filter(pk=self.ford.pk).update(last_name='Hale', scim_version=F('scim_version') + 1)
+        self.assertEqual(self.get_user(self.ford)['name']['familyName'], 'Hale')
+
+    def test_render_of_stale_object_is_not_served(self):
+        stale = get_user_model().objects.get(pk=self.ford.pk)
+
+        # A write commits after the object was loaded, before its fragment
+        # generation is read.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ford.last_name = 'Hopkins'
+            self.ford.save()
+        request = RequestFactory().get('/')
+        cache.get_fragments([SCIMUser(stale, request=request)], lambda scim_objs: [
+            json.dumps(scim_obj.to_dict()) for scim_obj in scim_objs
+        ])
+
+        self.assertEqual(self.get_user(self.ford)['name']['familyName'], 'Hopkins')
+
+    def test_disabled(self):
+        with override_settings(SCIM_SERVICE_PROVIDER=dict(FRAGMENT_SETTINGS, FRAGMENT_CACHE_TIMEOUT=None)):
+            self.get_user(self.ford)
+            self.get_user(self.ford)
+
+        self.assertEqual(self.to_dict_mock.call_count, 2)
+
+
+NEGATIVE_SETTINGS = dict(settings.SCIM_SERVICE_PROVIDER, NEGATIVE_CACHE_TIMEOUT=5)
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser', SCIM_SERVICE_PROVIDER=NEGATIVE_SETTINGS)
+class NegativeCacheTestCase(LoginMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.get_cache().clear()
+        self.addCleanup(cache.get_cache().clear)
+        self.ford = get_user_model().objects.create(username='rford', first_name='Robert', last_name='Ford')
+
+    def count_user_queries(self, method, *args, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            resp = method(*args, **kwargs)
+        return resp, sum(1 for q in queries if 'django_scim_testuser"' in q['sql'] and 'session' not in q['sql'])
+
+    def search(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse('scim:users'), {'filter': query})
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        searched = any('SELECT DISTINCT' in q['sql'] for q in queries)
+        return json.loads(resp.content.decode())['totalResults'], searched
+
+    def test_missing_resource_is_remembered(self):
+        url = reverse('scim:users', kwargs={'uuid': '9999'})
+        resp, user_queries = self.count_user_queries(self.client.get, url)
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(user_queries, 2)
+
+        resp, user_queries = self.count_user_queries(self.client.get, url)
+        self.assertEqual(resp.status_code, 404)
+        # Only the user logged in by the session was loaded.
+        self.assertEqual(user_queries, 1)
+
+    def test_save_forgets_missing_id(self):
+        key = cache.get_negative_key(SCIMUser, None, 'id', self.ford.scim_id)
+        cache.remember_missing(key)
+        url = reverse('scim:users', kwargs={'uuid': self.ford.scim_id})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SCIMUser(self.ford, request=RequestFactory().get('/')).save()
+
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_empty_equality_filter_is_remembered(self):
+        self.assertEqual(self.search('userName eq "dabernathy"'), (0, True))
+        self.assertEqual(self.search('username EQ "DAbernathy"'), (0, False))
+
+        body = json.dumps({
+            'schemas': [constants.SchemaURI.USER],
+            'userName': 'dabernathy',
+            'name': {'givenName': 'Dolores', 'familyName': 'Abernathy'},
+        })
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(reverse('scim:users'), body, content_type=constants.SCIM_CONTENT_TYPE)
+        self.assertEqual(resp.status_code, 201, resp.content.decode())
+
+        self.assertEqual(self.search('userName eq "dabernathy"')[0], 1)
+
+    def test_case_exact_attributes(self):
+        def key(attr, value):
+            return cache.get_negative_key(SCIMUser, None, attr, value)
+
+        self.assertEqual(key('userName', 'ABC'), key('username', 'abc'))
+        self.assertNotEqual(key('externalId', 'ABC'), key('externalId', 'abc'))
+        self.assertIsNone(key('name.familyName', 'abc'))
+
+    def test_other_filters_are_not_remembered(self):
+        self.assertEqual(self.search('name.familyName eq "Abernathy"'), (0, True))
+        self.assertEqual(self.search('name.familyName eq "Abernathy"'), (0, True))
+        self.assertEqual(self.search('userName eq "x" or userName eq "y"'), (0, True))
+        self.assertEqual(self.search('userName eq "x" or userName eq "y"'), (0, True))
+
+    def test_matches_are_not_remembered(self):
+        self.assertEqual(self.search('userName eq "rford"'), (1, True))
+        self.assertEqual(self.search('userName eq "rford"'), (1, True))
+
+    def test_unmapped_filter_does_not_hide_resource(self):
+        # "id" is not mapped by the filter parser: the filter matches
+        # nothing, whether the user exists or not.
+        self.assertEqual(self.search(f'id eq "{self.ford.scim_id}"')[0], 0)
+
+        url = reverse('scim:users', kwargs={'uuid': self.ford.scim_id})
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_lookups_and_filters_are_remembered_apart(self):
+        self.assertNotEqual(
+            cache.get_negative_key(SCIMUser, None, 'id', 'abc'),
+            cache.get_negative_key(SCIMUser, None, 'id', 'abc', kind='filter'),
+        )
+
+    def test_create_during_lookup_is_not_hidden(self):
+        # The key is computed before the lookup and the miss stored after
+        # the commit of a concurrent create.
+        key = cache.get_negative_key(SCIMUser, None, 'userName', 'dabernathy', kind='filter')
+        with self.captureOnCommitCallbacks(execute=True):
+            get_user_model().objects.create(username='dabernathy')
+        cache.remember_missing(key)
+
+        self.assertEqual(self.search('userName eq "dabernathy"'), (1, True))
+
+    def test_orm_create_forgets_missing(self):
+        self.assertEqual(self.search('userName eq "dabernathy"'), (0, True))
+        with self.captureOnCommitCallbacks(execute=True):
+            get_user_model().objects.create(username='dabernathy')
+
+        self.assertEqual(self.search('userName eq "dabernathy"'), (1, True))
+
+    def test_disabled(self):
+        with override_settings(SCIM_SERVICE_PROVIDER=dict(NEGATIVE_SETTINGS, NEGATIVE_CACHE_TIMEOUT=None)):
+            self.assertEqual(self.search('userName eq "dabernathy"'), (0, True))
+            self.assertEqual(self.search('userName eq "dabernathy"'), (0, True))
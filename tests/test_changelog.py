@@ -0,0 +1,214 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from django_scim import changelog
+from django_scim.utils import get_user_model
+
+from tests import models
+from tests.filters import UserFilterQuery
+from tests.models import get_group_model
+from tests.test_views import LoginMixin
+
+CHANGE_LOG_SETTINGS = dict(
+    settings.SCIM_SERVICE_PROVIDER,
+    CHANGE_LOG_MODEL='tests.models.TestSCIMChange',
+    CHANGE_LOG_SETTLE_SECONDS=0,
+    GROUP_MODEL='tests.models.TestGroup',
+)
+TENANT_SETTINGS = dict(CHANGE_LOG_SETTINGS, TENANT_GETTER='tests.test_cache.tenant_getter')
+SETTLE_SETTINGS = dict(CHANGE_LOG_SETTINGS, CHANGE_LOG_SETTLE_SECONDS=60)
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser')
+class LastModifiedTestCase(LoginMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ford = get_user_model().objects.create(username='rford', first_name='Robert', last_name='Ford')
+
+    def test_save_updates_last_modified(self):
+        created = self.ford.scim_last_modified
+        self.assertIsNotNone(created)
+
+        self.ford.last_name = 'Hopkins'
+        self.ford.save()
+        self.assertGreater(self.ford.scim_last_modified, created)
+
+    def test_save_of_other_fields_keeps_last_modified(self):
+        created = self.ford.scim_last_modified
+
+        self.ford.last_login = timezone.now()
+        self.ford.save(update_fields=['last_login'])
+        self.ford.refresh_from_db()
+        self.assertEqual(self.ford.scim_last_modified, created)
+
+    def test_filter_on_last_modified(self):
+        since = timezone.now()
+        get_user_model().objects.filter(pk=self.ford.pk).update(scim_last_modified=since + timedelta(seconds=1))
+        watermark = since.isoformat().replace('+00:00', 'Z')
+
+        resp = self.client.get(reverse('scim:users'), {'filter': f'meta.lastModified gt "{watermark}"'})
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        result = json.loads(resp.content.decode())
+        self.assertEqual([r['userName'] for r in result['Resources']], ['rford'])
+        self.assertEqual(
+            result['Resources'][0]['meta']['lastModified'],
+            (since + timedelta(seconds=1)).isoformat(),
+        )
+
+    def test_filter_values_are_converted_to_date_times(self):
+        qs = UserFilterQuery.search('meta.lastModified ge "2024-05-01T12:00:00+02:00"')
+        self.assertEqual(qs.params, ['2024-05-01 10:00:00'])
+
+        with self.assertRaises(ValueError):
+            UserFilterQuery.search('meta.lastModified ge "yesterday"')
+
+    def test_invalid_date_time_filter(self):
+        resp = self.client.get(reverse('scim:users'), {'filter': 'meta.lastModified gt "yesterday"'})
+        self.assertEqual(resp.status_code, 400, resp.content.decode())
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser', SCIM_SERVICE_PROVIDER=CHANGE_LOG_SETTINGS)
+class ChangeLogTestCase(LoginMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ford = get_user_model().objects.create(username='rford', first_name='Robert', last_name='Ford')
+        self.group = get_group_model().objects.create(name='Hosts')
+
+    def get_changes(self, since=0):
+        return [
+            (c.resource_type, c.object_id, c.action)
+            for c in changelog.get_changes(since)
+        ]
+
+    def test_changes_are_recorded(self):
+        ford_pk = str(self.ford.pk)
+        self.ford.save()
+        self.group.user_set.add(self.ford)
+        scim_id = self.ford.scim_id
+        self.ford.delete()
+
+        self.assertEqual(self.get_changes(), [
+            ('User', str(self.user.pk), 'create'),
+            ('User', ford_pk, 'create'),
+            ('Group', str(self.group.pk), 'create'),
+            ('User', ford_pk, 'update'),
+            ('Group', str(self.group.pk), 'update'),
+            ('User', ford_pk, 'update'),
+            ('Group', str(self.group.pk), 'update'),
+            ('User', ford_pk, 'delete'),
+        ])
+        self.assertEqual(models.TestSCIMChange.objects.last().scim_id, scim_id)
+
+    def test_clear_records_updates_of_both_sides(self):
+        self.group.user_set.add(self.ford)
+        since = models.TestSCIMChange.objects.last().id
+
+        self.group.user_set.clear()
+
+        self.assertEqual(self.get_changes(since), [
+            ('Group', str(self.group.pk), 'update'),
+            ('User', str(self.ford.pk), 'update'),
+        ])
+
+    def test_collapse(self):
+        self.ford.save()
+        self.group.save()
+        self.ford.save()
+
+        collapsed = changelog.collapse(changelog.get_changes())
+        self.assertEqual(
+            [(c.resource_type, c.object_id) for c in collapsed],
+            [('User', str(self.user.pk)), ('Group', str(self.group.pk)), ('User', str(self.ford.pk))],
+        )
+
+    def test_changes_view(self):
+        abernathy = get_user_model().objects.create(username='dabernathy')
+        abernathy_id = abernathy.scim_id
+        abernathy.delete()
+        since = models.TestSCIMChange.objects.filter(resource_type='Group').get().id
+
+        resp = self.client.get(reverse('scim:changes'), {'since': since})
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        result = json.loads(resp.content.decode())
+
+        self.assertEqual(result['watermark'], models.TestSCIMChange.objects.last().id)
+        self.assertEqual(result['totalResults'], 1)
+        tombstone, = result['Resources']
+        self.assertEqual(tombstone['id'], abernathy_id)
+        self.assertEqual(tombstone['meta']['resourceType'], 'User')
+        self.assertTrue(tombstone['meta']['deleted'])
+
+        resp = self.client.get(reverse('scim:changes'), {'since': result['watermark']})
+        result = json.loads(resp.content.decode())
+        self.assertEqual(result['Resources'], [])
+        self.assertEqual(result['watermark'], models.TestSCIMChange.objects.last().id)
+
+    def test_changes_view_lists_current_documents(self):
+        resp = self.client.get(reverse('scim:changes'), {'resourceType': 'User', 'count': 10})
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        result = json.loads(resp.content.decode())
+
+        self.assertEqual([r['userName'] for r in result['Resources']], ['superuser', 'rford'])
+        self.assertEqual(result['Resources'][1]['id'], self.ford.scim_id)
+
+    def test_changes_view_invalid_watermark(self):
+        resp = self.client.get(reverse('scim:changes'), {'since': 'yesterday'})
+        self.assertEqual(resp.status_code, 400, resp.content.decode())
+
+    def test_changes_view_disabled(self):
+        with override_settings(SCIM_SERVICE_PROVIDER=dict(CHANGE_LOG_SETTINGS, CHANGE_LOG_MODEL=None)):
+            resp = self.client.get(reverse('scim:changes'))
+        self.assertEqual(resp.status_code, 501)
+
+    def get_tombstones(self, tenant):
+        resp = self.client.get(reverse('scim:changes'), {'resourceType': 'User'}, HTTP_X_TENANT=tenant)
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        return [r['id'] for r in json.loads(resp.content.decode())['Resources'] if r['meta'].get('deleted')]
+
+    @override_settings(SCIM_SERVICE_PROVIDER=TENANT_SETTINGS)
+    def test_tombstones_are_scoped_by_tenant(self):
+        abernathy = get_user_model().objects.create(username='dabernathy')
+        url = reverse('scim:users', kwargs={'uuid': abernathy.scim_id})
+        resp = self.client.delete(url, HTTP_X_TENANT='delos')
+        self.assertEqual(resp.status_code, 204, resp.content.decode())
+        self.assertEqual(models.TestSCIMChange.objects.last().tenant, 'delos')
+
+        self.assertEqual(self.get_tombstones('delos'), [abernathy.scim_id])
+        self.assertEqual(self.get_tombstones('mesa'), [])
+
+    @override_settings(SCIM_SERVICE_PROVIDER=TENANT_SETTINGS)
+    def test_deletes_outside_requests(self):
+        stubbs, flood = [get_user_model().objects.create(username=username) for username in ('bstubbs', 'tflood')]
+        stubbs_id = stubbs.scim_id
+        stubbs.delete()
+        with changelog.recording_tenant('delos'):
+            flood.delete()
+
+        self.assertEqual(self.get_tombstones('delos'), [flood.scim_id])
+        self.assertEqual(self.get_tombstones('mesa'), [])
+        self.assertEqual(self.get_tombstones(None), [stubbs_id, flood.scim_id])
+
+    @override_settings(SCIM_SERVICE_PROVIDER=SETTLE_SETTINGS)
+    def test_recent_changes_are_held_back(self):
+        since = models.TestSCIMChange.objects.last().id
+        abernathy = get_user_model().objects.create(username='dabernathy')
+        stubbs = get_user_model().objects.create(username='bstubbs')
+        self.assertEqual(changelog.get_changes(since), [])
+
+        # A change settled after a more recent one is not skipped.
+        old = timezone.now() - timedelta(minutes=5)
+        models.TestSCIMChange.objects.filter(object_id=str(stubbs.pk)).update(timestamp=old)
+        self.assertEqual(changelog.get_changes(since), [])
+
+        models.TestSCIMChange.objects.filter(object_id=str(abernathy.pk)).update(timestamp=old)
+        self.assertEqual(
+            [c.object_id for c in changelog.get_changes(since)],
+            [str(abernathy.pk), str(stubbs.pk)],
+        )
@@ -0,0 +1,221 @@
+import json
+from unittest import mock
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from django_scim import constants, exceptions
+from django_scim.adapters import SCIMUser
+from django_scim.utils import get_user_model
+from tests.test_views import LoginMixin
+
+NO_RETRY_SETTINGS = dict(settings.SCIM_SERVICE_PROVIDER, VERSION_CONFLICT_RETRIES=0)
+
+
+def replace_last_name(last_name):
+    return json.dumps({
+        'schemas': [constants.SchemaURI.PATCH_OP],
+        'Operations': [
+            {
+                'op': 'replace',
+                'path': 'name.familyName',
+                'value': last_name,
+            },
+        ],
+    })
+
+
+def make_stale(scim_obj):
+    """
+    Make the object of ``scim_obj`` look like it was loaded before a
+    concurrent write changed it.
+    """
+    scim_obj.obj.scim_version -= 1
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser')
+class VersionTestCase(LoginMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ford = get_user_model().objects.create(username='rford', first_name='Robert', last_name='Ford')
+        self.url = reverse('scim:users', kwargs={'uuid': self.ford.scim_id})
+
+    def test_save_increments_version(self):
+        self.assertEqual(self.ford.scim_version, 1)
+        self.ford.save()
+        self.ford.refresh_from_db()
+        self.assertEqual(self.ford.scim_version, 2)
+
+    def test_save_of_stale_instance(self):
+        # Saves outside of SCIM writes keep the behavior of Django: the
+        # last save wins, and the version still moves forward.
+        stale = get_user_model().objects.get(pk=self.ford.pk)
+        self.ford.save()
+
+        stale.last_name = 'Hopkins'
+        stale.save()
+        self.assertEqual(stale.scim_version, 3)
+
+        self.ford.refresh_from_db()
+        self.assertEqual(self.ford.last_name, 'Hopkins')
+
+    def test_save_of_some_fields(self):
+        last_modified = self.ford.scim_last_modified
+        self.ford.last_name = 'Hopkins'
+        self.ford.save(update_fields=['last_name'])
+        self.ford.refresh_from_db()
+        self.assertEqual(self.ford.scim_version, 2)
+        self.assertGreater(self.ford.scim_last_modified, last_modified)
+
+        # Saves of untracked fields only are not changes of the resource.
+        self.ford.last_login = timezone.now()
+        self.ford.save(update_fields=['last_login'])
+        self.ford.refresh_from_db()
+        self.assertEqual(self.ford.scim_version, 2)
+
+    def test_failed_save_keeps_version(self):
+        with mock.patch.object(Model, 'save', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.ford.save()
+        self.assertEqual(self.ford.scim_version, 1)
+
+        stale = SCIMUser(get_user_model().objects.get(pk=self.ford.pk))
+        with mock.patch.object(Model, 'save', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                stale.obj.save(check_scim_version=True)
+        self.assertEqual(stale.obj.scim_version, 1)
+
+    def test_adapter_save_of_stale_instance_fails(self):
+        stale = SCIMUser(get_user_model().objects.get(pk=self.ford.pk))
+        self.ford.save()
+
+        stale.obj.last_name = 'Hopkins'
+        with self.assertRaises(exceptions.VersionConflictError):
+            stale.save()
+
+        self.ford.refresh_from_db()
+        self.assertEqual(self.ford.last_name, 'Ford')
+
+    def test_create_with_primary_key(self):
+        user = get_user_model().objects.create(id=999, username='dabernathy')
+        self.assertEqual(user.scim_version, 1)
+        self.assertEqual(user.scim_id, '999')
+
+    def test_get_returns_etag(self):
+        self.ford.save()
+
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        self.assertEqual(resp['ETag'], 'W/"2"')
+        self.assertEqual(json.loads(resp.content.decode())['meta']['version'], 'W/"2"')
+
+    def test_patch_with_matching_if_match(self):
+        resp = self.client.patch(
+            self.url,
+            data=replace_last_name('Hopkins'),
+            content_type=constants.SCIM_CONTENT_TYPE,
+            HTTP_IF_MATCH='W/"1"',
+        )
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        self.assertEqual(resp['ETag'], 'W/"2"')
+
+    def test_patch_with_stale_if_match(self):
+        self.ford.save()
+
+        resp = self.client.patch(
+            self.url,
+            data=replace_last_name('Hopkins'),
+            content_type=constants.SCIM_CONTENT_TYPE,
+            HTTP_IF_MATCH='W/"1"',
+        )
+        self.assertEqual(resp.status_code, 412, resp.content.decode())
+        self.ford.refresh_from_db()
+        self.assertEqual(self.ford.last_name, 'Ford')
+
+    def test_patch_conflicting_with_if_match_is_not_retried(self):
+        handle_operations = SCIMUser.handle_operations
+
+        def conflicting_handle_operations(scim_obj, operations):
+            make_stale(scim_obj)
+            handle_operations(scim_obj, operations)
+
+        with mock.patch.object(SCIMUser, 'handle_operations', conflicting_handle_operations):
+            resp = self.client.patch(
+                self.url,
+                data=replace_last_name('Hopkins'),
+                content_type=constants.SCIM_CONTENT_TYPE,
+                HTTP_IF_MATCH='W/"1"',
+            )
+        self.assertEqual(resp.status_code, 412, resp.content.decode())
+
+    def test_patch_conflict_is_retried(self):
+        handle_operations = SCIMUser.handle_operations
+        calls = []
+
+        def conflicting_handle_operations(scim_obj, operations):
+            calls.append(scim_obj.obj.scim_version)
+            if len(calls) == 1:
+                make_stale(scim_obj)
+            handle_operations(scim_obj, operations)
+
+        with mock.patch.object(SCIMUser, 'handle_operations', conflicting_handle_operations):
+            resp = self.client.patch(
+                self.url,
+                data=replace_last_name('Hopkins'),
+                content_type=constants.SCIM_CONTENT_TYPE,
+            )
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+
+        # The object was loaded again for the second attempt.
+        self.assertEqual(calls, [1, 1])
+        self.ford.refresh_from_db()
+        self.assertEqual(self.ford.last_name, 'Hopkins')
+        self.assertEqual(resp['ETag'], f'W/"{self.ford.scim_version}"')
+
+    @override_settings(SCIM_SERVICE_PROVIDER=NO_RETRY_SETTINGS)
+    def test_patch_conflict_without_retries_left(self):
+        handle_operations = SCIMUser.handle_operations
+
+        def conflicting_handle_operations(scim_obj, operations):
+            make_stale(scim_obj)
+            handle_operations(scim_obj, operations)
+
+        with mock.patch.object(SCIMUser, 'handle_operations', conflicting_handle_operations):
+            resp = self.client.patch(
+                self.url,
+                data=replace_last_name('Hopkins'),
+                content_type=constants.SCIM_CONTENT_TYPE,
+            )
+        self.assertEqual(resp.status_code, 409, resp.content.decode())
+        self.ford.refresh_from_db()
+        self.assertEqual(self.ford.last_name, 'Ford')
+
+    def test_put_with_stale_if_match(self):
+        self.ford.save()
+        data = {
+            'schemas': [constants.SchemaURI.USER],
+            'userName': 'rford',
+            'name': {'givenName': 'Robert', 'familyName': 'Hopkins'},
+        }
+
+        resp = self.client.put(
+            self.url,
+            data=json.dumps(data),
+            content_type=constants.SCIM_CONTENT_TYPE,
+            HTTP_IF_MATCH='W/"1"',
+        )
+        self.assertEqual(resp.status_code, 412, resp.content.decode())
+
+        resp = self.client.put(
+            self.url,
+            data=json.dumps(data),
+            content_type=constants.SCIM_CONTENT_TYPE,
+            HTTP_IF_MATCH='W/"2"',
+        )
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        self.assertEqual(resp['ETag'], 'W/"3"')
@@ -0,0 +1,184 @@
+import json
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import update_last_login
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from django_scim import constants, documents
+from django_scim.adapters import SCIMGroup, SCIMUser
+from django_scim.utils import get_user_model
+
+from tests import models
+from tests.models import get_group_model
+from tests.test_views import LoginMixin
+
+DOCUMENT_SETTINGS = dict(
+    settings.SCIM_SERVICE_PROVIDER,
+    DOCUMENT_MODEL='tests.models.TestSCIMDocument',
+    GROUP_MODEL='tests.models.TestGroup',
+)
+
+
+def get_document(obj, resource_type='User'):
+    return models.TestSCIMDocument.objects.filter(resource_type=resource_type, object_id=str(obj.pk)).first()
+
+
+class LocalizeTestCase(TestCase):
+
+    def test_localize(self):
+        document = json.dumps({'location': documents.PLACEHOLDER_LOCATION + '/scim/v2/Users/1'})
+
+        self.assertEqual(
+            json.loads(documents.localize(document, 'https://example.com/tenant/'))['location'],
+            'https://example.com/scim/v2/Users/1',
+        )
+        self.assertEqual(
+            json.loads(documents.localize(document, 'http://localhost:8000'))['location'],
+            'http://localhost:8000/scim/v2/Users/1',
+        )
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser', SCIM_SERVICE_PROVIDER=DOCUMENT_SETTINGS)
+class DocumentStoreTestCase(LoginMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ford = get_user_model().objects.create(username='rford', first_name='Robert', last_name='Ford')
+        self.group = get_group_model().objects.create(name='Hosts')
+        self.to_dict = mock.patch.object(SCIMUser, 'to_dict', autospec=True, side_effect=SCIMUser.to_dict)
+        self.to_dict_mock = self.to_dict.start()
+        self.addCleanup(self.to_dict.stop)
+
+    def get_user(self, user):
+        resp = self.client.get(reverse('scim:users', kwargs={'uuid': user.scim_id}))
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        return json.loads(resp.content.decode())
+
+    def test_get_single_is_served_from_store(self):
+        first = self.get_user(self.ford)
+        self.assertEqual(json.loads(get_document(self.ford).document)['userName'], 'rford')
+
+        second = self.get_user(self.ford)
+
+        self.assertEqual(first, second)
+        self.assertEqual(second['meta']['location'], f'https://localhost/scim/v2/Users/{self.ford.scim_id}')
+        self.assertEqual(self.to_dict_mock.call_count, 1)
+
+        with override_settings(SCIM_SERVICE_PROVIDER=dict(DOCUMENT_SETTINGS, DOCUMENT_MODEL=None)):
+            self.assertEqual(self.get_user(self.ford), second)
+
+    def test_list_is_served_from_store(self):
+        url = reverse('scim:users')
+        first = json.loads(self.client.get(url).content.decode())
+
+        with self.assertNumQueries(5):
+            # Session, logged in user, count, page and documents.
+            second = json.loads(self.client.get(url).content.decode())
+
+        self.assertEqual(first, second)
+        self.assertEqual(second['totalResults'], 2)
+        self.assertEqual(self.to_dict_mock.call_count, 2)
+
+    def test_save_outside_adapter_clears_document(self):
+        self.get_user(self.ford)
+
+        self.ford.last_name = 'Hopkins'
+        self.ford.save()
+        self.assertIsNone(get_document(self.ford).document)
+
+        self.assertEqual(self.get_user(self.ford)['name']['familyName'], 'Hopkins')
+        self.assertEqual(get_document(self.ford).version, 2)
+
+    def test_fill_keeps_concurrently_stored_document(self):
+        self.get_user(self.ford)
+        documents.clear('User', [self.ford.pk])
+        stale, = documents.render(SCIMUser, [self.ford])
+
+        scim_user = SCIMUser(self.ford, request=RequestFactory().get('/'))
+        scim_user.obj.last_name = 'Hopkins'
+        scim_user.save()
+
+        documents.fill_document('User', self.ford.pk, stale, exists=True)
+        documents.fill_document('User', self.ford.pk, stale, exists=False)
+        self.assertEqual(json.loads(get_document(self.ford).document)['name']['familyName'], 'Hopkins')
+
+    def test_save_of_unrendered_fields_keeps_documents(self):
+        self.group.user_set.add(self.ford)
+        self.get_user(self.ford)
+        documents.refresh(SCIMGroup(self.group, request=RequestFactory().get('/')))
+
+        with CaptureQueriesContext(connection) as queries:
+            update_last_login(None, self.ford)
+        document_table = models.TestSCIMDocument._meta.db_table
+        self.assertEqual([q['sql'] for q in queries.captured_queries if document_table in q['sql']], [])
+        self.assertIsNotNone(get_document(self.ford).document)
+        self.assertIsNotNone(get_document(self.group, 'Group').document)
+
+        self.ford.last_name = 'Hopkins'
+        self.ford.save(update_fields=['last_name'])
+        self.assertIsNone(get_document(self.ford).document)
+
+    def test_adapter_save_refreshes_document(self):
+        self.get_user(self.ford)
+
+        scim_user = SCIMUser(self.ford, request=RequestFactory().get('/'))
+        scim_user.obj.last_name = 'Hopkins'
+        scim_user.save()
+
+        document = get_document(self.ford)
+        self.assertEqual(json.loads(document.document)['name']['familyName'], 'Hopkins')
+        self.assertEqual(document.version, 2)
+
+    def test_membership_change_clears_documents(self):
+        self.get_user(self.ford)
+        documents.refresh(SCIMGroup(self.group, request=RequestFactory().get('/')))
+
+        self.group.user_set.add(self.ford)
+
+        self.assertIsNone(get_document(self.ford).document)
+        self.assertIsNone(get_document(self.group, 'Group').document)
+        self.assertEqual([g['display'] for g in self.get_user(self.ford)['groups']], ['Hosts'])
+
+    def test_related_save_clears_documents(self):
+        self.group.user_set.add(self.ford)
+        self.get_user(self.ford)
+
+        self.group.name = 'Guests'
+        self.group.save()
+
+        self.assertEqual([g['display'] for g in self.get_user(self.ford)['groups']], ['Guests'])
+
+    def test_delete(self):
+        self.group.user_set.add(self.ford)
+        self.get_user(self.ford)
+
+        SCIMGroup(self.group, request=RequestFactory().get('/')).delete()
+
+        self.assertIsNone(get_document(self.ford).document)
+        self.assertEqual(self.get_user(self.ford)['groups'], [])
+
+        SCIMUser(self.ford, request=RequestFactory().get('/')).delete()
+        self.assertIsNone(get_document(self.ford))
+
+    def test_patch_refreshes_document_once(self):
+        abernathy = get_user_model().objects.create(username='dabernathy')
+        url = reverse('scim:groups', kwargs={'uuid': self.group.scim_id})
+        body = json.dumps({
+            'schemas': [constants.SchemaURI.PATCH_OP],
+            'Operations': [
+                {'op': 'add', 'path': 'members', 'value': [{'value': self.ford.id}]},
+                {'op': 'add', 'path': 'members', 'value': [{'value': abernathy.id}]},
+            ],
+        })
+        with mock.patch('django_scim.views.GroupsView.model_cls_getter', get_group_model):
+            resp = self.client.patch(url, body, content_type=constants.SCIM_CONTENT_TYPE)
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+
+        document = get_document(self.group, 'Group')
+        self.assertEqual(document.version, 1)
+        stored = json.loads(documents.localize(document.document, 'https://localhost'))
+        self.assertEqual(stored, json.loads(resp.content.decode()))
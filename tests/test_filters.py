@@ -1,6 +1,7 @@
 from django.test import TestCase
 
 from tests.filters import UserFilterQuery
+from django_scim.filters import normalize_filter
 from django_scim.utils import get_user_model
 
 
@@ -25,3 +26,74 @@ class Users(TestCase):
         qs = list(self.parser.search(query))
         expected = [self.ford]
         self.assertEqual(qs, expected)
+
+    def test_explain(self):
+        qs = self.parser.search('userName eq "rford"')
+        plan = self.parser.explain(qs)
+        self.assertIn(get_user_model()._meta.db_table, plan)
+
+
+class NormalizeFilterTestCase(TestCase):
+
+    def test_normalize_filter(self):
+        self.assertEqual(
+            normalize_filter('name.familyName co "Hol \\"x\\"" or  userName sw "e" and active eq true'),
+            'name.familyName co ? or userName sw ? and active eq ?',
+        )
+        self.assertEqual(
+            normalize_filter('meta.lastModified gt "2011-05-13T04:42:34Z" and x eq 42'),
+            'meta.lastModified gt ? and x eq ?',
+        )
+
+
+class CaseInsensitiveAttributesTestCase(TestCase):
+    parser = UserFilterQuery
+
+    def setUp(self):
+        self.ford = get_user_model().objects.create(
+            first_name='Robert',
+            last_name='Ford',
+            username='rford',
+        )
+
+    def test_case_insensitive_attr_paths(self):
+        self.assertEqual(
+            self.parser.case_insensitive_attr_paths(),
+            {
+                ('userName', None, None),
+                ('name', 'familyName', None),
+                # Mapped to the same column as name.familyName
+                ('familyName', None, None),
+                ('name', 'givenName', None),
+                ('givenName', None, None),
+            },
+        )
+
+    def test_case_exact_false_attributes_ignore_case(self):
+        for query in (
+            'userName eq "RFORD"',
+            'name.familyName eq "FORD"',
+            'familyName eq "ford"',
+            'givenName sw "rob"',
+            'name.familyName co "OR"',
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(list(self.parser.search(query)), [self.ford])
+
+    def test_sql_upper_cases_column_and_value(self):
+        q = self.parser.query_class(
+            'familyName eq "Ford" and active eq true',
+            'users',
+            self.parser.attr_map,
+            case_insensitive_attr_paths=self.parser.case_insensitive_attr_paths(),
+        )
+        self.assertIn('(UPPER(last_name) = UPPER(%s)) AND (is_active = %s)', q.sql)
+        self.assertEqual(q.params, ['Ford', 'TRUE'])
+
+    def test_parser_without_schema_only_ignores_username_case(self):
+        class Parser(UserFilterQuery):
+            schema_uris = ()
+
+        self.assertEqual(Parser.case_insensitive_attr_paths(), {('userName', None, None)})
+        self.assertEqual(list(Parser.search('userName eq "RFORD"')), [self.ford])
+        self.assertEqual(list(Parser.search('familyName eq "FORD"')), [])
@@ -0,0 +1,96 @@
+import io
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from django_scim import index_advisor
+from django_scim.management.commands.scim_index_advisor import Command
+
+from tests.filters import UserFilterQuery
+from tests import models
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser')
+class IndexAdvisorTestCase(TestCase):
+
+    def get_advice(self):
+        return {
+            (item.column, item.operator_class): item
+            for item in index_advisor.advise(parsers=[UserFilterQuery])
+        }
+
+    def test_advise(self):
+        advice = self.get_advice()
+
+        username = advice[('username', index_advisor.EQUALITY)]
+        self.assertTrue(username.case_insensitive)
+        self.assertTrue(username.missing)
+        self.assertEqual(username.attrs, ['userName'])
+
+        last_name = advice[('last_name', index_advisor.EQUALITY)]
+        self.assertTrue(last_name.case_insensitive)
+        self.assertTrue(last_name.missing)
+        self.assertEqual(last_name.attrs, ['name.familyName', 'familyName'])
+
+        is_active = advice[('is_active', index_advisor.EQUALITY)]
+        self.assertFalse(is_active.case_insensitive)
+        self.assertTrue(is_active.missing)
+
+        # SQLite has no index type for LIKE '%...%'
+        pattern = advice[('last_name', index_advisor.PATTERN)]
+        self.assertFalse(pattern.missing)
+        self.assertIn('no index type on sqlite', pattern.describe())
+
+    def test_existing_indexes(self):
+        table = models.TestUser._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE INDEX "upper_username" ON "{table}" (UPPER("username"))')
+            cursor.execute(f'CREATE INDEX "last_name" ON "{table}" ("last_name")')
+            cursor.execute(f'CREATE INDEX "is_active_last_name" ON "{table}" ("is_active", "last_name")')
+
+        advice = self.get_advice()
+        self.assertEqual(advice[('username', index_advisor.EQUALITY)].existing, 'upper_username')
+        self.assertEqual(advice[('is_active', index_advisor.EQUALITY)].existing, 'is_active_last_name')
+        # last_name is compared with UPPER(), which a plain index can not
+        # serve, and only the leading column of a multi-column index can be
+        # searched.
+        self.assertTrue(advice[('last_name', index_advisor.EQUALITY)].missing)
+
+    def test_unknown_column(self):
+        class Parser(UserFilterQuery):
+            attr_map = {('emails', 'value', None): 'emails.value'}
+
+        item, _ = index_advisor.advise(parsers=[Parser])
+        self.assertFalse(item.missing)
+        self.assertIn('skipped, not a column of', item.describe())
+
+    def test_command_emits_migration(self):
+        out = io.StringIO()
+        call_command('scim_index_advisor', emit_migration='django_scim', dry_run=True, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('django_scim.TestUser.UPPER(username) [userName] eq/ne/gt/ge/lt/le/pr: missing', output)
+        self.assertIn('4 missing index(es).', output)
+        self.assertIn('class Migration(migrations.Migration):', output)
+        self.assertIn('ON "django_scim_testuser" ((UPPER("username")));', output)
+        self.assertIn('DROP INDEX', output)
+
+        # The generated SQL creates indexes the advisor recognizes.
+        namespace = {}
+        exec(output[output.index('# Generated'):], namespace)
+        with connection.cursor() as cursor:
+            for operation in namespace['Migration'].operations:
+                cursor.execute(operation.sql)
+
+        out = io.StringIO()
+        call_command('scim_index_advisor', stdout=out)
+        self.assertIn('No missing indexes.', out.getvalue())
+
+    def test_migration_number(self):
+        command = Command()
+        self.assertEqual(command.get_migration_number([]), 1)
+        self.assertEqual(command.get_migration_number([('app', '0003_auto_20240501_1200')]), 4)
+        self.assertEqual(command.get_migration_number([('app', '0001_squashed_0004_auto')]), 5)
+        self.assertEqual(command.get_migration_number([('app', 'custom_name')]), 1)
+        self.assertEqual(command.get_migration_number([('app', 'custom_name'), ('app', '0002_users')]), 3)
@@ -0,0 +1,204 @@
+import json
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.signals import m2m_changed
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from django_scim import cache, constants
+from django_scim.utils import get_user_model
+from tests import models
+from tests.test_views import LoginMixin
+
+GROUP_SETTINGS = dict(settings.SCIM_SERVICE_PROVIDER, GROUP_MODEL='tests.models.TestGroup')
+LIMIT_SETTINGS = dict(GROUP_SETTINGS, GROUP_MEMBERS_INLINE_LIMIT=2)
+RECEIVER_SETTINGS = dict(
+    GROUP_SETTINGS,
+    DOCUMENT_MODEL='tests.models.TestSCIMDocument',
+    CHANGE_LOG_MODEL='tests.models.TestSCIMChange',
+    FRAGMENT_CACHE_TIMEOUT=60,
+)
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser', SCIM_SERVICE_PROVIDER=GROUP_SETTINGS)
+class MembersTestCase(LoginMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.behavior = models.TestGroup.objects.create(name='Behavior Group')
+        self.users = [
+            get_user_model().objects.create(username=username)
+            for username in ('rford', 'dabernathy', 'bstubbs')
+        ]
+        self.behavior.user_set.add(*self.users)
+
+    def get(self, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url, data)
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        through = models.TestUser.scim_groups.through._meta.db_table
+        member_queries = [q['sql'] for q in queries.captured_queries if through in q['sql']]
+        return json.loads(resp.content.decode()), member_queries
+
+    def test_all_members_inline_by_default(self):
+        result, _ = self.get(reverse('scim:groups', kwargs={'uuid': self.behavior.scim_id}))
+        self.assertEqual(len(result['members']), 3)
+
+    @override_settings(SCIM_SERVICE_PROVIDER=LIMIT_SETTINGS)
+    def test_inline_limit(self):
+        ids = [user.scim_id for user in self.users[:2]]
+
+        result, _ = self.get(reverse('scim:groups', kwargs={'uuid': self.behavior.scim_id}))
+        self.assertEqual([m['value'] for m in result['members']], ids)
+
+        models.TestGroup.objects.create(name='Security Group').user_set.add(*self.users)
+        result, member_queries = self.get(reverse('scim:groups'))
+        self.assertEqual([[m['value'] for m in r['members']] for r in result['Resources']], [ids, ids])
+        # The members of the page of groups are loaded in one query.
+        self.assertEqual(len(member_queries), 1)
+
+    def test_excluded_members(self):
+        url = reverse('scim:groups', kwargs={'uuid': self.behavior.scim_id})
+        result, member_queries = self.get(url, {'excludedAttributes': 'members'})
+        self.assertNotIn('members', result)
+        self.assertEqual(result['displayName'], 'Behavior Group')
+        self.assertEqual(member_queries, [])
+
+        result, member_queries = self.get(reverse('scim:groups'), {'excludedAttributes': 'members'})
+        self.assertNotIn('members', result['Resources'][0])
+        self.assertEqual(member_queries, [])
+
+    def test_member_pages(self):
+        url = reverse('scim:group-members', kwargs={'uuid': self.behavior.scim_id})
+
+        result, _ = self.get(url, {'startIndex': 2, 'count': 5})
+        self.assertEqual(result['totalResults'], 3)
+        self.assertEqual(result['startIndex'], 2)
+        self.assertEqual([m['value'] for m in result['Resources']], [u.scim_id for u in self.users[1:]])
+        self.assertEqual(result['Resources'][0]['display'], 'dabernathy')
+
+    def test_member_check(self):
+        url = reverse('scim:group-members', kwargs={'uuid': self.behavior.scim_id})
+
+        result, member_queries = self.get(url, {'filter': f'value eq "{self.users[1].scim_id}"'})
+        self.assertEqual(result['totalResults'], 1)
+        self.assertEqual(result['Resources'][0]['value'], self.users[1].scim_id)
+        self.assertEqual(len(member_queries), 1)
+
+        self.behavior.user_set.remove(self.users[1])
+        result, _ = self.get(url, {'filter': f'value eq "{self.users[1].scim_id}"'})
+        self.assertEqual(result['totalResults'], 0)
+        self.assertEqual(result['Resources'], [])
+
+    def test_member_filter_must_be_value_equality(self):
+        url = reverse('scim:group-members', kwargs={'uuid': self.behavior.scim_id})
+        resp = self.client.get(url, {'filter': 'display co "ford"'})
+        self.assertEqual(resp.status_code, 400, resp.content.decode())
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser', SCIM_SERVICE_PROVIDER=GROUP_SETTINGS)
+class FilteredRemoveTestCase(LoginMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.behavior = models.TestGroup.objects.create(name='Behavior Group')
+        self.users = [
+            get_user_model().objects.create(username=username)
+            for username in ('rford', 'dabernathy', 'bstubbs', 'tflood')
+        ]
+        self.behavior.user_set.add(*self.users)
+        self.url = reverse('scim:groups', kwargs={'uuid': self.behavior.scim_id})
+
+    def patch(self, *paths, status=200):
+        data = {
+            'schemas': [constants.SchemaURI.PATCH_OP],
+            'Operations': [{'op': 'remove', 'path': path} for path in paths],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.patch(self.url, data=json.dumps(data), content_type=constants.SCIM_CONTENT_TYPE)
+        self.assertEqual(resp.status_code, status, resp.content.decode())
+        through = models.TestUser.scim_groups.through._meta.db_table
+        return [q['sql'] for q in queries.captured_queries if q['sql'].startswith(f'DELETE FROM "{through}"')]
+
+    def members(self):
+        return set(self.behavior.user_set.values_list('username', flat=True))
+
+    def test_remove_one(self):
+        deletes = self.patch(f'members[value eq "{self.users[1].scim_id}"]')
+        self.assertEqual(len(deletes), 1)
+        self.assertEqual(self.members(), {'rford', 'bstubbs', 'tflood'})
+
+        self.behavior.refresh_from_db()
+        self.assertEqual(self.behavior.scim_version, 2)
+
+    def test_removes_are_batched(self):
+        deletes = self.patch(
+            f'members[value eq "{self.users[0].scim_id}"]',
+            f'members[value eq "{self.users[1].scim_id}" or value eq "{self.users[2].scim_id}"]',
+            'members[value eq "unknown"]',
+        )
+        self.assertEqual(len(deletes), 1)
+        self.assertEqual(self.members(), {'tflood'})
+
+    def test_order_of_operations_is_kept(self):
+        data = {
+            'schemas': [constants.SchemaURI.PATCH_OP],
+            'Operations': [
+                {'op': 'remove', 'path': f'members[value eq "{self.users[0].scim_id}"]'},
+                {'op': 'add', 'path': 'members', 'value': [{'value': self.users[0].scim_id}]},
+                {'op': 'remove', 'path': f'members[value eq "{self.users[1].scim_id}"]'},
+            ],
+        }
+        resp = self.client.patch(self.url, data=json.dumps(data), content_type=constants.SCIM_CONTENT_TYPE)
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        self.assertEqual(self.members(), {'rford', 'bstubbs', 'tflood'})
+
+    @override_settings(SCIM_SERVICE_PROVIDER=RECEIVER_SETTINGS)
+    def test_receivers_are_sent_removed_users(self):
+        self.addCleanup(cache.get_cache().clear)
+        pk_sets = []
+
+        def receiver(action, pk_set, **kwargs):
+            if action in ('pre_remove', 'post_remove'):
+                pk_sets.append((action, pk_set))
+
+        through = models.TestUser.scim_groups.through
+        m2m_changed.connect(receiver, sender=through)
+        self.addCleanup(m2m_changed.disconnect, receiver, sender=through)
+
+        self.patch(f'members[value eq "{self.users[1].scim_id}"]')
+        self.assertEqual(pk_sets, [('pre_remove', {self.users[1].pk}), ('post_remove', {self.users[1].pk})])
+        self.assertEqual(self.members(), {'rford', 'bstubbs', 'tflood'})
+
+    @override_settings(SCIM_SERVICE_PROVIDER=RECEIVER_SETTINGS)
+    def test_remove_with_package_receivers(self):
+        cache.get_cache().clear()
+        self.addCleanup(cache.get_cache().clear)
+        self.client.get(reverse('scim:users', kwargs={'uuid': self.users[1].scim_id}))
+        through = models.TestUser.scim_groups.through._meta.db_table
+
+        data = {
+            'schemas': [constants.SchemaURI.PATCH_OP],
+            'Operations': [{'op': 'remove', 'path': f'members[value eq "{self.users[1].scim_id}"]'}],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.patch(self.url, data=json.dumps(data), content_type=constants.SCIM_CONTENT_TYPE)
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        self.assertEqual(self.members(), {'rford', 'bstubbs', 'tflood'})
+
+        # The memberships are not loaded before their DELETE.
+        membership_queries = [q['sql'] for q in queries.captured_queries if f'"{through}"' in q['sql']]
+        self.assertTrue(membership_queries[0].startswith(f'DELETE FROM "{through}"'), membership_queries)
+        self.assertEqual(len([sql for sql in membership_queries if sql.startswith('DELETE')]), 1)
+
+        changes = models.TestSCIMChange.objects.filter(resource_type='User')
+        self.assertEqual(list(changes.values_list('object_id', flat=True)), [str(self.users[1].pk)])
+        document = models.TestSCIMDocument.objects.get(resource_type='User', object_id=str(self.users[1].pk))
+        self.assertIsNone(document.document)
+
+    def test_only_value_can_be_filtered(self):
+        self.patch('members[display eq "rford"]', status=400)
+        self.patch(f'members[value eq "{self.users[0].scim_id}" or display eq "rford"]', status=400)
+        self.assertEqual(len(self.members()), 4)
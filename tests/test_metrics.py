@@ -0,0 +1,177 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from django_scim import constants, metrics
+from django_scim.middleware import SCIMAuthCheckMiddleware
+from django_scim.utils import get_user_model
+
+from tests.test_views import LoginMixin
+
+METRICS_SETTINGS = dict(settings.SCIM_SERVICE_PROVIDER, METRICS_ENABLED=True)
+
+
+class MetricsRegistryTestCase(TestCase):
+
+    def test_exposition(self):
+        registry = metrics.MetricsRegistry(buckets=(0.1, 1))
+        registry.inc('scim_requests_total', endpoint='scim:users', status=200)
+        registry.inc('scim_requests_total', endpoint='scim:users', status=200)
+        registry.observe('scim_request_duration_seconds', 0.5, endpoint='scim:users')
+
+        text = registry.exposition()
+        self.assertIn('# TYPE scim_requests_total counter\n', text)
+        self.assertIn('scim_requests_total{endpoint="scim:users",status="200"} 2\n', text)
+        self.assertIn('scim_request_duration_seconds_bucket{endpoint="scim:users",le="0.1"} 0\n', text)
+        self.assertIn('scim_request_duration_seconds_bucket{endpoint="scim:users",le="1"} 1\n', text)
+        self.assertIn('scim_request_duration_seconds_bucket{endpoint="scim:users",le="+Inf"} 1\n', text)
+        self.assertIn('scim_request_duration_seconds_count{endpoint="scim:users"} 1\n', text)
+        self.assertIn('scim_request_duration_seconds_sum{endpoint="scim:users"} 0.5\n', text)
+
+    def test_label_values_are_escaped(self):
+        registry = metrics.MetricsRegistry()
+        registry.inc('scim_requests_total', endpoint='a"b\\c')
+        self.assertIn('scim_requests_total{endpoint="a\\"b\\\\c"} 1\n', registry.exposition())
+
+    def test_merge(self):
+        first = metrics.MetricsRegistry(buckets=(0.1, 1))
+        first.inc('scim_requests_total', status=200)
+        first.observe('scim_request_duration_seconds', 0.05)
+        second = metrics.MetricsRegistry(buckets=(0.1, 1))
+        second.inc('scim_requests_total', 3, status=200)
+        second.observe('scim_request_duration_seconds', 0.5)
+
+        combined = metrics.MetricsRegistry(buckets=(0.1, 1))
+        combined.merge(json.loads(json.dumps(first.dump())))
+        combined.merge(json.loads(json.dumps(second.dump())))
+
+        text = combined.exposition()
+        self.assertIn('scim_requests_total{status="200"} 4\n', text)
+        self.assertIn('scim_request_duration_seconds_bucket{le="0.1"} 1\n', text)
+        self.assertIn('scim_request_duration_seconds_bucket{le="1"} 2\n', text)
+        self.assertIn('scim_request_duration_seconds_count 2\n', text)
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser')
+class MetricsViewTestCase(LoginMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+        metrics.last_flush = None
+
+    def test_metrics_disabled(self):
+        resp = self.client.get(reverse('scim:metrics'))
+        self.assertEqual(resp.status_code, 501)
+
+        self.client.get(reverse('scim:users'))
+        self.assertEqual(metrics.registry.dump(), {'counters': [], 'histograms': []})
+
+    def test_metrics_require_login(self):
+        self.client.logout()
+        with override_settings(SCIM_SERVICE_PROVIDER=METRICS_SETTINGS):
+            resp = self.client.get(reverse('scim:metrics'))
+        self.assertEqual(resp.status_code, 401)
+
+    @override_settings(SCIM_SERVICE_PROVIDER=METRICS_SETTINGS)
+    def test_request_metrics(self):
+        get_user_model().objects.create(username='rford')
+        self.client.get(reverse('scim:users'), {'filter': 'userName eq "rford"'})
+        self.client.get(reverse('scim:users'), {'filter': 'userName eq "missing"'})
+        self.client.get(reverse('scim:users', kwargs={'uuid': 'missing'}))
+
+        resp = self.client.get(reverse('scim:metrics'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp['Content-Type'].startswith('text/plain'))
+        text = resp.content.decode()
+        self.assertIn('scim_requests_total{endpoint="scim:users",method="GET",status="200"} 2\n', text)
+        self.assertIn('scim_requests_total{endpoint="scim:users",method="GET",status="404"} 1\n', text)
+        self.assertIn(
+            'scim_request_duration_seconds_count{endpoint="scim:users",method="GET",status="200"} 2\n',
+            text,
+        )
+        self.assertIn('scim_search_rows_scanned_total{resource="User"} 1\n', text)
+        self.assertIn('scim_search_rows_returned_total{resource="User"} 1\n', text)
+
+    @override_settings(SCIM_SERVICE_PROVIDER=METRICS_SETTINGS)
+    def test_patch_operation_metrics(self):
+        user = get_user_model().objects.create(username='rford')
+        data = {
+            'schemas': [constants.SchemaURI.PATCH_OP],
+            'Operations': [
+                {'op': 'replace', 'path': 'userName', 'value': 'rford2'},
+                {'op': 'Replace', 'path': 'active', 'value': True},
+            ],
+        }
+        resp = self.client.patch(reverse('scim:users', kwargs={'uuid': user.scim_id}),
+                                 json.dumps(data), content_type=constants.SCIM_CONTENT_TYPE)
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+
+        text = metrics.registry.exposition()
+        self.assertIn('scim_patch_operations_total{op="replace",resource="User"} 2\n', text)
+
+    def test_multiprocess(self):
+        with tempfile.TemporaryDirectory() as directory:
+            other = metrics.MetricsRegistry()
+            other.inc('scim_requests_total', 5, endpoint='scim:users', method='GET', status=200)
+            with open(metrics.get_process_file(directory, pid=1), 'w') as fp:
+                json.dump(other.dump(), fp)
+
+            provider = dict(METRICS_SETTINGS, METRICS_MULTIPROCESS_DIR=directory)
+            with override_settings(SCIM_SERVICE_PROVIDER=provider):
+                self.client.get(reverse('scim:users'))
+                self.assertTrue(os.path.exists(metrics.get_process_file(directory)))
+                resp = self.client.get(reverse('scim:metrics'))
+
+        text = resp.content.decode()
+        self.assertIn('scim_requests_total{endpoint="scim:users",method="GET",status="200"} 6\n', text)
+
+    @unittest.skipUnless(metrics.fcntl, 'requires fcntl')
+    def test_exited_processes_are_folded(self):
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        with tempfile.TemporaryDirectory() as directory:
+            other = metrics.MetricsRegistry()
+            other.inc('scim_requests_total', 5, endpoint='scim:users', method='GET', status=200)
+            with open(metrics.get_process_file(directory, pid=process.pid), 'w') as fp:
+                json.dump(other.dump(), fp)
+
+            provider = dict(METRICS_SETTINGS, METRICS_MULTIPROCESS_DIR=directory)
+            with override_settings(SCIM_SERVICE_PROVIDER=provider):
+                self.client.get(reverse('scim:metrics'))
+                self.assertFalse(os.path.exists(metrics.get_process_file(directory, pid=process.pid)))
+                self.assertTrue(os.path.exists(os.path.join(directory, metrics.EXITED_FILE)))
+
+                # Folded values are counted once.
+                text = self.client.get(reverse('scim:metrics')).content.decode()
+
+        self.assertIn('scim_requests_total{endpoint="scim:users",method="GET",status="200"} 5\n', text)
+
+    @override_settings(SCIM_SERVICE_PROVIDER=METRICS_SETTINGS)
+    def test_other_requests_are_not_recorded(self):
+        middleware = SCIMAuthCheckMiddleware(lambda request: HttpResponse(status=404))
+        middleware(RequestFactory().get('/admin/'))
+        self.assertEqual(metrics.registry.dump(), {'counters': [], 'histograms': []})
+
+    def test_flush_interval(self):
+        with tempfile.TemporaryDirectory() as directory:
+            provider = dict(METRICS_SETTINGS, METRICS_MULTIPROCESS_DIR=directory, METRICS_FLUSH_INTERVAL=60)
+            with override_settings(SCIM_SERVICE_PROVIDER=provider), \
+                    mock.patch('django_scim.metrics.flush') as flush:
+                self.client.get(reverse('scim:users'))
+                self.client.get(reverse('scim:users'))
+                self.assertEqual(flush.call_count, 1)
+
+                with mock.patch('time.monotonic', return_value=metrics.last_flush + 60):
+                    self.client.get(reverse('scim:users'))
+                self.assertEqual(flush.call_count, 2)
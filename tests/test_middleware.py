@@ -1,9 +1,16 @@
+import json
+import os
+import pstats
+import tempfile
 from unittest import mock
 
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
-from django.test import RequestFactory, TestCase
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
 
-from django_scim.middleware import SCIMAuthCheckMiddleware
+from django_scim import constants
+from django_scim.middleware import SCIMAuthCheckMiddleware, SCIMProfilingMiddleware
 
 
 class SCIMMiddlewareTestCase(TestCase):
@@ -42,3 +49,73 @@ class SCIMMiddlewareTestCase(TestCase):
         request = RequestFactory().get(middleware.reverse_url)
         middleware.process_response(request, None)
         log_func.assert_called()
+
+
+class SCIMProfilingMiddlewareTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.middleware = SCIMProfilingMiddleware(lambda request: HttpResponse(status=201))
+
+    def profiling_settings(self, **kwargs):
+        return override_settings(SCIM_SERVICE_PROVIDER=dict(
+            settings.SCIM_SERVICE_PROVIDER,
+            PROFILING_DIR=self.directory.name,
+            **kwargs,
+        ))
+
+    def get_files(self):
+        return sorted(os.listdir(self.directory.name))
+
+    def post(self, path=None):
+        body = json.dumps({'userName': 'rford', 'password': 'secret'})
+        request = RequestFactory().post(path or self.middleware.reverse_url + 'Users', body,
+                                        content_type=constants.SCIM_CONTENT_TYPE)
+        return self.middleware(request)
+
+    def test_sampled_request_is_profiled(self):
+        with self.profiling_settings(PROFILING_SAMPLE_RATE=1.0):
+            response = self.post()
+
+        self.assertEqual(response.status_code, 201)
+        files = self.get_files()
+        self.assertEqual(len(files), 2)
+        pstats_file, summary_file = files
+        self.assertTrue(pstats_file.endswith('-POST-scim_v2_Users.pstats'))
+        pstats.Stats(os.path.join(self.directory.name, pstats_file))
+
+        with open(os.path.join(self.directory.name, summary_file)) as fp:
+            summary = fp.read()
+        self.assertIn('rford', summary)
+        self.assertNotIn('secret', summary)
+        self.assertIn('STATUS_CODE\n201', summary)
+
+    def test_not_sampled_request_is_not_profiled(self):
+        with self.profiling_settings(PROFILING_SAMPLE_RATE=0.0):
+            self.post()
+
+        self.assertEqual(self.get_files(), [])
+
+    def test_non_scim_request_is_not_profiled(self):
+        with self.profiling_settings(PROFILING_SAMPLE_RATE=1.0):
+            self.post('/admin/')
+
+        self.assertEqual(self.get_files(), [])
+
+    def test_slow_threshold(self):
+        with self.profiling_settings(PROFILING_SLOW_THRESHOLD=3600):
+            self.post()
+        self.assertEqual(self.get_files(), [])
+
+        with self.profiling_settings(PROFILING_SLOW_THRESHOLD=0):
+            self.post()
+        self.assertEqual(len(self.get_files()), 2)
+
+    def test_rotation(self):
+        with self.profiling_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_MAX_PROFILES=2):
+            for _ in range(4):
+                self.post()
+
+        # Two profiles, each a .pstats and a .txt file.
+        self.assertEqual(len(self.get_files()), 4)
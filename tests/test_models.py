@@ -44,7 +44,7 @@ class SCIMServiceProviderConfigTestCase(TestCase):
             },
             'changePassword': {'supported': True},
             'documentationUri': None,
-            'etag': {'supported': False},
+            'etag': {'supported': True},
             'filter': {
                 'supported': False,
                 'maxResults': 50
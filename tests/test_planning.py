@@ -0,0 +1,143 @@
+import json
+
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from django_scim import constants
+from django_scim.utils import get_user_model
+from tests import models
+from tests.test_views import LoginMixin
+
+GROUP_SETTINGS = dict(settings.SCIM_SERVICE_PROVIDER, GROUP_MODEL='tests.models.TestGroup')
+
+
+class PatchMixin:
+
+    def patch(self, url, operations, status=200):
+        data = {'schemas': [constants.SchemaURI.PATCH_OP], 'Operations': operations}
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.patch(url, data=json.dumps(data), content_type=constants.SCIM_CONTENT_TYPE)
+        self.assertEqual(resp.status_code, status, resp.content.decode())
+        return [q['sql'] for q in queries.captured_queries]
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser')
+class UserPlanTestCase(PatchMixin, LoginMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ford = get_user_model().objects.create(username='rford', first_name='Robert', last_name='Ford')
+        self.url = reverse('scim:users', kwargs={'uuid': self.ford.scim_id})
+
+    def test_replaces_are_saved_once(self):
+        queries = self.patch(self.url, [
+            {'op': 'replace', 'path': 'name.familyName', 'value': 'Hopkins'},
+            {'op': 'replace', 'path': 'active', 'value': False},
+            {'op': 'replace', 'value': {'name.givenName': 'Anthony', 'name.familyName': 'Ford'}},
+            {'op': 'replace', 'path': 'name.familyName', 'value': 'Hopkins'},
+        ])
+
+        user_table = get_user_model()._meta.db_table
+        updates = [sql for sql in queries if sql.startswith(f'UPDATE "{user_table}"')]
+        # The version swap and the save.
+        self.assertEqual(len(updates), 2)
+
+        self.ford.refresh_from_db()
+        self.assertEqual((self.ford.first_name, self.ford.last_name), ('Anthony', 'Hopkins'))
+        self.assertFalse(self.ford.is_active)
+        self.assertEqual(self.ford.scim_version, 2)
+
+    def test_invalid_operation_is_rejected(self):
+        self.patch(self.url, [
+            {'op': 'replace', 'path': 'name.familyName', 'value': 'Hopkins'},
+            {'op': 'replace', 'path': 'active', 'value': 'False'},
+        ], status=400)
+
+        self.ford.refresh_from_db()
+        self.assertEqual(self.ford.last_name, 'Ford')
+        self.assertEqual(self.ford.scim_version, 1)
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser', SCIM_SERVICE_PROVIDER=GROUP_SETTINGS)
+class GroupPlanTestCase(PatchMixin, LoginMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.behavior = models.TestGroup.objects.create(name='Behavior Group')
+        self.ford, self.abernathy, self.stubbs = [
+            get_user_model().objects.create(username=username)
+            for username in ('rford', 'dabernathy', 'bstubbs')
+        ]
+        self.behavior.user_set.add(self.ford)
+        self.url = reverse('scim:groups', kwargs={'uuid': self.behavior.scim_id})
+
+    def members(self):
+        return set(self.behavior.user_set.values_list('username', flat=True))
+
+    def member_ops(self, *changes):
+        return [
+            {'op': op, 'path': 'members', 'value': [{'value': user.scim_id} for user in users]}
+            for op, users in changes
+        ]
+
+    def test_net_member_changes(self):
+        queries = self.patch(self.url, self.member_ops(
+            ('add', [self.abernathy, self.stubbs]),
+            ('remove', [self.ford]),
+            ('remove', [self.abernathy]),
+            ('add', [self.ford]),
+            ('remove', [self.stubbs]),
+            ('add', [self.abernathy]),
+        ))
+        self.assertEqual(self.members(), {'rford', 'dabernathy'})
+
+        through = models.TestUser.scim_groups.through._meta.db_table
+        writes = [sql for sql in queries if sql.startswith(('INSERT', 'DELETE')) and f'"{through}"' in sql]
+        self.assertEqual(len(writes), 2)
+
+        self.behavior.refresh_from_db()
+        self.assertEqual(self.behavior.scim_version, 2)
+
+    def test_non_existent_user(self):
+        ops = self.member_ops(('add', [self.abernathy]), ('remove', [self.abernathy]))
+        ops[0]['value'].append({'value': '12345'})
+        ops[1]['value'].append({'value': '12345'})
+        self.patch(self.url, ops, status=400)
+        self.assertEqual(self.members(), {'rford'})
+
+    def test_filtered_remove_after_add(self):
+        self.patch(self.url, self.member_ops(('add', [self.abernathy])) + [
+            {'op': 'remove', 'path': f'members[value eq "{self.abernathy.scim_id}"]'},
+        ] + self.member_ops(('add', [self.stubbs])))
+        self.assertEqual(self.members(), {'rford', 'bstubbs'})
+
+    def test_group_is_touched_once(self):
+        queries = self.patch(self.url, self.member_ops(('add', [self.abernathy, self.stubbs])) + [
+            {'op': 'remove', 'path': f'members[value eq "{self.abernathy.scim_id}"]'},
+        ] + self.member_ops(('add', [self.abernathy])) + [
+            {'op': 'remove', 'path': f'members[value eq "{self.ford.scim_id}" or value eq "{self.stubbs.scim_id}"]'},
+        ])
+        self.assertEqual(self.members(), {'dabernathy'})
+
+        group_table = models.TestGroup._meta.db_table
+        updates = [sql for sql in queries if sql.startswith(f'UPDATE "{group_table}"')]
+        self.assertEqual(len(updates), 1)
+
+        self.behavior.refresh_from_db()
+        self.assertEqual(self.behavior.scim_version, 2)
+
+    def test_replace_and_member_changes(self):
+        self.patch(self.url, [
+            {'op': 'replace', 'path': 'name', 'value': [{'value': 'Delos'}]},
+        ] + self.member_ops(('add', [self.stubbs])) + [
+            {'op': 'replace', 'path': 'name', 'value': [{'value': 'Security Group'}]},
+        ])
+        self.assertEqual(self.members(), {'rford', 'bstubbs'})
+
+        # The save of the name locks the group and updates its version.
+        self.behavior.refresh_from_db()
+        self.assertEqual(self.behavior.name, 'Security Group')
+        self.assertEqual(self.behavior.scim_version, 2)
@@ -0,0 +1,68 @@
+import json
+
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from django_scim.adapters import SCIMGroup, SCIMUser
+from django_scim.utils import get_user_model
+from tests import models
+from tests.test_views import LoginMixin
+
+
+class CustomSCIMUser(SCIMUser):
+
+    @property
+    def emails(self):
+        return [{'value': self.obj.email, 'primary': True, 'display': self.obj.last_login}]
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser')
+class OnlyFieldsTestCase(TestCase):
+
+    def test_user_fields(self):
+        fields = SCIMUser.get_only_fields(get_user_model())
+        self.assertIn('username', fields)
+        self.assertIn('scim_version', fields)
+        self.assertNotIn('password', fields)
+        self.assertNotIn('last_login', fields)
+
+    def test_attribute_subset(self):
+        self.assertEqual(
+            SCIMGroup.get_only_fields(models.TestGroup, ['id', 'displayName']),
+            ['id', 'name', 'scim_id'],
+        )
+
+    def test_inherited_declaration_loads_full_rows(self):
+        self.assertIsNone(CustomSCIMUser.get_only_fields(get_user_model()))
+
+    def test_undeclared_column_loads_full_rows(self):
+        class PropertySCIMGroup(SCIMGroup):
+            attribute_fields = dict(SCIMGroup.attribute_fields, displayName=('title',))
+
+        self.assertIsNone(PropertySCIMGroup.get_only_fields(models.TestGroup))
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser')
+class ProjectionTestCase(LoginMixin, TestCase):
+
+    def test_list_loads_rendered_columns(self):
+        ford = get_user_model().objects.create(username='rford', first_name='Robert', last_name='Ford')
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse('scim:users'), {'count': 100})
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+
+        # The page of users, leaving out the load of the logged in user.
+        user_table = get_user_model()._meta.db_table
+        sql, = [
+            q['sql'] for q in queries.captured_queries
+            if q['sql'].startswith(f'SELECT "{user_table}"') and 'ORDER BY' in q['sql']
+        ]
+        self.assertIn('"username"', sql)
+        self.assertNotIn('"password"', sql)
+
+        resources = {r['userName']: r for r in json.loads(resp.content.decode())['Resources']}
+        request = RequestFactory().get('/')
+        self.assertEqual(resources['rford'], SCIMUser(ford, request).to_dict())
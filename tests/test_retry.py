@@ -0,0 +1,128 @@
+import json
+from unittest import mock
+
+from django.conf import settings
+from django.db import OperationalError
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from django_scim import constants, retry
+from django_scim.adapters import SCIMUser
+from django_scim.utils import get_user_model
+from tests.test_concurrency import replace_last_name
+from tests.test_views import LoginMixin
+
+NO_RETRY_SETTINGS = dict(settings.SCIM_SERVICE_PROVIDER, TRANSACTION_RETRIES=0)
+
+
+class DriverError(Exception):
+    pass
+
+
+def make_error(**attrs):
+    """
+    Return an ``OperationalError`` wrapping a driver error with ``attrs``
+    the way Django wraps database exceptions.
+    """
+    args = attrs.pop('args', ())
+    cause = DriverError(*args)
+    for name, value in attrs.items():
+        setattr(cause, name, value)
+
+    error = OperationalError(*args)
+    error.__cause__ = cause
+    return error
+
+
+class TransientErrorTestCase(SimpleTestCase):
+
+    def test_postgresql(self):
+        self.assertTrue(retry.is_transient_error(make_error(pgcode='40P01')))
+        self.assertTrue(retry.is_transient_error(make_error(sqlstate='40001')))
+        self.assertFalse(retry.is_transient_error(make_error(pgcode='23505')))
+
+    def test_mysql(self):
+        self.assertTrue(retry.is_transient_error(make_error(args=(1213, 'Deadlock found'))))
+        self.assertTrue(retry.is_transient_error(make_error(args=(1205, 'Lock wait timeout exceeded'))))
+        self.assertFalse(retry.is_transient_error(make_error(args=(1062, 'Duplicate entry'))))
+
+    def test_other_errors(self):
+        self.assertFalse(retry.is_transient_error(OperationalError('database is locked')))
+
+    def test_delay_grows_with_attempts(self):
+        with mock.patch('random.uniform', side_effect=lambda low, high: high):
+            self.assertEqual(retry.get_delay(1), 0.05)
+            self.assertEqual(retry.get_delay(3), 0.2)
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser')
+class RetryTestCase(LoginMixin, TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ford = get_user_model().objects.create(username='rford', first_name='Robert', last_name='Ford')
+        self.url = reverse('scim:users', kwargs={'uuid': self.ford.scim_id})
+
+    def patch(self, failures):
+        handle_operations = SCIMUser.handle_operations
+        calls = []
+
+        def deadlocking_handle_operations(scim_obj, operations):
+            calls.append(scim_obj)
+            handle_operations(scim_obj, operations)
+            if len(calls) <= failures:
+                raise make_error(pgcode='40P01')
+
+        with mock.patch.object(SCIMUser, 'handle_operations', deadlocking_handle_operations), \
+                mock.patch('django_scim.retry.get_delay', return_value=0):
+            resp = self.client.patch(
+                self.url,
+                data=replace_last_name('Hopkins'),
+                content_type=constants.SCIM_CONTENT_TYPE,
+            )
+        return resp, calls
+
+    def test_deadlock_is_retried(self):
+        resp, calls = self.patch(failures=2)
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        self.assertEqual(len(calls), 3)
+
+        # The rolled back attempts left no trace.
+        self.ford.refresh_from_db()
+        self.assertEqual(self.ford.last_name, 'Hopkins')
+        self.assertEqual(self.ford.scim_version, 2)
+
+    @override_settings(SCIM_SERVICE_PROVIDER=NO_RETRY_SETTINGS)
+    def test_deadlock_without_retries_left(self):
+        resp, calls = self.patch(failures=1)
+        self.assertEqual(resp.status_code, 500, resp.content.decode())
+        self.assertEqual(len(calls), 1)
+        self.ford.refresh_from_db()
+        self.assertEqual(self.ford.last_name, 'Ford')
+
+    def test_post_is_retried_with_a_new_object(self):
+        save = SCIMUser.save
+        calls = []
+
+        def deadlocking_save(scim_obj):
+            calls.append(scim_obj.obj)
+            save(scim_obj)
+            if len(calls) == 1:
+                raise make_error(args=(1213, 'Deadlock found'))
+
+        data = {
+            'schemas': [constants.SchemaURI.USER],
+            'userName': 'dabernathy',
+            'name': {'givenName': 'Dolores', 'familyName': 'Abernathy'},
+        }
+        with mock.patch.object(SCIMUser, 'save', deadlocking_save), \
+                mock.patch('django_scim.retry.get_delay', return_value=0):
+            resp = self.client.post(
+                reverse('scim:users'),
+                data=json.dumps(data),
+                content_type=constants.SCIM_CONTENT_TYPE,
+            )
+        self.assertEqual(resp.status_code, 201, resp.content.decode())
+        self.assertEqual(len(calls), 2)
+        self.assertIsNot(calls[0], calls[1])
+        self.assertEqual(get_user_model().objects.filter(username='dabernathy').count(), 1)
@@ -0,0 +1,139 @@
+import json
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Manager, QuerySet
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from django_scim import constants
+from django_scim.utils import get_user_model
+from tests import models
+from tests.test_views import LoginMixin
+
+REPLICA_SETTINGS = dict(
+    settings.SCIM_SERVICE_PROVIDER,
+    READ_DATABASE_ALIAS_GETTER='tests.test_routing.replica_getter',
+    USER_FILTER_PARSER='tests.filters.UserFilterQuery',
+)
+
+REPLICA_DOCUMENT_SETTINGS = dict(
+    settings.SCIM_SERVICE_PROVIDER,
+    READ_DATABASE_ALIAS_GETTER='tests.test_routing.shard_replica_getter',
+    DOCUMENT_MODEL='tests.models.TestSCIMDocument',
+)
+
+
+def replica_getter(request):
+    # Tests only have one database: route to it explicitly so that the
+    # aliases passed to the ORM can be checked.
+    return 'default'
+
+
+def shard_replica_getter(request):
+    # The second test database stands for a replica of the default one.
+    return 'shard'
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser', SCIM_SERVICE_PROVIDER=REPLICA_SETTINGS)
+class ReadReplicaTestCase(LoginMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.ford = get_user_model().objects.create(username='rford', first_name='Robert', last_name='Ford')
+
+    def get(self, url, data=None, method='get', **extra):
+        with mock.patch.object(QuerySet, 'using', autospec=True, side_effect=QuerySet.using) as using, \
+                mock.patch.object(Manager, 'db_manager', autospec=True, side_effect=Manager.db_manager) as db_manager:
+            resp = getattr(self.client, method)(url, data, **extra)
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        calls = using.call_args_list + db_manager.call_args_list
+        aliases = [call.args[1] for call in calls if call.args[1] is not None]
+        return resp, aliases
+
+    def test_single_get_reads_from_replica(self):
+        resp, aliases = self.get(reverse('scim:users', kwargs={'uuid': self.ford.scim_id}))
+        self.assertIn('default', aliases)
+
+    def test_list_reads_from_replica(self):
+        resp, aliases = self.get(reverse('scim:users'))
+        self.assertIn('default', aliases)
+        self.assertIn('rford', [r['userName'] for r in json.loads(resp.content.decode())['Resources']])
+
+    def test_search_reads_from_replica(self):
+        resp, aliases = self.get(reverse('scim:users'), {'filter': 'userName eq "rford"'})
+        self.assertIn('default', aliases)
+        self.assertEqual(json.loads(resp.content.decode())['totalResults'], 1)
+
+    def test_search_endpoint_reads_from_replica(self):
+        data = {'schemas': [constants.SchemaURI.SERACH_REQUEST], 'filter': 'userName eq "rford"'}
+        resp, aliases = self.get(reverse('scim:users-search'), json.dumps(data), method='post',
+                                 content_type=constants.SCIM_CONTENT_TYPE)
+        self.assertIn('default', aliases)
+        self.assertEqual(json.loads(resp.content.decode())['totalResults'], 1)
+
+    def test_reads_after_write_go_to_primary(self):
+        data = {
+            'schemas': [constants.SchemaURI.PATCH_OP],
+            'Operations': [{'op': 'replace', 'path': 'name.familyName', 'value': 'Hopkins'}],
+        }
+        url = reverse('scim:users', kwargs={'uuid': self.ford.scim_id})
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.patch(url, data=json.dumps(data), content_type=constants.SCIM_CONTENT_TYPE)
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+
+        resp, aliases = self.get(url)
+        self.assertEqual(aliases, [])
+        self.assertEqual(json.loads(resp.content.decode())['name']['familyName'], 'Hopkins')
+
+        # Once the pin expires reads go back to the replica.
+        cache.clear()
+        resp, aliases = self.get(url)
+        self.assertIn('default', aliases)
+
+    @override_settings(SCIM_SERVICE_PROVIDER=dict(REPLICA_SETTINGS, READ_AFTER_WRITE_SECONDS=None))
+    def test_pinning_disabled(self):
+        abernathy = get_user_model().objects.create(username='dabernathy')
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.delete(reverse('scim:users', kwargs={'uuid': self.ford.scim_id}))
+        self.assertEqual(resp.status_code, 204)
+
+        resp, aliases = self.get(reverse('scim:users', kwargs={'uuid': abernathy.scim_id}))
+        self.assertIn('default', aliases)
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser', SCIM_SERVICE_PROVIDER=REPLICA_DOCUMENT_SETTINGS)
+class ReplicaDocumentTestCase(LoginMixin, TestCase):
+    databases = {'default', 'shard'}
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.ford = get_user_model().objects.create(username='rford', first_name='Robert', last_name='Ford')
+        # Replicate the user.
+        get_user_model().objects.using('shard').create(
+            id=self.ford.id,
+            username='rford',
+            first_name='Robert',
+            last_name='Ford',
+        )
+
+    def test_documents_are_not_written_to_replica(self):
+        with CaptureQueriesContext(connections['shard']) as replica_queries:
+            resp = self.client.get(reverse('scim:users', kwargs={'uuid': self.ford.scim_id}))
+            self.assertEqual(resp.status_code, 200, resp.content.decode())
+            resp = self.client.get(reverse('scim:users'))
+            self.assertEqual(resp.status_code, 200, resp.content.decode())
+
+        sql = [q['sql'] for q in replica_queries.captured_queries]
+        # Users were read from the replica, nothing was written to it.
+        self.assertTrue(any(q.startswith('SELECT') for q in sql))
+        self.assertEqual([q for q in sql if q.split()[0] in ('INSERT', 'UPDATE', 'DELETE')], [])
+
+        # Documents rendered from objects read off the replica are not stored.
+        self.assertFalse(models.TestSCIMDocument.objects.exists())
+        self.assertFalse(models.TestSCIMDocument.objects.using('shard').exists())
@@ -0,0 +1,38 @@
+from django.test import TestCase, override_settings
+
+from django_scim.adapters import SCIMUser
+from django_scim.settings import SCIMServiceProviderSettings, scim_settings
+
+
+class SCIMServiceProviderSettingsTestCase(TestCase):
+
+    def test_settings_are_loaded_at_ready(self):
+        self.assertIn('USER_ADAPTER', scim_settings.__dict__)
+        self.assertIs(scim_settings.__dict__['USER_ADAPTER'], SCIMUser)
+
+    def test_settings_are_read_only(self):
+        with self.assertRaises(AttributeError):
+            scim_settings.NETLOC = 'example.com'
+
+    def test_load_raises_on_bad_import_string(self):
+        settings = SCIMServiceProviderSettings(
+            {'USER_ADAPTER': 'django_scim.missing.SCIMUser'},
+            {'USER_ADAPTER': None},
+            ('USER_ADAPTER',),
+        )
+        with self.assertRaises(ImportError):
+            settings.load()
+
+    def test_load_skips_missing_mandatory_settings(self):
+        settings = SCIMServiceProviderSettings({}, {'NETLOC': None}, (), ('NETLOC',))
+        settings.load()
+        with self.assertRaises(AttributeError):
+            settings.NETLOC
+
+    def test_reload_on_setting_changed(self):
+        self.assertEqual(scim_settings.NETLOC, 'localhost')
+
+        with override_settings(SCIM_SERVICE_PROVIDER={'NETLOC': 'example.com'}):
+            self.assertEqual(scim_settings.NETLOC, 'example.com')
+
+        self.assertEqual(scim_settings.NETLOC, 'localhost')
@@ -0,0 +1,92 @@
+import json
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from django_scim import constants
+from django_scim.utils import get_user_model
+from tests import models
+from tests.test_views import LoginMixin
+
+SHARD_SETTINGS = dict(
+    settings.SCIM_SERVICE_PROVIDER,
+    DATABASE_ALIAS_GETTER='tests.test_sharding.shard_getter',
+    GROUP_MODEL='tests.models.TestGroup',
+)
+
+
+def shard_getter(request):
+    return 'shard'
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser', SCIM_SERVICE_PROVIDER=SHARD_SETTINGS)
+class ShardTestCase(LoginMixin, TestCase):
+    databases = {'default', 'shard'}
+
+    def test_post_writes_to_shard(self):
+        data = {
+            'schemas': [constants.SchemaURI.USER],
+            'userName': 'rford',
+            'name': {'givenName': 'Robert', 'familyName': 'Ford'},
+        }
+        resp = self.client.post(reverse('scim:users'), data=json.dumps(data), content_type=constants.SCIM_CONTENT_TYPE)
+        self.assertEqual(resp.status_code, 201, resp.content.decode())
+
+        ford = get_user_model().objects.using('shard').get(username='rford')
+        self.assertEqual(ford.scim_id, str(ford.pk))
+        self.assertFalse(get_user_model().objects.filter(username='rford').exists())
+
+    def test_reads_from_shard(self):
+        ford = get_user_model().objects.using('shard').create(username='rford', first_name='Robert')
+
+        resp = self.client.get(reverse('scim:users', kwargs={'uuid': ford.scim_id}))
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        self.assertEqual(json.loads(resp.content.decode())['userName'], 'rford')
+
+        resp = self.client.get(reverse('scim:users'))
+        result = json.loads(resp.content.decode())
+        self.assertEqual([r['userName'] for r in result['Resources']], ['rford'])
+
+        resp = self.client.get(reverse('scim:users'), {'filter': 'userName eq "rford"'})
+        result = json.loads(resp.content.decode())
+        self.assertEqual([r['userName'] for r in result['Resources']], ['rford'])
+
+    def test_patch_and_delete_on_shard(self):
+        ford = get_user_model().objects.using('shard').create(username='rford')
+        behavior = models.TestGroup.objects.using('shard').create(name='Behavior Group')
+
+        data = {
+            'schemas': [constants.SchemaURI.PATCH_OP],
+            'Operations': [{'op': 'add', 'path': 'members', 'value': [{'value': str(ford.pk)}]}],
+        }
+        resp = self.client.patch(
+            reverse('scim:groups', kwargs={'uuid': behavior.scim_id}),
+            data=json.dumps(data),
+            content_type=constants.SCIM_CONTENT_TYPE,
+        )
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        self.assertEqual(list(behavior.user_set.all()), [ford])
+        behavior.refresh_from_db()
+        self.assertEqual(behavior.scim_version, 2)
+
+        resp = self.client.delete(reverse('scim:users', kwargs={'uuid': ford.scim_id}))
+        self.assertEqual(resp.status_code, 204)
+        self.assertFalse(get_user_model().objects.using('shard').filter(pk=ford.pk).exists())
+
+    @override_settings(SCIM_SERVICE_PROVIDER=dict(
+        SHARD_SETTINGS,
+        CHANGE_LOG_MODEL='tests.models.TestSCIMChange',
+        CHANGE_LOG_SETTLE_SECONDS=0,
+    ))
+    def test_change_log_on_shard(self):
+        ford = get_user_model().objects.using('shard').create(username='rford')
+        self.assertEqual(
+            list(models.TestSCIMChange.objects.using('shard').values_list('object_id', 'action')),
+            [(str(ford.pk), models.TestSCIMChange.CREATE)],
+        )
+
+        resp = self.client.get(reverse('scim:changes'), {'since': 0})
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        result = json.loads(resp.content.decode())
+        self.assertEqual([r['userName'] for r in result['Resources']], ['rford'])
@@ -0,0 +1,122 @@
+import json
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from django_scim import constants
+from django_scim.testing import QueryBudgetExceeded, fingerprint, query_budget
+from django_scim.utils import get_user_model
+
+from tests.models import get_group_model
+from tests.test_views import LoginMixin
+
+
+class FingerprintTestCase(TestCase):
+
+    def test_fingerprint(self):
+        sql = '''SELECT "a"."id" FROM "t1" WHERE "a"."id" IN (1, 2, 3) AND "a"."name" = 'it''s'  LIMIT 21'''
+        self.assertEqual(
+            fingerprint(sql),
+            'SELECT "a"."id" FROM "t1" WHERE "a"."id" IN (...) AND "a"."name" = ? LIMIT ?',
+        )
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser')
+class QueryBudgetTestCase(TestCase):
+
+    def test_within_budget(self):
+        with query_budget(1) as budget:
+            list(get_user_model().objects.all())
+        self.assertEqual(len(budget.captured_queries), 1)
+
+    def test_budget_exceeded_lists_fingerprints(self):
+        for i in range(3):
+            get_user_model().objects.create(username=f'host{i}')
+
+        with self.assertRaises(QueryBudgetExceeded) as ctx:
+            with query_budget(2):
+                for user in get_user_model().objects.all():
+                    list(user.scim_groups.all())
+
+        message = str(ctx.exception)
+        self.assertIn('4 queries executed on "default", budget is 2', message)
+        self.assertIn('3 x SELECT', message)
+
+    def test_decorator(self):
+        @query_budget(0)
+        def run_query():
+            list(get_user_model().objects.all())
+
+        with self.assertRaises(QueryBudgetExceeded):
+            run_query()
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser')
+@mock.patch('django_scim.views.GroupsView.model_cls_getter', get_group_model)
+class EndpointQueryBudgetTestCase(LoginMixin, TestCase):
+    """
+    Query budgets per endpoint shape. Budgets include the two queries used by
+    the session and authentication middleware and must not grow with the
+    number of resources served.
+    """
+    sizes = (1, 10, 30)
+
+    def create_users(self, n, group=None):
+        users = [
+            get_user_model().objects.create(username=f'host{n}-{i}', last_name='Host')
+            for i in range(n)
+        ]
+        for user in users:
+            if group:
+                user.scim_groups.add(group)
+        return users
+
+    def test_list_users_page(self):
+        group = get_group_model().objects.create(name='Hosts')
+        self.create_users(max(self.sizes), group)
+
+        for size in self.sizes:
+            with query_budget(5):
+                resp = self.client.get(reverse('scim:users'), {'count': size})
+            self.assertEqual(resp.status_code, 200, resp.content.decode())
+
+    def test_get_single_user(self):
+        group = get_group_model().objects.create(name='Hosts')
+        user = self.create_users(1, group)[0]
+
+        with query_budget(4):
+            resp = self.client.get(reverse('scim:users', kwargs={'uuid': user.scim_id}))
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+
+    def test_filtered_search(self):
+        group = get_group_model().objects.create(name='Hosts')
+        self.create_users(max(self.sizes), group)
+
+        for size in self.sizes:
+            with query_budget(4):
+                resp = self.client.get(
+                    reverse('scim:users'),
+                    {'filter': 'familyName eq "Host"', 'count': size},
+                )
+            self.assertEqual(resp.status_code, 200, resp.content.decode())
+
+    def test_patch_add_members(self):
+        for size in self.sizes:
+            group = get_group_model().objects.create(name=f'Hosts {size}')
+            users = self.create_users(size)
+            data = {
+                'schemas': [constants.SchemaURI.PATCH_OP],
+                'Operations': [{
+                    'op': 'add',
+                    'path': 'members',
+                    'value': [{'value': user.id} for user in users],
+                }],
+            }
+
+            url = reverse('scim:groups', kwargs={'uuid': group.scim_id})
+            # Includes the update of the group's lastModified.
+            with query_budget(9):
+                resp = self.client.patch(url, json.dumps(data), content_type=constants.SCIM_CONTENT_TYPE)
+            self.assertEqual(resp.status_code, 200, resp.content.decode())
+            self.assertEqual(group.user_set.count(), size)
@@ -0,0 +1,93 @@
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from django_scim import constants
+from django_scim.settings import scim_settings
+from django_scim.signals import request_timed
+from django_scim.timing import get_server_timing_header
+from django_scim.utils import get_user_model
+
+from tests.test_views import LoginMixin
+
+TIMING_SETTINGS = dict(
+    settings.SCIM_SERVICE_PROVIDER,
+    TIMING_ENABLED=True,
+    SERVER_TIMING_HEADER=True,
+)
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser')
+class RequestTimingTestCase(LoginMixin, TestCase):
+
+    def get_users(self, **extra):
+        url = reverse('scim:users')
+        return self.client.get(url, {'filter': 'userName eq "superuser"'},
+                               content_type=constants.SCIM_CONTENT_TYPE, **extra)
+
+    def test_timing_disabled_by_default(self):
+        receiver = mock.Mock()
+        request_timed.connect(receiver)
+        try:
+            resp = self.get_users()
+        finally:
+            request_timed.disconnect(receiver)
+
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        self.assertNotIn('Server-Timing', resp)
+        receiver.assert_not_called()
+
+    @override_settings(SCIM_SERVICE_PROVIDER=TIMING_SETTINGS)
+    def test_timing_record(self):
+        get_user_model().objects.create(username='rford')
+        receiver = mock.Mock()
+        request_timed.connect(receiver)
+        try:
+            resp = self.get_users(HTTP_USER_AGENT='Okta SCIM Client 1.0.0')
+        finally:
+            request_timed.disconnect(receiver)
+
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        receiver.assert_called_once()
+        record = receiver.call_args[1]['record']
+        self.assertEqual(record['endpoint'], 'scim:users')
+        self.assertEqual(record['method'], 'GET')
+        self.assertEqual(record['status'], 200)
+        self.assertIsNone(record['tenant'])
+        self.assertEqual(record['user_agent'], 'Okta SCIM Client 1.0.0')
+        self.assertEqual(set(record['phases']), {'filter', 'serialize', 'encode'})
+        self.assertGreaterEqual(record['queries']['count'], 2)
+        self.assertEqual(resp['Server-Timing'], get_server_timing_header(record))
+
+    @override_settings(SCIM_SERVICE_PROVIDER=dict(
+        TIMING_SETTINGS,
+        TIMING_CALLBACK='tests.test_timing.timing_callback',
+    ))
+    def test_timing_callback(self):
+        with mock.patch('tests.test_timing.timing_callback') as callback:
+            # Settings are resolved eagerly, reload them to pick up the mock.
+            scim_settings.reload(settings.SCIM_SERVICE_PROVIDER)
+            self.get_users()
+
+        callback.assert_called_once()
+        self.assertEqual(callback.call_args[0][0]['endpoint'], 'scim:users')
+
+
+def timing_callback(record):
+    pass
+
+
+class ServerTimingHeaderTestCase(TestCase):
+
+    def test_get_server_timing_header(self):
+        record = {
+            'phases': {'serialize': 0.0015},
+            'queries': {'count': 3, 'duration': 0.002},
+            'duration': 0.01,
+        }
+        self.assertEqual(
+            get_server_timing_header(record),
+            'serialize;dur=1.50, db;dur=2.00;desc="3 queries", total;dur=10.00',
+        )
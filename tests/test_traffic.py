@@ -0,0 +1,113 @@
+import io
+import json
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from django_scim import constants, traffic
+from django_scim.utils import get_user_model
+
+from tests.test_views import LoginMixin
+
+
+@override_settings(AUTH_USER_MODEL='django_scim.TestUser')
+class TrafficRecordingTestCase(LoginMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'traffic.ndjson')
+
+    def record_settings(self):
+        return override_settings(SCIM_SERVICE_PROVIDER=dict(
+            settings.SCIM_SERVICE_PROVIDER,
+            TRAFFIC_RECORD_PATH=self.path,
+        ))
+
+    def post_user(self):
+        data = {
+            'schemas': [constants.SchemaURI.USER],
+            'userName': 'ehol',
+            'password': 'secret',
+            'name': {'givenName': 'Elizabeth', 'familyName': 'Holmes'},
+        }
+        return self.client.post(reverse('scim:users'), json.dumps(data),
+                                content_type=constants.SCIM_CONTENT_TYPE,
+                                HTTP_USER_AGENT='Okta SCIM Client 1.0.0')
+
+    def test_not_recorded_by_default(self):
+        self.post_user()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_record(self):
+        with self.record_settings():
+            self.post_user()
+            self.client.get(reverse('scim:users'), {'filter': 'userName eq "ehol"'})
+
+        records = traffic.load_records(self.path)
+        self.assertEqual(len(records), 2)
+
+        post, get = records
+        self.assertEqual(post['method'], 'POST')
+        self.assertEqual(post['path'], reverse('scim:users'))
+        self.assertEqual(post['status'], 201)
+        self.assertEqual(post['user_agent'], 'Okta SCIM Client 1.0.0')
+        self.assertEqual(post['body']['userName'], 'ehol')
+        self.assertEqual(post['body']['password'], '******')
+        self.assertGreater(post['duration'], 0)
+
+        self.assertEqual(get['method'], 'GET')
+        self.assertEqual(get['query'], 'filter=userName+eq+%22ehol%22')
+        self.assertIsNone(get['body'])
+        self.assertEqual(get['status'], 200)
+
+    def test_replay(self):
+        with self.record_settings():
+            self.post_user()
+            self.client.get(reverse('scim:users'), {'filter': 'userName eq "ehol"'})
+        get_user_model().objects.filter(username='ehol').delete()
+
+        out = io.StringIO()
+        call_command('scim_replay', self.path, username='superuser', stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['requests'], 2)
+        self.assertEqual(report['statuses'], {'201': 1, '200': 1})
+        self.assertEqual(report['status_mismatches'], 0)
+        self.assertEqual(set(report['latency_ms']), {'mean', 'p50', 'p95', 'p99', 'max'})
+        self.assertTrue(get_user_model().objects.filter(username='ehol').exists())
+
+    def test_replay_user_agent_filter(self):
+        with self.record_settings():
+            self.post_user()
+            self.client.get(reverse('scim:users'))
+
+        out = io.StringIO()
+        call_command('scim_replay', self.path, username='superuser', user_agent='Okta', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['requests'], 1)
+
+    def test_concurrent_replay_keeps_order_per_path(self):
+        records = [
+            {'method': 'PUT', 'path': '/scim/v2/Users/1', 'status': 200},
+            {'method': 'PATCH', 'path': '/scim/v2/Users/1', 'status': 200},
+            {'method': 'GET', 'path': '/scim/v2/Users/2', 'status': 200},
+            {'method': 'DELETE', 'path': '/scim/v2/Users/1', 'status': 204},
+        ]
+        sent = []
+
+        def send(record):
+            if record['method'] == 'PUT':
+                time.sleep(0.05)
+            sent.append(record['method'])
+            return record['status']
+
+        report = traffic.replay(records, send, concurrency=4)
+        self.assertEqual(report['status_mismatches'], 0)
+        self.assertEqual([m for m in sent if m != 'GET'], ['PUT', 'PATCH', 'DELETE'])
+        self.assertEqual(sent[0], 'GET')
@@ -1,8 +1,9 @@
 import json
+from unittest import mock
 
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
 
-from django_scim.utils import get_loggable_body
+from django_scim.utils import get_loggable_body, get_request_context
 
 
 class LogCleanerTestCase(TestCase):
@@ -16,3 +17,31 @@ class LogCleanerTestCase(TestCase):
             "Operations": [{"op": "replace", "value": {"password": "********"}}]
         }
         self.assertEqual(result, expected)
+
+
+class SCIMRequestContextTestCase(TestCase):
+
+    def test_get_request_context_is_attached_to_request(self):
+        request = RequestFactory().get('/fake/request')
+        context = get_request_context(request)
+        self.assertIs(request.scim_context, context)
+        self.assertIs(get_request_context(request), context)
+
+    def test_getters_are_resolved_once(self):
+        context = get_request_context(RequestFactory().get('/fake/request'))
+
+        with mock.patch('django_scim.utils.get_base_scim_location_getter') as getter:
+            getter.return_value = lambda request: 'https://localhost'
+            self.assertEqual(context.base_location, 'https://localhost')
+            self.assertEqual(context.base_location, 'https://localhost')
+            getter.assert_called_once()
+
+        self.assertIs(
+            context.get_extra_filter_kwargs_getter('search'),
+            context.get_extra_filter_kwargs_getter('search'),
+        )
+
+    def test_extra_filter_kwargs_returns_copy(self):
+        context = get_request_context(RequestFactory().get('/fake/request'))
+        context.extra_filter_kwargs('search')['id'] = 1
+        self.assertEqual(context.extra_filter_kwargs('search'), {})
@@ -3,6 +3,7 @@ import json
 from unittest import mock, skip
 from urllib.parse import urljoin
 
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
 from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
@@ -329,6 +330,38 @@ class SearchTestCase(LoginMixin, TestCase):
         }
         self.assertEqual(expected, result)
 
+    @mock.patch('django_scim.views.slow_filter_logger')
+    def test_slow_filter_logs_query_plan(self, slow_filter_logger):
+        get_user_model().objects.create(username='rford', last_name='Ford')
+
+        url = reverse('scim:users-search')
+        body = json.dumps({
+            'schemas': [constants.SchemaURI.SERACH_REQUEST],
+            'filter': 'familyName co "For" or userName sw "rf"',
+        })
+        resp = self.client.post(url, body, content_type=constants.SCIM_CONTENT_TYPE)
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        slow_filter_logger.warning.assert_not_called()
+
+        provider = dict(
+            settings.SCIM_SERVICE_PROVIDER,
+            FILTER_EXPLAIN_THRESHOLD=0,
+            TENANT_GETTER='tests.test_cache.tenant_getter',
+        )
+        with override_settings(SCIM_SERVICE_PROVIDER=provider):
+            resp = self.client.post(url, body, content_type=constants.SCIM_CONTENT_TYPE, HTTP_X_TENANT='delos')
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+
+        slow_filter_logger.warning.assert_called_once()
+        args, kwargs = slow_filter_logger.warning.call_args
+        self.assertEqual(kwargs['extra']['filter_shape'], 'familyName co ? or userName sw ?')
+        self.assertEqual(kwargs['extra']['resource'], 'User')
+        self.assertEqual(kwargs['extra']['tenant'], 'delos')
+        message = args[0] % args[1:]
+        self.assertIn('for tenant delos', message)
+        self.assertIn(get_user_model()._meta.db_table, message.split('Plan:')[1])
+        self.assertNotIn('For', message.split('SQL:')[0].replace('Slow SCIM filter', ''))
+
 
 @override_settings(AUTH_USER_MODEL='django_scim.TestUser')
 class CustomAuthDecoratorCase(TestCase):
@@ -495,6 +528,22 @@ class UserTestCase(LoginMixin, TestCase):
         }
         self.assertEqual(expected, result)
 
+    def test_get_all_users_resolves_base_location_once(self):
+        """
+        Test GET /Users resolves the base location once per request.
+        """
+        for i in range(3):
+            get_user_model().objects.create(username=f'host{i}')
+
+        getter = mock.Mock(return_value='https://localhost')
+        with mock.patch('django_scim.utils.get_base_scim_location_getter', return_value=getter):
+            url = reverse('scim:users')
+            resp = self.client.get(url, content_type=constants.SCIM_CONTENT_TYPE)
+
+        self.assertEqual(resp.status_code, 200, resp.content.decode())
+        self.assertEqual(json.loads(resp.content.decode())['totalResults'], 4)
+        getter.assert_called_once()
+
     @mock.patch('django_scim.views.UsersView.get_extra_filter_kwargs')
     def test_get_all_users_with_extra_model_filter_kwargs(self, func):
         """
@@ -1390,6 +1439,8 @@ class GroupTestCase(LoginMixin, TestCase):
         resp = self.client.patch(url, data=data, content_type=constants.SCIM_CONTENT_TYPE)
         self.assertEqual(resp.status_code, 200, resp.content.decode())
 
+        behavior.refresh_from_db()
+
         result = json.loads(resp.content.decode())
         expected = get_group_adapter()(behavior, self.request).to_dict()
         self.assertEqual(expected, result)
@@ -1436,6 +1487,8 @@ class GroupTestCase(LoginMixin, TestCase):
         resp = self.client.patch(url, data=data, content_type=constants.SCIM_CONTENT_TYPE)
         self.assertEqual(resp.status_code, 200, resp.content.decode())
 
+        behavior.refresh_from_db()
+
         result = json.loads(resp.content.decode())
         expected = get_group_adapter()(behavior, self.request).to_dict()
         self.assertEqual(expected, result)